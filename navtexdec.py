@@ -1,4 +1,16 @@
 import sys # for version check and argv
+import argparse
+import time
+import os
+import stat
+import mmap
+
+# numpy is optional, only needed for "batch" mode
+try:
+	import numpy as np
+except ImportError:
+	np=None
+#end try
 
 """
 NAVTEX decoder
@@ -6,10 +18,98 @@ input: 100 bps bits, encoded as bytes 0x00 or 0x01
 output: text
 
 Usage:
-python3 navtexdec.py [<filename>]
+python3 navtexdec.py [-p {msb,lsb} | --audio [--rate RATE] [--center HZ] [--shift HZ] [--invert]] [-b] [--mmap] [--range START[:END] | --last SECONDS] [--lookback BITS] [-j JOBS [--overlap BITS]] [-m [--dedup N] [--dedup-expiry SECONDS]] [--store DATABASE] [--checkpoint FILE [--checkpoint-interval SECONDS]] [--index FILE [--index-interval BITS]] [--use-index FILE] [--profile] [--flush FLUSH] [--flush-delay SECONDS] [--bufsize N] [<filename>]
 	Read from stdin if no filename give
 	Read from stdin if filename = "-"
 
+	-p / --packed: input is packed, 8 bits per byte
+		msb: first bit is the most significant bit of the byte
+		lsb: first bit is the least significant bit of the byte
+
+	--audio: input is audio (requires numpy): a WAV file or raw PCM (16 bit
+		signed, little-endian, mono), with the FSK signal (170 Hz shift,
+		100 baud) at --center Hz (default: 1000). The signal is demodulated
+		to bits in this process, no external demodulator is needed
+		--rate: sample rate of raw PCM (default: 48000, WAV: from the header)
+		--shift: frequency shift (default: 170 Hz)
+		--invert: the lower tone is a 1 bit (default: the higher tone)
+		The positions of the events are bit positions (100 per second of
+		audio). See navtexdec_fsk.py
+
+	-b / --batch: batch mode (requires numpy): read the input in large
+		blocks and search the sync positions in a complete block at once
+
+	--mmap: map the input file in memory (not for stdin): the data is not
+		copied, and processes decoding the same file share the page cache
+	--range: only decode bit START up to bit END of the file (implies
+		--mmap). For data that is not packed, the bit position is the byte
+		offset. Packed data: the last byte of the range is decoded completely.
+		The positions of the events are positions in the file
+	--last: only decode the last SECONDS of the file (100 bits per second)
+
+	--lookback: keep the last BITS received bits. On sync loss, these bits
+		are searched for a bit slip, and the text after the bit slip is
+		decoded again (default: 0, off). A bit slip is often only detected
+		many characters later, use for example 20000 bits
+		The positions of the events can go back after a "synclost" event,
+		"-m / --messages" replaces the text after the bit slip. The text is
+		decoded again with the letters/figures table of that position
+
+	-j / --jobs: decode the file in parallel, in JOBS worker processes
+		(not for stdin). The output is the same as when decoding sequentially
+		--overlap: number of bits every worker continues into the next part
+		of the file, to find the point where both decoders are in the same
+		state (default: 1048576). See "navtexdec_split" in navtexdec_batch.py
+
+	-m / --messages: only print NAVTEX messages ("ZCZC" up to "NNNN"),
+		messages that are already received are dropped
+		--dedup: number of messages remembered (default: 1024, 0: print all)
+		--dedup-expiry: seconds a message is remembered (default: 86400),
+		for a file: seconds in the recording (100 bits per second)
+		See navtexdec_msg.py
+
+	--store: store all received messages in a SQLite database (also
+		without -m), channel: the file name, receive time: the time in the
+		recording (the recording ended at the modification time of the
+		file). --store-batch: messages per transaction (default: 100),
+		--store-delay: maximum time a message is not written (default: 1
+		second). See navtexdec_store.py
+
+	--checkpoint: write the decoder state to FILE every --checkpoint-interval
+		seconds (default: 60). When started again, decoding continues from
+		that state, at the same position in the input file (stdin: only the
+		state is restored); with -m or --store, a message that is being
+		received is decoded again from its "ZCZC". A checkpoint of an other
+		input file is refused. The file is removed when the input file is
+		completely decoded. See navtexdec_checkpoint.py
+
+	--index: write a sidecar index to FILE: the position of every sync,
+		sync loss, "ZCZC" and "NNNN" (and a point every --index-interval
+		bits, default: 65536), with the decoder state at that point
+	--use-index: with --range or --last, start decoding at the state of
+		the last index point before the start of the range, instead of
+		searching sync. The output starts at the start of the range. The
+		index of an other (or a shorter) file is refused
+		See navtexdec_index.py
+
+	--profile: print the wall and cpu time per decoder stage (input, sync
+		search, fec, char lookup, output) on stderr, at exit and on SIGUSR1
+		--profile-interval: sample interval (default: 0.002 seconds)
+		See navtexdec_profile.py
+
+	--flush: flush the output on "eol" (end of line), "msg" (end of a NAVTEX
+		message, "NNNN"), "all" (every character) or "none" (comma separated)
+	--flush-delay: flush the output when it is buffered for this many seconds
+	--bufsize: flush the output when this many characters are buffered
+		(default for a file: output is only flushed when the buffer is full,
+		for live input (stdin, pipe, tty): "eol,msg" and 1 second)
+
+Use as module:
+	from navtexdec import navtexdecoder
+	dec=navtexdecoder()
+	for (event,value,pos) in dec.feed(data): ...
+	(see class "navtexdecoder" for the events)
+
 
 Version 0.1.0: 2020/Apr/11
 (C) Kristoff Bonne (ON1ARF)
@@ -35,389 +135,1186 @@ printposition=False
 
 
 
-def navtexdec():
-
-	# global data
-	# CCIR 476 character set
-	# source: http://search.itu.int/history/HistoryDigitalCollectionDocLibrary/1.43.48.en.104.pdf
-
-	ccir476={
-		b'\x00\x00\x00\x01\x01\x01\x01':('<ALPHA>','<ALPHA>'),
-
-		b'\x00\x00\x01\x00\x01\x01\x01':('J','\a'), # \a = BELL (aka \x07)
-		b'\x00\x00\x01\x01\x00\x01\x01':('F','!'),
-		b'\x00\x00\x01\x01\x01\x00\x01':('C',':'),
-		b'\x00\x00\x01\x01\x01\x01\x00':('K','('),
-
-		b'\x00\x01\x00\x00\x01\x01\x01':('W','2'),
-		b'\x00\x01\x00\x01\x00\x01\x01':('Y','6'),
-		b'\x00\x01\x00\x01\x01\x00\x01':('P','0'),
-		b'\x00\x01\x00\x01\x01\x01\x00':('Q','1'),
-
-		b'\x00\x01\x01\x00\x00\x01\x01':('<BETA>','<BETA>'),
-		b'\x00\x01\x01\x00\x01\x00\x01':('G','&'),
-		b'\x00\x01\x01\x00\x01\x01\x00':('<FIGS>','<FIGS>'),
-		b'\x00\x01\x01\x01\x00\x00\x01':('M','.'),
-		b'\x00\x01\x01\x01\x00\x01\x00':('X','/'),
-		b'\x00\x01\x01\x01\x01\x00\x00':('V','='),
-
-		b'\x01\x00\x00\x00\x01\x01\x01':('A','-'),
-		b'\x01\x00\x00\x01\x00\x01\x01':('S','\''),
-		b'\x01\x00\x00\x01\x01\x00\x01':('I','8'),
-		b'\x01\x00\x00\x01\x01\x01\x00':('U','7'),
-
-		b'\x01\x00\x01\x00\x00\x01\x01':('D','$'),
-		b'\x01\x00\x01\x00\x01\x00\x01':('R','4'),
-		b'\x01\x00\x01\x00\x01\x01\x00':('E','3'),
-		b'\x01\x00\x01\x01\x00\x00\x01':('N',','),
-		b'\x01\x00\x01\x01\x00\x01\x00':('<LTRS>','<LTRS>'),
-		b'\x01\x00\x01\x01\x01\x00\x00':(' ',' '),
-
-		b'\x01\x01\x00\x00\x00\x01\x01':('Z','+'),
-		b'\x01\x01\x00\x00\x01\x00\x01':('L',')'),
-		b'\x01\x01\x00\x00\x01\x01\x00':('<RC>','<RC>'),
-		b'\x01\x01\x00\x01\x00\x00\x01':('H','#'),
-		b'\x01\x01\x00\x01\x00\x01\x00':('<CH32>','<CH32>'),
-		b'\x01\x01\x00\x01\x01\x00\x00':("\r","\r"),
-
-
-		b'\x01\x01\x01\x00\x00\x00\x01':('O','9'),
-		b'\x01\x01\x01\x00\x00\x01\x00':('B','?'),
-		b'\x01\x01\x01\x00\x01\x00\x00':('T','5'),
-		b'\x01\x01\x01\x01\x00\x00\x00':("\n","\n")}
-	#end CCIR 476 table
-
-	# CCIR 476 characters '<ALPHA>' and '<RC>' defined as list.
-	# used seperately in the program
-	alpha=[0,0,0,1,1,1,1]
-	rc=[1,1,0,0,1,1,0]
-
-
-	# some internal support functions
-
-	def __isvalidresponse__(x1,x2):
-		# returns true if
-		# 		x1 = x2
-		#		'ALPHA' as response to 'Sync Response'
-		return True if (x1 == x2) or (x1,x2) == (rc,alpha) else False
-	#end def equal response
-
-
-	# "printchar" defined as class, as it needs to maintain the "table" state
-	class printchar():
-
-		def __init__(self,table=0,printall=False):
-			self.table=table
-			self.printall=printall
-		#end def __init__
-
-		def out(self,inchar):
-			try:
-				towritechar=ccir476[inchar][self.table]
-			except KeyError:
-				towritechar=inchar
-			#end try
-
-
-			if towritechar == '<LTRS>':
-				# change to "letters" table
-				if self.printall: print('<LTRS>',flush=True,end='')
-				self.table=0
-			elif towritechar == '<FIGS>':
-				# change to "figures" table
-				if self.printall: print('<FIGS>',flush=True,end='')
-				self.table=1
-			elif towritechar in ('<ALPHA>','<BETA>','<RC>','<CH32>'):
-				# do not print special characters
-				if self.printall: print(towritechar,flush=True,end='')
-				#pass
-			elif towritechar in ('\r',):
-				# do not print LF
-				pass
-			elif towritechar:
-				# is there actually something to print?
-				print(towritechar, end='',flush=True)
-			#end elif - elif - elif - if
+# CCIR 476 character set
+# source: http://search.itu.int/history/HistoryDigitalCollectionDocLibrary/1.43.48.en.104.pdf
+# (7bit chars written with the last received bit as most significant bit)
 
-			return table
-		#end def
-	#end class 'printchar'
+ccir476={
+	0b0001111:('<ALPHA>','<ALPHA>'),
 
+	0b0010111:('J','\a'), # \a = BELL (aka \x07)
+	0b0011011:('F','!'),
+	0b0011101:('C',':'),
+	0b0011110:('K','('),
 
+	0b0100111:('W','2'),
+	0b0101011:('Y','6'),
+	0b0101101:('P','0'),
+	0b0101110:('Q','1'),
 
-	# ####################################
-	######################################
-	# main part of the function start here
+	0b0110011:('<BETA>','<BETA>'),
+	0b0110101:('G','&'),
+	0b0110110:('<FIGS>','<FIGS>'),
+	0b0111001:('M','.'),
+	0b0111010:('X','/'),
+	0b0111100:('V','='),
 
+	0b1000111:('A','-'),
+	0b1001011:('S','\''),
+	0b1001101:('I','8'),
+	0b1001110:('U','7'),
 
-	pch=printchar()
+	0b1010011:('D','$'),
+	0b1010101:('R','4'),
+	0b1010110:('E','3'),
+	0b1011001:('N',','),
+	0b1011010:('<LTRS>','<LTRS>'),
+	0b1011100:(' ',' '),
 
-	try:
-		fname=sys.argv[1]
-	except IndexError:
-		fname=0 # standard in
-	#endtry
+	0b1100011:('Z','+'),
+	0b1100101:('L',')'),
+	0b1100110:('<RC>','<RC>'),
+	0b1101001:('H','#'),
+	0b1101010:('<CH32>','<CH32>'),
+	0b1101100:("\r","\r"),
 
-	#"-' also means stdint
-	if fname == "-":
-		fname=0
-	#end if
 
-	# open file or stdin as binary
-	f=open(fname,"rb")
+	0b1110001:('O','9'),
+	0b1110010:('B','?'),
+	0b1110100:('T','5'),
+	0b1111000:("\n","\n")}
+#end CCIR 476 table
 
 
 
+# 7bit chars are processed as integers, in the order the bits are received
+# (first received bit = most significant bit), so they can be shifted in bit
+# by bit. All properties of a char are found in 128 entry lookup tables.
 
-	# init some vars
-	fecscore=0
+# bit reversal: converts between "received" order and "ccir476 table" order
+symrev=[int("{:07b}".format(i)[::-1],2) for i in range(128)]
 
-	# "letter" or "figures"
-	table=0
+# True if the char contains four '1' bits
+symvalid=[bin(i).count("1") == 4 for i in range(128)]
 
-	#fec memory buffer
-	# create with same structure as used in the code
-	fecmem=[[True,[0 in range(7)]],[True,[0 in range(7)]],[True,[0 in range(7)]]]
-	fecmemptr=0
-	fecstate=0
+# (letters, figures) character. Not valid chars are printed as '*'
+symchar=[ccir476.get(symrev[i],('*','*')) for i in range(128)]
 
-	#total byte counter
-	totalbitcount=0
+# type of char, used by "printchar"
+sym_print=0 # printable char
+sym_ltrs=1 # change to "letters" table
+sym_figs=2 # change to "figures" table
+sym_special=3 # not printed: <ALPHA>, <BETA>, <RC>, <CH32>
+sym_cr=4 # not printed: carriage return
 
+def __symclass__(c):
+	if c == '<LTRS>': return sym_ltrs
+	if c == '<FIGS>': return sym_figs
+	if c in ('<ALPHA>','<BETA>','<RC>','<CH32>'): return sym_special
+	if c == '\r': return sym_cr
+	return sym_print
+#end def __symclass__
 
+symclass=[__symclass__(symchar[i][0]) for i in range(128)]
 
-	#endless loop, break out with 'break' at the end of the file
+# CCIR 476 characters '<ALPHA>' and '<RC>', used seperately in the program
+sym_alpha=symrev[0b0001111]
+sym_rc=symrev[0b1100110]
 
-	while True:
+# error (no valid char received), printed as '*'
+sym_err=0
 
-		if totalbitcount == 0:
-			print("\n### Syncronizing",flush=True)
-		else:
-			print("\n### Syncronisation lost ... Resyncronizing",flush=True)
+# 7 bits as received (one bit per byte) -> 7bit char
+# key: the 7 bytes as big-endian integer
+bits2sym={int.from_bytes(bytes([(i >> (6-j)) & 1 for j in range(7)]),"big"):i for i in range(128)}
+
+
+
+def __isvalidresponse__(x1,x2):
+	# returns true if
+	# 		x1 = x2
+	#		'ALPHA' as response to 'Sync Response'
+	return True if (x1 == x2) or (x1,x2) == (sym_rc,sym_alpha) else False
+#end def equal response
+
+
+
+# "syncdetect": sliding 70 bit (= 10 * 7bit char) window used during "state 1" (sync search)
+#
+# The window is stored as one integer, oldest bit as most significant bit, so
+# 7bit char 'i' of the window (i = 0 ... 9) is (window >> 7*(9-i)) & 0x7f,
+# with the first received bit as most significant bit of the char.
+#
+# The number of '1' bits of every char is kept in a second integer, using the
+# same 7 bit wide fields as the window. When a bit is shifted in, every char
+# loses its oldest bit and gets the oldest bit of the next char (or the new bit
+# for the last char), so all ten counters are updated with a few integer operations.
+# The (more expensive) checks of rule 2 and 3 are only done when rule 1 is ok.
+
+class syncdetect():
+	nbits=70
+	mask=(1<<70)-1
+	fieldlsb=sum([1<<(7*i) for i in range(10)]) # lowest bit of every 7bit field
+	allfour=4*fieldlsb # all 10 chars have four '1' bits
+
+	def __init__(self):
+		self.window=0
+		self.nbit=0
+	#end def __init__
+
+
+	def load(self,bits):
+		# fill the window with 70 bits, returns True if this is a valid sync
+		self.window=0
+		self.nbit=0
+
+		for b in bits[:self.nbits]:
+			self.push(b)
+		#end for
+
+		return self.check()
+	#end def load
+
+
+	def push(self,bit):
+		# shift in one new bit, returns True if the window is now a valid sync
+		w=self.window
+
+		# oldest bit of every char, moved to the lowest bit of the field
+		oldest=(w >> 6) & self.fieldlsb
+
+		# leaving: oldest bit of every char
+		# entering: oldest bit of the next char (one field up), or the new bit for the last char
+		self.nbit+=((oldest << 7 | (1 if bit else 0)) & self.mask) - oldest
+		self.window=((w << 1) | (1 if bit else 0)) & self.mask
+
+		if self.nbit != self.allfour: return False
+
+		return self.check()
+	#end def push
+
+
+	def check(self):
+		# sync check:
+
+		# rule 1: all 7chars should contain 4 '1' bits
+		if self.nbit != self.allfour: return False
+
+		w=self.window
+		c0=(w >> 63) & 0x7f
+		c2=(w >> 49) & 0x7f
+		c4=(w >> 35) & 0x7f
+		c5=(w >> 28) & 0x7f
+		c7=(w >> 14) & 0x7f
+		c9=w & 0x7f
+
+		# rule 2: not all chars should be the same
+		if c9 == c7 == c5: return False
+
+		# rule 3: char 5, 7 and 9 should be a reply to 0, 2 and 4
+		# (same character, or 'RC' as reply to 'ALPHA')
+		for (rx,dx) in ((c9,c4),(c7,c2),(c5,c0)):
+			if not __isvalidresponse__(rx,dx): return False
+		#end for
+
+		return True
+	#end def check
+
+
+	def chars(self):
+		# return the window as 10 7bit chars
+		w=self.window
+		return [(w >> (7*(9-i))) & 0x7f for i in range(10)]
+	#end def chars
+
+#end class syncdetect
+
+
+
+# packed input: 8 bits per byte
+# lookup tables to convert one byte into 8 bytes 0x00 / 0x01, for both bit orders
+unpack_msb=[bytes([(i >> (7-j)) & 1 for j in range(8)]) for i in range(256)]
+unpack_lsb=[bytes([(i >> j) & 1 for j in range(8)]) for i in range(256)]
+
+def unpackbits(data,bitorder="msb"):
+	# convert packed data (8 bits per byte) to one bit per byte
+	# the conversion of the complete buffer is done in one call to "join"
+	table=unpack_msb if bitorder == "msb" else unpack_lsb
+	return b''.join(map(table.__getitem__,data))
+#end def unpackbits
+
+
+
+# "bitreader": block buffered input from file or stdin
+#
+# Data is read in large blocks into a preallocated buffer, and passed to the
+# decoder as a memoryview of that buffer (no copy of the data).
+
+class bitreader():
+	def __init__(self,f,blocksize=65536):
+		self.f=f
+		self.buff=bytearray(blocksize)
+		self.view=memoryview(self.buff)
+	#end def __init__
+
+
+	def read(self):
+		# read the next block, returned as a memoryview of the buffer
+		# (the buffer is reused, so the data is only valid up to the next call)
+		# an empty memoryview is returned at the end of the file
+		n=self.f.readinto(self.view)
+		return self.view[:n or 0]
+	#end def read
+
+
+	def close(self):
+		# nothing to do (same interface as "mmapreader")
+		pass
+	#end def close
+
+#end class bitreader
+
+
+
+# "mmapreader": file input with mmap
+#
+# The file is mapped in memory and passed to the decoder as a memoryview of
+# the mapping: the data is not copied, and processes that decode the same file
+# share the page cache. Only the bits from "start" up to "end" are returned
+# (packed data: from the byte with bit "start", up to the byte with bit "end",
+# see "skipbits" of "navtexdecoder")
+
+class mmapreader():
+	def __init__(self,f,bitorder=None,start=0,end=None,blocksize=65536):
+		bpb=8 if bitorder else 1 # bits per byte
+		size=os.fstat(f.fileno()).st_size
+
+		self.pos=min(start//bpb,size)
+		self.end=size if end is None else min(-(-end//bpb),size)
+		self.blocksize=blocksize
+
+		# an empty file can not be mapped
+		self.mm=mmap.mmap(f.fileno(),0,access=mmap.ACCESS_READ) if size else None
+		self.view=memoryview(self.mm) if self.mm else memoryview(b'')
+	#end def __init__
+
+
+	def read(self,n=None):
+		# returns the next block (at most "n" bytes, default "blocksize") as
+		# a memoryview of the mapped file, b'' at the end of the range
+		if self.pos >= self.end: return b''
+
+		stop=min(self.pos+(n or self.blocksize),self.end)
+		data=self.view[self.pos:stop]
+		self.pos=stop
+		return data
+	#end def read
+
+
+	def close(self):
+		# (the memoryviews returned by "read" should not be used anymore)
+		self.view.release()
+		if self.mm: self.mm.close()
+	#end def close
+
+#end class mmapreader
+
+
+
+# batch mode: sync search on a complete block of data at once (requires numpy)
+
+def findsync(bits):
+	# bits: numpy array, one bit per element
+	# returns the (sorted) end positions 'e' of all windows bits[e-70:e] that are
+	# a valid sync, using the same rules as "syncdetect.check"
+	b=(bits != 0).astype(np.uint8)
+	nwin=len(b)-69
+	if nwin < 1: return np.zeros(0,dtype=np.int64)
+
+	# 7bit char and number of '1' bits, starting at every bit position
+	nchar=len(b)-6
+	c7=np.zeros(nchar,dtype=np.uint8)
+	nbit=np.zeros(nchar,dtype=np.uint8)
+	for i in range(7):
+		c7=(c7 << 1) | b[i:i+nchar]
+		nbit+=b[i:i+nchar]
+	#end for
+
+	# char 'i' of every window
+	char7=[c7[7*i:7*i+nwin] for i in range(10)]
+
+	# rule 1: all 7chars should contain 4 '1' bits
+	ok=np.ones(nwin,dtype=bool)
+	for i in range(10):
+		ok&=(nbit[7*i:7*i+nwin] == 4)
+	#end for
+
+	# rule 2: not all chars should be the same
+	ok&=~((char7[9] == char7[7]) & (char7[7] == char7[5]))
+
+	# rule 3: char 5, 7 and 9 should be a reply to 0, 2 and 4
+	for (rx,dx) in ((9,4),(7,2),(5,0)):
+		ok&=(char7[rx] == char7[dx]) | ((char7[rx] == sym_rc) & (char7[dx] == sym_alpha))
+	#end for
+
+	return np.flatnonzero(ok)+70
+#end def findsync
+
+
+
+# "navtexdecoder": the NAVTEX decoder, holding the complete decoder state
+#
+# Data is pushed into the decoder with "feed", this returns a list of events,
+# as tuples (event,value,position):
+#	("syncing",None,pos): start of sync search, at the start of the stream
+#	("synclost",None,pos): syncronisation lost, start of resync
+#	("sync",None,pos): syncronisation success
+#	("char",c,pos): decoded character (including "\n", and "*" for errors)
+#	("ctrl",c,pos): special character: <LTRS>, <FIGS>, <ALPHA>, <BETA>, <RC> or <CH32>
+# "pos" is the number of bits received up to the event
+#
+# bitorder: None: one bit per byte, "msb"/"lsb": packed data (see "unpackbits")
+# batch: search sync on all data passed to "feed" at once (see "findsync", requires numpy)
+# startpos: position (in bits) of the first bit, when not decoding from the start of a stream
+
+class navtexdecoder():
+	# decoder states
+	st_load=0 # start of the stream: load the first 70 bits
+	st_sync=1 # state 1: look for sync
+	st_data=2 # state 2: read data 7bitchar per 7bitchar
+
+	def __init__(self,bitorder=None,batch=False,startpos=0,lookback=0,skipbits=0):
+		if batch and np is None:
+			raise RuntimeError("batch mode requires numpy")
 		#end if
 
-		# DEBUG
-		if printposition: print("## Position:",totalbitcount)
+		self.bitorder=bitorder
+		self.batch=batch
+
+		# number of bits of the first data that are not decoded
+		# (start in the middle of a byte of packed data)
+		self.skipbits=skipbits
+
+		# lookback: on sync loss, search sync in up to "lookback" bits
+		# received since the last sync (see "__lookback__")
+		self.lookback=lookback
+		self.history=bytearray()
+		self.tables=[(startpos,0)] # (position,table) of every table change in "history"
+		self.syncpos=startpos # position of the last sync
+		self.losspos=startpos # position of the last sync loss
+		self.lookbackchain=3 # minimum number of syncs 14 bits apart for a bit slip
+
+		self.state=self.st_load
+		self.sync=syncdetect()
+
+		# the sync window only contains bits directly before the current position
+		# from position "freshpos" on (on resync, the search continues with the
+		# window of the previous sync)
+		self.freshpos=startpos+70
+
+		# bits of a 7bit char not yet completely received (state 2)
+		self.partial=b''
+
+		# "letter" or "figures"
+		self.table=0
+
+		#fec memory buffer: (valid,7bit char)
+		self.fecmem=[(True,sym_err),(True,sym_err),(True,sym_err)]
+		self.fecmemptr_wr=0
+		self.fecmemptr_rd=0
+		self.fecstate=0
+		self.fecscore=0
+
+		# number of characters received per "fecscore" (0 .. 20)
+		self.fechist=[0]*21
+
+		#total bit counter
+		self.startpos=startpos
+		self.totalbitcount=startpos
 
+		self.events=[("syncing",None,startpos)]
+	#end def __init__
 
 
+	def feed(self,data):
+		# process received data, returns list of events
+		if self.bitorder: data=unpackbits(data,self.bitorder)
+
+		if self.skipbits:
+			k=min(self.skipbits,len(data))
+			data=data[k:]
+			self.skipbits-=k
+		#end if
+
+		n=len(data)
+		i=0
+
+		# batch mode: sync positions in "data", calculated when needed
+		self.index=None
+
+		while i < n:
+			if self.state == self.st_data:
+				i=self.__datastate__(data,i,n)
+				if self.lookback and self.state != self.st_data: self.__lookback__(data,i)
+			else:
+				i=self.__syncstate__(data,i,n)
+			#end else - if
+		#end while
+
+		self.index=None
+
+		if self.lookback:
+			# keep the last "lookback" bits
+			self.history+=data
+			del self.history[:-self.lookback]
+
+			# table changes: the last one before "history" is the table at its start
+			first=self.totalbitcount-self.lookback
+			k=0
+			while k+1 < len(self.tables) and self.tables[k+1][0] <= first:
+				k+=1
+			#end while
+			del self.tables[:k]
+		#end if
+
+		events=self.events
+		self.events=[]
+		return events
+	#end def feed
+
+
+	def fingerprint(self):
+		# the part of the decoder state that determines the output from now on
+		# two decoders with the same fingerprint produce the same output for the same input
+		# (this does not include the bit position)
+		if self.state == self.st_load:
+			return (self.state,self.sync.window,self.totalbitcount-self.startpos)
+		#end if
+
+		if self.state == self.st_sync:
+			# fec memory, pointers and score are re-initialised on sync
+			return (self.state,self.sync.window,self.table)
+		#end if
+
+		# fec memory, relative to the "read" pointer
+		rd=self.fecmemptr_rd
+		fecmem=tuple(self.fecmem[rd:]+self.fecmem[:rd])
+		return (self.state,self.sync.window,self.table,self.partial,fecmem,(self.fecmemptr_wr-rd)%3,self.fecstate,self.fecscore)
+	#end def fingerprint
+
+
+	def __syncstate__(self,data,i,n):
 		# state 1: look for sync
+		# returns the position in "data" of the first bit not yet processed
+		sync=self.sync
 
 		# start with 10 char buffer (= 70 bits)
-		# only done at the beginning of the file / stdin
-		if totalbitcount == 0:
-			buf=list(f.read(70))
-			
-			if len(buf) < 70: return False # break out on end of file
-			
-			totalbitcount+=70
+		# only done at the beginning of the stream
+		while self.state == self.st_load:
+			if i >= n: return i
+
+			insync=sync.push(data[i])
+			i+=1
+			self.totalbitcount+=1
+
+			if self.totalbitcount-self.startpos == 70:
+				self.state=self.st_sync
+
+				if insync:
+					self.__syncok__()
+					return i
+				#end if
+			#end if
+		#end while
+
+		# batch mode: the index can be used from the position on where the sync
+		# window is the 70 bits in "data" before the current position
+		if self.batch:
+			stop=min(n,max(i,70,i+self.freshpos-self.totalbitcount))
 		else:
-			n=list(f.read(1))
+			stop=n
+		#end else - if
 
-			if len(n) < 1: return False # break out on end of file
-			
-			buf.pop(0)
-			buf.append(n[0])
-			totalbitcount+=1
+		# sync check, bit per bit: see class "syncdetect"
+		push=sync.push
+		start=i
+
+		while i < stop:
+			insync=push(data[i])
+			i+=1
+
+			if insync:
+				self.totalbitcount+=i-start
+				self.__syncok__()
+				return i
+			#end if
+		#end while
+
+		self.totalbitcount+=i-start
+
+		if i >= n: return i
+
+		# batch mode: jump to next sync position in "data"
+		if self.index is None:
+			self.index=findsync(np.frombuffer(data,dtype=np.uint8))
 		#end if
 
-		# clear tempory buffer used to transfer data from "state 1' (sync) to "state 2"
-		tmpbuff=[]
+		k=np.searchsorted(self.index,i+1)
+		end=int(self.index[k]) if k < len(self.index) else n
+
+		sync.load(data[end-70:end])
+		self.totalbitcount+=end-i
+
+		if k < len(self.index): self.__syncok__()
+
+		return end
+	#end def __syncstate__
+
+
+	def __syncok__(self):
+		# syncronisation success: we have valid data
+		self.events.append(("sync",None,self.totalbitcount))
+		self.syncpos=self.totalbitcount
+
+		# convert 70 bits into 10 * 7bit char
+		char7=self.sync.chars()
+
+		# init data for state 2:
+
+		# store previously received data in fecmemory
+		self.fecmem[0]=(True,char7[6])
+		self.fecmem[1]=(True,char7[8])
+		self.fecmemptr_wr=2 # init "write" pointer
+		self.fecmemptr_rd=0 # init "read " pointer
+
+		# fecstate: 0: read data 1ste time, 1: read data 2nd  time -> check if the same as read during "fecstate"
+		# note: the 'fecstate=1' character is received 5 characters of the 'fecstate=0' character
+		# more info:
+		# source: http://search.itu.int/history/HistoryDigitalCollectionDocLibrary/1.43.48.en.104.pdf
+		# http://www.frisnit.com/navtex/?id=navtex_data_format
+		self.fecstate=0 # next byte we are going to read is a "1st data" byte
+		self.fecscore=2 # we have two correct characters -> score is 2
+
+		self.state=self.st_data
 
+		# output 3 first 7chars
+		for c in (char7[0],char7[2],char7[4]):
+			self.__char__(c)
+		#end for
+	#end def __syncok__
+
+
+	def __lookback__(self,data,i):
+		# sync lost (at position "i" in "data"), with lookback
+		# The bits received since the last sync and the last sync loss (at most
+		# "lookback" bits) are searched for a bit slip: a sync with an other bit
+		# alignment than the last sync.
+		# With the right alignment, there is a valid sync window every 14 bits
+		# (one DX/RX pair), so starting from the sync closest to the sync loss,
+		# the search goes back as long as there are syncs 14 bits apart. The
+		# data is decoded again from the first sync of that chain on, the events
+		# of that data have a position before the "synclost" event.
+		# If no sync is found, the sync search continues with the last 70 bits
+		# in the sync window, instead of the window of the last sync.
+		end=self.totalbitcount
+		start=max(self.syncpos,self.losspos,end-self.lookback)
+		need=end-start
+		self.losspos=end
+
+		# bits from "start" up to "end": in "history" and "data"
+		if need <= i:
+			hist=bytes(data[i-need:i])
+		else:
+			hist=bytes(self.history[max(0,len(self.history)-(need-i)):])+bytes(data[:i])
+			start=end-len(hist)
+		#end else - if
 
-		#endless loop (for 'sync' state)
+		n=len(hist)
+		if n < 70: return
 
-		while True:
-			# convert 70 bits into 10 * 7bit char
-			char7=[buf[i*7:(i+1)*7] for i in range(10)]
+		# end positions of all sync windows in "hist", not with the old alignment
+		phase=self.syncpos % 7
+
+		if self.batch:
+			index=[int(k) for k in findsync(np.frombuffer(hist,dtype=np.uint8)) if (start+k) % 7 != phase]
+		else:
+			sync=syncdetect()
+			index=[70] if sync.load(hist) and (start+70) % 7 != phase else []
+
+			push=sync.push
+			for k in range(70,n):
+				if push(hist[k]) and (start+k+1) % 7 != phase: index.append(k+1)
+			#end for
+		#end else - if
+
+		# chain of syncs 14 bits apart (at most 3 missing), back from the last sync
+		k=index[-1] if index else None
+		found=set(index)
+		chain=1
+
+		while k is not None:
+			prev=[k-14*j for j in (1,2,3,4) if k-14*j in found]
+			if not prev: break
+
+			k=prev[0]
+			chain+=1
+		#end while
+
+		self.sync=syncdetect()
+
+		if chain < self.lookbackchain or k is None:
+			# no bit slip found
+			self.sync.load(hist[-70:])
+			self.freshpos=end
+			return
+		#end if
+
+		# sync found: decode the bits up to "end" again, with the table at the
+		# start of the chain (the table changes of the garbled text after it
+		# are not used)
+		self.sync.load(hist[k-70:k])
+		self.totalbitcount=start+k
+		self.table=self.__tableat__(start+k)
+		self.__syncok__()
+
+		index=self.index
+		self.index=None
+
+		while k < n:
+			if self.state == self.st_data:
+				k=self.__datastate__(hist,k,n)
+			else:
+				k=self.__syncstate__(hist,k,n)
+			#end else - if
+		#end while
 
+		self.index=index
+	#end def __lookback__
 
-			# count the number of '1' bits
-			nbit=[len(list(filter(lambda x: x,c7))) for c7 in char7] 
 
+	def __tableat__(self,pos):
+		# table at position "pos" (lookback), the later table changes are removed
+		tables=self.tables
+		k=len(tables)
+		while k > 1 and tables[k-1][0] > pos:
+			k-=1
+		#end while
 
-			# sync check:
+		del tables[k:]
+		return tables[-1][1]
+	#end def __tableat__
 
-			# rule 1: all 7chars should contain 4 '1' bits
-			# rule 2: not all chars should be the same
-			# rule 3: char 5, 7 and 9 should be a reply to 0, 2 and 4
-			if (len(list(filter(lambda x: x != 4, nbit))) != 0) or (char7[9]==char7[7]==char7[5]) or  (not __isvalidresponse__(char7[9][::-1],char7[4][::-1])) or (not __isvalidresponse__(char7[7][::-1],char7[2][::-1])) or (not __isvalidresponse__(char7[5][::-1],char7[0][::-1])):
 
-				# not yet syncronised -> get next bit
-				n=list(f.read(1))
-				if len(n) < 1: return False # break out at end of file
+	def __datastate__(self,data,i,n):
+		# state 2: read data 7bitchar per 7bitchar
+		# returns the position in "data" of the first bit not yet processed
 
-				# shift down stack and add new bit at the end
-				buf.pop(0)
-				buf.append(n[0])
+		# complete 7bitchar of which the first bits were received earlier
+		if self.partial:
+			k=7-len(self.partial)
 
-				totalbitcount+=1
-				continue
+			if n-i < k:
+				self.partial+=bytes(data[i:n])
+				return n
 			#end if
 
+			p=self.partial+bytes(data[i:i+k])
+			self.partial=b''
+			i+=k
 
-			# syncronisation success: we have valid data
+			self.totalbitcount+=7
+			if not self.__fec__(bits2sym[int.from_bytes(p,"big")]): return i
+		#end if
 
-			# init data for state 2:
+		while n-i >= 7:
+			# read 7 bits, convert to 7bit char
+			pl=bits2sym[int.from_bytes(data[i:i+7],"big")]
+			i+=7
 
-			# write 3 first 7chars to tempory buffer
-			tmpbuff=[char7[0],char7[2],char7[4]]
+			self.totalbitcount+=7
+			if not self.__fec__(pl): return i
+		#end while
 
-			# store previously received data in fecmemory
-			fecmem[0]=(True,char7[6][::-1])
-			fecmem[1]=(True,char7[8][::-1])
-			fecmemptr_wr=2 # init "write" pointer
-			fecmemptr_rd=0 # init "read " pointer
+		# keep remaining bits up to the next call
+		self.partial=bytes(data[i:n])
+		return n
+	#end def __datastate__
 
-			# fecstate: 0: read data 1ste time, 1: read data 2nd  time -> check if the same as read during "fecstate"
-			# note: the 'fecstate=1' character is received 5 characters of the 'fecstate=0' character
-			# more info:
-			# source: http://search.itu.int/history/HistoryDigitalCollectionDocLibrary/1.43.48.en.104.pdf
-			# http://www.frisnit.com/navtex/?id=navtex_data_format
-			fecstate=0 # next byte we are going to read is a "1st data" byte
-			fecscore=2 # we have two correct characters -> score is 2
 
-			# jump out of loop
-			break
-		#end while (state 1)
+	def __fec__(self,pl):
+		# process one 7bit char in state 2
+		# returns False if syncronisation is lost
 
+		# cntok is 'true' if 4 'one' bits
+		cntok=symvalid[pl]
 
+		# FEC state, 0: read character 1st time, 1: read character 2nd time -> compair to character received during fecstate 0
 
-		print("### Syncronisation Success",flush=True)
-		if printposition: print("## Position:",totalbitcount)
+		if self.fecstate == 0:
+			# FEC state 0: store character in fec memory
+			self.fecmem[self.fecmemptr_wr]=(cntok,pl)
 
+			#move up fecmem "write" pointer
+			self.fecmemptr_wr+=1
+			if self.fecmemptr_wr >= 3: self.fecmemptr_wr = 0
 
-		# output characters in tempory buffer (see "state 1" above)
-		for buffelem in tmpbuff:
-			pch.out(bytes(buffelem[::-1]))
-		#end for
+			self.fecstate = 1
+			return True # get next character
+		#end if (fecstate 0)
 
-		# state 2:
-		# read data 7bitchar per 7bitchar
+		#fec state 1: compaire data with previously stored data
 
-		while True:
-			# read 7 bits
-			p=f.read(7)
-			pl=list(p)
+		#init vars
+		towritechar=sym_err
+		donotchangefecstate=False
 
-			totalbitcount+=7
+		# read earlier received character from fecmem
+		(prev_cntok,prev_pl)=self.fecmem[self.fecmemptr_rd]
+		# move up fecmem pointer
+		self.fecmemptr_rd+=1
+		if self.fecmemptr_rd >= 3: self.fecmemptr_rd=0
 
-			if len(p) < 7: return False # break out at end of file
+		# rule 0: Special casse:
+		# receive a 'rc' in responds to an 'alpha' ... reverse RX/TX order -> change fecstate
+		# so process this as 'fecstate = 0' state
+		if (prev_cntok,cntok,prev_pl,pl) == (True,True,sym_alpha,sym_rc):
+			# do same as "fecstate = 0' above
+			# store data in fec memory
+			self.fecmem[self.fecmemptr_wr]=(cntok,pl)
 
-			# invert the order of the bits
-			pl=pl[::-1]
+			#inclease fecmem pointer
+			self.fecmemptr_wr+=1
+			if self.fecmemptr_wr >= 3: self.fecmemptr_wr = 0
 
-			# cntok is 'true' if 4 'one' bits
-			cnt=len(list(filter(lambda x: x,p)))
-			cntok=True if cnt == 4 else False
+			# do not change fec-state anymore (so it stays at 1)
+			donotchangefecstate=True
 
-			# FEC state, 0: read character 1st time, 1: read character 2nd time -> compair to character received during fecstate 0
+		# rule1: if current char and previous char are ok (i.e. four '1' bits)
+		elif prev_cntok and cntok:
+			# are they the same?
+			if __isvalidresponse__(prev_pl,pl):
+				# yes, new and previous character match -> output it
+				towritechar=pl
 
-			if fecstate == 0:
-				# FEC state 0: store character in fec memory
-				fecmem[fecmemptr_wr]=(cntok,pl)
+				# increase score
+				if self.fecscore < 20: self.fecscore+=1
 
-				#move up fecmem "write" pointer
-				fecmemptr_wr+=1
-				if fecmemptr_wr >= 3: fecmemptr_wr = 0
+			else:
+				# we received two different chars -> Error -> output a '*'
+				towritechar=sym_err
+			#end if
 
-				fecstate = 1
-				continue # get next character
+		elif prev_cntok and not cntok:
+			# new character is not correct (not four '1' bits) -> output previous character
+			towritechar=prev_pl
 
-			#end if (fecstate 0)
+		elif not prev_cntok and cntok:
+			# previous character was not correct (not four '1' bits) -> output new character
+			towritechar=pl
 
-			if fecstate == 1:
-				#fec state 1: compaire data with previously stored data
+		else:
+			# both previous and new character are not correct (not four '1' bits) -< error -> output a '*'
+			towritechar=sym_err
 
-				#init vars
-				towritechar=""
-				donotchangefecstate=False
+			# decrease score
+			if self.fecscore > 0: self.fecscore-=1
+		#end else - elsif - elsif - ik
 
-				# read earlier received character from fecmem
-				(prev_cntok,prev_pl)=fecmem[fecmemptr_rd]
-				# move up fecmem pointer
-				fecmemptr_rd+=1
-				if fecmemptr_rd >= 3: fecmemptr_rd=0
 
-				# rule 0: Special casse:
-				# receive a 'rc' in responds to an 'alpha' ... reverse RX/TX order -> change fecstate
-				# so process this as 'fecstate = 0' state
-				if (prev_cntok,cntok,prev_pl,pl) == (True,True,alpha,rc):
-					# do same as "fecstate = 0' above
-					# store data in fec memory
-					fecmem[fecmemptr_wr]=(cntok,pl)
+		# actually output character, if not rule 0
+		if not donotchangefecstate:
+			# not 'special rule 0'
+			self.__char__(towritechar)
+			self.fecstate = 0
+			self.fechist[self.fecscore]+=1
+		#end if
 
-					#inclease fecmem pointer
-					fecmemptr_wr+=1
-					if fecmemptr_wr >= 3: fecmemptr_wr = 0
 
-					# do not change fec-state anymore (so it stays at 1)
-					donotchangefecstate=True
+		# go back to state 1 (look for sync) if the fecscore has dropped to 0
+		if self.fecscore < 1:
+			self.state=self.st_sync
+			self.freshpos=self.totalbitcount+70
+			self.events.append(("synclost",None,self.totalbitcount))
+			return False
+		#end if
 
-				# rule1: if current char and previous char are ok (i.e. four '1' bits)
-				elif prev_cntok and cntok:
-					# are they the same?
-					if __isvalidresponse__(prev_pl,pl):
-						# yes, new and previous character match -> output it
-						towritechar=bytes(pl)
+		return True
+	#end def __fec__
+
+
+	def __char__(self,sym):
+		# convert 7bit char to event, using the current "letters" or "figures" table
+		c=symchar[sym][self.table]
+		cls=symclass[sym]
+
+		if cls == sym_print:
+			self.events.append(("char",c,self.totalbitcount))
+		elif cls == sym_ltrs:
+			# change to "letters" table
+			self.table=0
+			if self.lookback: self.tables.append((self.totalbitcount,0))
+			self.events.append(("ctrl",c,self.totalbitcount))
+		elif cls == sym_figs:
+			# change to "figures" table
+			self.table=1
+			if self.lookback: self.tables.append((self.totalbitcount,1))
+			self.events.append(("ctrl",c,self.totalbitcount))
+		elif cls == sym_special:
+			self.events.append(("ctrl",c,self.totalbitcount))
+		#end elif - elif - elif - if
+
+		# sym_cr: carriage return is not used
+	#end def __char__
+
+#end class navtexdecoder
+
+
+
+# "outsink": buffered text output
+#
+# Text is collected in a buffer and written to the output file when:
+#	- the buffer contains "bufsize" characters or more
+#	- flusheol: at the end of a line
+#	- flushmsg: at the end of a NAVTEX message ("NNNN")
+#	- maxdelay: the oldest text in the buffer is "maxdelay" seconds old
+#		(0: flush on every write)
+# and when "flush" or "close" is called
+
+class outsink():
+	def __init__(self,f=None,bufsize=65536,flusheol=False,flushmsg=False,maxdelay=None):
+		self.f=f if f is not None else sys.stdout
+		self.bufsize=bufsize
+		self.flusheol=flusheol
+		self.flushmsg=flushmsg
+		self.maxdelay=maxdelay
+
+		self.buff=[]
+		self.size=0
+		self.since=0 # time of the oldest text in the buffer
+		self.tail="" # last characters written, to detect "NNNN"
+
+		# number of characters written to the sink, and written to the file
+		self.written=0
+		self.flushed=0
+	#end def __init__
+
+
+	def write(self,text):
+		if self.maxdelay is not None and not self.buff: self.since=time.monotonic()
+
+		self.buff.append(text)
+		self.size+=len(text)
+		self.written+=len(text)
+
+		if self.size >= self.bufsize: return self.flush()
+
+		if self.flusheol and text[-1:] == "\n": return self.flush()
+
+		if self.flushmsg:
+			t=self.tail+text
+			self.tail=t[-3:]
+			if "NNNN" in t: return self.flush()
+		#end if
 
-						# increase score
-						if fecscore < 20: fecscore+=1
+		if self.maxdelay is not None: self.poll()
+	#end def write
 
-					else:
-						# we received two different chars -> Error -> output a '*'
-						towritechar="*"
-					#end if
 
-				elif prev_cntok and not cntok:
-					# new character is not correct (not four '1' bits) -> output previous character
-					towritechar=bytes(prev_pl)
+	def poll(self):
+		# flush if the text in the buffer is older then "maxdelay"
+		if self.buff and self.maxdelay is not None:
+			if time.monotonic()-self.since >= self.maxdelay: self.flush()
+		#end if
+	#end def poll
 
-				elif not prev_cntok and cntok:
-					# previous character was not correct (not four '1' bits) -> output new character
-					towritechar=bytes(pl)
 
-				else:
-					# both previous and new character are not correct (not four '1' bits) -< error -> output a '*'
-					towritechar='*'
+	def flush(self):
+		if self.buff:
+			self.f.write("".join(self.buff))
+			self.buff=[]
+			self.size=0
+		#end if
 
-					# decrease score
-					if fecscore > 0: fecscore-=1
-				#end else - elsif - elsif - ik
+		self.f.flush()
+		self.flushed=self.written
+	#end def flush
 
 
-				# actually output character, if not rule 0
-				if not donotchangefecstate:
-					# not 'special rule 0'
-					pch.out(towritechar)
-					fecstate = 0
-				#end if
-						
+	def outcount(self):
+		# number of characters written to the file
+		return self.flushed
+	#end def outcount
 
-				# break out of phase 2 (printing data) if the fecscore has dropped to 0
-				if fecscore < 1:
-					break
-				#end if
 
-				continue # get next character
-			#end else - if
+	def close(self):
+		self.flush()
+	#end def close
+
+#end class outsink
+
+
+# command line options for "outsink", shared by the command line tools
+# flush=None: the default depends on the input, see "outsinkfromargs"
+def outsinkargs(parser,flush="none",maxdelay=None):
+	default="%(default)s" if flush else "none for a file, eol,msg for live input"
+	parser.add_argument("--flush",default=flush,help="flush output on: 'eol' (end of line), 'msg' (end of message), 'all' (every character) or 'none', comma separated (default: %s)" % default)
+	parser.add_argument("--flush-delay",type=float,default=maxdelay,metavar="SECONDS",help="flush output when it is buffered for this long (default: %s)" % ("%(default)s" if flush else "none for a file, 1.0 for live input"))
+	parser.add_argument("--bufsize",type=int,default=65536,metavar="N",help="flush output when this many characters are buffered (default: %(default)s)")
+#end def outsinkargs
+
+
+def outsinkfromargs(parser,args,live=False):
+	# live: input from stdin, a pipe or a tty, the output should not wait
+	# for a full buffer (only used if no --flush is given, see "outsinkargs")
+	if args.flush is None:
+		args.flush="eol,msg" if live else "none"
+		if live and args.flush_delay is None: args.flush_delay=1.0
+	#end if
+
+	flush=set(args.flush.split(","))
+
+	if not flush <= {"eol","msg","all","none"}:
+		parser.error("invalid --flush value: %s" % args.flush)
+	#end if
+
+	return outsink(bufsize=args.bufsize,flusheol="eol" in flush,flushmsg="msg" in flush,maxdelay=0 if "all" in flush else args.flush_delay)
+#end def outsinkfromargs
+
+
+
+# "printevent": write the events of "navtexdecoder" to an "outsink"
+class printevent():
+
+	def __init__(self,sink,printall=False):
+		self.sink=sink
+		self.printall=printall
+	#end def __init__
+
+	def out(self,events):
+		write=self.sink.write
+
+		for (event,value,pos) in events:
+			if event == "char":
+				write(value)
+			elif event == "ctrl":
+				# do not print special characters
+				if self.printall: write(value)
+			elif event == "syncing":
+				write("\n### Syncronizing\n")
+				if printposition: write("## Position: %d\n" % pos)
+			elif event == "synclost":
+				write("\n### Syncronisation lost ... Resyncronizing\n")
+				if printposition: write("## Position: %d\n" % pos)
+			elif event == "sync":
+				write("### Syncronisation Success\n")
+				if printposition: write("## Position: %d\n" % pos)
+			#end elif - elif - elif - elif - if
+		#end for
+
+		self.sink.poll()
+	#end def out
 
-			# invalid value for fecstate
-			# we should never -> reiinit
-			break
+	def close(self):
+		self.sink.close()
+	#end def close
 
-		# end while (state 2)
+#end class printevent
 
-	#end while (endless loop)
 
-	print("done",flush=True)
+
+def navtexdec(fname=0,bitorder=None,batch=False,sink=None,printer=printevent,profile=None,lookback=0,usemmap=False,start=0,end=None,checkpoint=None,index=None,useindex=None,store=None,audio=None):
+
+	#"-' also means stdint
+	if fname == "-":
+		fname=0
+	#end if
+
+	# open file or stdin as binary
+	# (unbuffered, reading in blocks is done by "bitreader")
+	f=open(fname,"rb",buffering=0)
+
+	dec=navtexdecoder(bitorder=bitorder,batch=batch,lookback=lookback,startpos=start,skipbits=start % 8 if bitorder else 0)
+
+	# checkpoint: continue from the saved state, at the saved input position
+	# (stdin: only the state, the input is not the same)
+	# message layer, message being received: from the state before its
+	# "ZCZC", the events before the "ZCZC" are not printed again
+	skipto=None
+	restored=None
+	if checkpoint:
+		from navtexdec_checkpoint import inputlabel
+		restored=checkpoint.add(dec,inputlabel(fname),live=(fname == 0),size=0 if fname == 0 else os.fstat(f.fileno()).st_size,msgs=(printer is not printevent or store is not None))
+		if restored is not None and fname != 0:
+			(start,skipto)=restored
+			dec.skipbits=start % 8 if bitorder else 0
+		#end if
+	#end if
+
+	# index: decoding starts at the state of the last index point before
+	# "start", the events before "start" are not printed
+	if useindex and start and restored is None:
+		pos=useindex.restore(dec,start)
+		if pos is not None:
+			(skipto,start)=(start,pos)
+			dec.skipbits=start % 8 if bitorder else 0
+		#end if
+	#end if
+
+	# batch mode: use large blocks, the sync search is done per block
+	# only a part of the file (bit "start" up to "end"): use mmap
+	# audio: the FSK demodulator returns the bits (see navtexdec_fsk.py)
+	if audio:
+		bits=audio(f)
+	elif usemmap or start or end is not None:
+		bits=mmapreader(f,bitorder,start,end,blocksize=1<<22 if batch else 65536)
+	else:
+		bits=bitreader(f,blocksize=1<<22 if batch else 65536)
+	#end else - if
+
+	if profile: profile.watch(dec)
+	# default: full buffering
+	if sink is None: sink=outsink()
+	pev=printer(sink)
+	# store, file input: the receive time of a message is its time in the
+	# recording, the recording ended at the modification time of the file
+	if store:
+		origin=None
+		if fname != 0:
+			st=os.fstat(f.fileno())
+			origin=st.st_mtime-(st.st_size/(bits.rate*bits.samplesize) if audio else st.st_size*(8 if bitorder else 1)/100)
+		#end if
+		pev=store.printer(pev,"" if fname == 0 else fname,origin)
+	#end if
+
+	# read and decode data up to the end of the file
+	while True:
+		data=bits.read()
+		events=index.feed(dec,data) if index else checkpoint.feed(dec,data) if checkpoint else dec.feed(data)
+		if skipto is not None: events=[e for e in events if e[2] >= skipto]
+		pev.out(events)
+
+		if not data: break
+
+		# all text up to the checkpoint is written
+		if checkpoint and checkpoint.due():
+			sink.flush()
+			checkpoint.save()
+		#end if
+	#end while
+
+	pev.close()
+	bits.close()
 	f.close()
+	if index: index.close()
 
+	# end of the input: a file is completely decoded, the checkpoint is not
+	# needed anymore (stdin: keep the last state)
+	if checkpoint:
+		if fname == 0:
+			checkpoint.save()
+		else:
+			checkpoint.remove()
+		#end else - if
+	#end if
+	return False
 # end 
 
 
+def parserange(s):
+	# "START[:END]" -> (start,end), end is None if not given
+	(start,sep,end)=s.partition(":")
+	try:
+		(start,end)=(int(start or 0),int(end) if end else None)
+	except ValueError:
+		raise argparse.ArgumentTypeError("invalid range: %s" % s)
+	#end try
+
+	if start < 0 or (end is not None and end < start):
+		raise argparse.ArgumentTypeError("invalid range: %s" % s)
+	#end if
+
+	return (start,end)
+#end def parserange
+
+
+
 def main():
-	navtexdec()
+	from navtexdec_msg import msgargs, printerfromargs
+	from navtexdec_profile import profileargs, profilefromargs
+	from navtexdec_checkpoint import checkpointargs, checkpointfromargs
+	from navtexdec_index import indexargs, indexfromargs
+	from navtexdec_store import storeargs, storefromargs
+	from navtexdec_fsk import fskargs, fskfromargs
+
+	parser=argparse.ArgumentParser(description="NAVTEX decoder")
+	parser.add_argument("filename",nargs="?",default="-",help="input file (default: stdin)")
+	parser.add_argument("-p","--packed",choices=("msb","lsb"),default=None,help="input is packed, 8 bits per byte, first bit is the msb or lsb")
+	parser.add_argument("-b","--batch",action="store_true",help="batch mode: search sync in complete blocks of data (requires numpy)")
+	parser.add_argument("-j","--jobs",type=int,default=1,help="decode the file in parallel in JOBS worker processes")
+	parser.add_argument("--overlap",type=int,default=1<<20,metavar="BITS",help="parallel decoding: overlap between the parts of the file (default: %(default)s)")
+	parser.add_argument("--mmap",action="store_true",help="map the input file in memory, not for stdin")
+	parser.add_argument("--range",type=parserange,default=None,metavar="START[:END]",help="only decode bit START up to bit END of the file (implies --mmap)")
+	parser.add_argument("--last",type=float,default=None,metavar="SECONDS",help="only decode the last SECONDS of the file, at 100 bps (implies --mmap)")
+	parser.add_argument("--lookback",type=int,default=0,metavar="BITS",help="on sync loss, search up to BITS received bits for a bit slip (default: %(default)s, off)")
+	fskargs(parser)
+	msgargs(parser)
+	storeargs(parser)
+	checkpointargs(parser)
+	indexargs(parser)
+	profileargs(parser)
+	outsinkargs(parser,flush=None)
+	args=parser.parse_args()
+
+	# live input: not a regular file (stdin from a pipe or a tty, fifo)
+	try:
+		live=not stat.S_ISREG(os.stat(0 if args.filename == "-" else args.filename).st_mode)
+	except OSError:
+		live=False
+	#end try
+
+	if args.batch and np is None:
+		parser.error("batch mode requires numpy")
+	#end if
+
+	if (args.mmap or args.range or args.last is not None or args.index or args.use_index) and args.filename == "-":
+		parser.error("--mmap, --range, --last and the index are not possible for stdin")
+	#end if
+	(start,end)=args.range or (0,None)
+
+	if args.last is not None:
+		if args.range: parser.error("--range and --last can not be used together")
+
+		size=os.path.getsize(args.filename)*(8 if args.packed else 1)
+		start=max(0,size-int(args.last*100))
+	#end if
+
+	if args.use_index and not args.range and args.last is None:
+		parser.error("--use-index is only possible with --range or --last")
+	#end if
+
+	if args.index and (args.lookback or args.checkpoint):
+		parser.error("--index is not possible with --lookback or --checkpoint")
+	#end if
+
+	if args.audio and (args.packed or args.jobs > 1 or args.mmap or args.range or args.last is not None or args.checkpoint or args.index or args.use_index):
+		parser.error("--audio is not possible with --packed, --jobs, --mmap, --range, --last, --checkpoint or the index")
+	#end if
+
+	if args.jobs > 1:
+		if args.filename == "-":
+			parser.error("parallel decoding is not possible for stdin")
+		#end if
+
+		if args.messages or args.store or args.profile or args.lookback or args.range or args.last is not None or args.checkpoint or args.index or args.use_index:
+			parser.error("parallel decoding is not possible with --messages, --store, --profile, --lookback, --range, --last, --checkpoint or the index")
+		#end if
+
+		from navtexdec_batch import navtexdec_split
+		navtexdec_split(args.filename,jobs=args.jobs,bitorder=args.packed,batch=args.batch,sink=outsinkfromargs(parser,args),overlap=args.overlap)
+	else:
+		(index,useindex)=indexfromargs(parser,args,args.filename)
+		navtexdec(args.filename,bitorder=args.packed,batch=args.batch,sink=outsinkfromargs(parser,args,live),printer=printerfromargs(args,printevent,recorded=not live),profile=profilefromargs(parser,args),lookback=args.lookback,usemmap=args.mmap,start=start,end=end,checkpoint=checkpointfromargs(parser,args,args.filename),index=index,useindex=useindex,store=storefromargs(parser,args),audio=fskfromargs(parser,args))
+	#end else - if
 	print("Main done!",flush=True)
 
 #end main
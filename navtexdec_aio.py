@@ -0,0 +1,129 @@
+import sys # for version check and argv
+import argparse
+
+"""
+NAVTEX decoder, asyncio multicast receiver
+input: 100 bps bits, encoded as bytes 0x00 or 0x01, received over multicast
+output: text
+
+Usage:
+python3 navtexdec_aio.py [-p {msb,lsb}] [multicast-ip-address] [udp-port]
+
+Use as module, inside an asyncio application:
+	from navtexdec_aio import mcevents, mcbatches
+	async for (event,value,pos) in mcevents("225.0.0.1",10000):
+		...
+	async for events in mcbatches("225.0.0.1",10000):
+		(list of the events of one received datagram)
+	(see class "navtexdecoder" in navtexdec.py for the events)
+
+Received datagrams are pushed into the decoder by a DatagramProtocol, so
+no (blocking) thread is needed per multicast stream.
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import asyncio
+
+from navtexdec import navtexdecoder, printevent, outsink, outsinkargs, outsinkfromargs
+from navtexdec_mc import mcsocket, defaultip, defaultport
+
+
+
+# "navtexprotocol": feeds received datagrams to a decoder
+# the events of every datagram are put in a queue, as a list
+# (None is put in the queue when the transport is closed)
+class navtexprotocol(asyncio.DatagramProtocol):
+	def __init__(self,dec,queue):
+		self.dec=dec
+		self.queue=queue
+	#end def __init__
+
+	def datagram_received(self,data,addr):
+		events=self.dec.feed(data)
+		if events: self.queue.put_nowait(events)
+	#end def datagram_received
+
+	def error_received(self,exc):
+		# errors on the socket are ignored, same as the blocking receiver
+		pass
+	#end def error_received
+
+	def connection_lost(self,exc):
+		self.queue.put_nowait(None)
+	#end def connection_lost
+
+#end class navtexprotocol
+
+
+
+async def mcbatches(mcip=defaultip, mcport=defaultport, bitorder=None, dec=None):
+	# async iterator: decoded events of a multicast stream, as the list of
+	# events of every received datagram
+	if dec is None: dec=navtexdecoder(bitorder=bitorder)
+
+	loop=asyncio.get_running_loop()
+	queue=asyncio.Queue()
+
+	(transport,protocol)=await loop.create_datagram_endpoint(lambda: navtexprotocol(dec,queue),sock=mcsocket(mcip,mcport))
+
+	try:
+		while True:
+			events=await queue.get()
+			if events is None: return
+
+			yield events
+		#end while
+	finally:
+		transport.close()
+	#end try
+#end def mcbatches
+
+
+async def mcevents(mcip=defaultip, mcport=defaultport, bitorder=None, dec=None):
+	# async iterator: decoded events of a multicast stream
+	async for events in mcbatches(mcip,mcport,bitorder=bitorder,dec=dec):
+		for ev in events:
+			yield ev
+		#end for
+	#end for
+#end def mcevents
+
+
+
+async def navtexdec_aio(mcip=defaultip, mcport=defaultport, bitorder=None, sink=None):
+	if sink is None: sink=outsink(flusheol=True)
+	pev=printevent(sink)
+
+	async for events in mcbatches(mcip,mcport,bitorder=bitorder):
+		pev.out(events)
+	#end for
+
+	sink.close()
+#end def navtexdec_aio
+
+
+
+def main():
+	parser=argparse.ArgumentParser(description="NAVTEX decoder, multicast input (asyncio)")
+	parser.add_argument("mcip",nargs="?",default=defaultip,help="multicast ip-address (default: %(default)s)")
+	parser.add_argument("mcport",nargs="?",type=int,default=defaultport,help="udp port (default: %(default)s)")
+	parser.add_argument("-p","--packed",choices=("msb","lsb"),default=None,help="received data is packed, 8 bits per byte, first bit is the msb or lsb")
+	outsinkargs(parser,flush="eol,msg",maxdelay=1.0)
+	args=parser.parse_args()
+
+	asyncio.run(navtexdec_aio(args.mcip,args.mcport,bitorder=args.packed,sink=outsinkfromargs(parser,args)))
+	print("Main done!",flush=True)
+
+#end main
+
+if __name__ == "__main__": main()
@@ -0,0 +1,331 @@
+import sys # for version check and argv
+import argparse
+
+"""
+NAVTEX decoder, batch mode: decode many recordings in parallel
+input: files with 100 bps bits, encoded as bytes 0x00 or 0x01
+output: text
+
+Usage:
+python3 navtexdec_batch.py [-j JOBS] [-o OUTDIR] [-p {msb,lsb}] [-b] file|directory|glob ...
+
+	Every file is decoded by a worker process (default: one per cpu core)
+	A directory means all files in that directory, a glob is expanded
+	(for example: "captures/2020-09-*.bin")
+
+	-j / --jobs: number of worker processes
+	-o / --outdir: write the output of every file to OUTDIR/<filename>.txt
+		(default: all output on stdout, in the order of the input files)
+	-p / --packed, -b / --batch: see navtexdec.py
+
+	The run ends with a summary per file: number of bits, sync successes,
+	sync losses, decoded characters, error characters ('*') and decode time
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import os
+import io
+import glob
+import time
+import concurrent.futures
+
+from navtexdec import navtexdecoder, bitreader, mmapreader, printevent, outsink, np
+
+
+
+def decodefile(fname,bitorder=None,batch=False,outname=None):
+	# decode one file (runs in a worker process)
+	# returns (output text or None if written to "outname", statistics)
+	stats={"file":fname,"bits":0,"sync":0,"synclost":0,"chars":0,"errors":0,"time":0.0,"error":None}
+	start=time.monotonic()
+
+	try:
+		out=open(outname,"w") if outname else io.StringIO()
+		sink=outsink(f=out)
+		pev=printevent(sink)
+		dec=navtexdecoder(bitorder=bitorder,batch=batch)
+
+		with open(fname,"rb",buffering=0) as f:
+			bits=bitreader(f,blocksize=1<<22 if batch else 65536)
+
+			while True:
+				data=bits.read()
+				events=dec.feed(data)
+
+				for (event,value,pos) in events:
+					if event == "char":
+						stats["chars"]+=1
+						if value == "*": stats["errors"]+=1
+					elif event == "sync":
+						stats["sync"]+=1
+					elif event == "synclost":
+						stats["synclost"]+=1
+					#end elif - elif - if
+				#end for
+
+				pev.out(events)
+
+				if not data: break
+			#end while
+		#end with
+
+		sink.close()
+		stats["bits"]=dec.totalbitcount
+		text=None if outname else out.getvalue()
+		out.close()
+	except OSError as e:
+		stats["error"]=str(e)
+		text=None
+	#end try
+
+	stats["time"]=time.monotonic()-start
+	return (text,stats)
+#end def decodefile
+
+
+def __decodefile__(args):
+	# helper for "executor.map"
+	return decodefile(*args)
+#end def __decodefile__
+
+
+
+def findfiles(names):
+	# expand directories and globs, keep the order given on the command line
+	files=[]
+
+	for name in names:
+		if os.path.isdir(name):
+			files+=sorted([os.path.join(name,f) for f in os.listdir(name) if os.path.isfile(os.path.join(name,f))])
+		elif os.path.exists(name):
+			files.append(name)
+		else:
+			# no match: keep the name, so it is reported in the summary
+			files+=sorted(glob.glob(name)) or [name]
+		#end elif - if
+	#end for
+
+	return files
+#end def findfiles
+
+
+
+def printsummary(allstats,f=None):
+	f=f if f is not None else sys.stdout
+
+	print("\n### Summary",file=f)
+	print("%-40s %12s %6s %6s %8s %7s %8s" % ("file","bits","sync","lost","chars","errors","time"),file=f)
+
+	for s in allstats:
+		if s["error"]:
+			print("%-40s ERROR: %s" % (s["file"],s["error"]),file=f)
+		else:
+			print("%-40s %12d %6d %6d %8d %7d %7.2fs" % (s["file"],s["bits"],s["sync"],s["synclost"],s["chars"],s["errors"],s["time"]),file=f)
+		#end else - if
+	#end for
+#end def printsummary
+
+
+
+def navtexdec_batch(files,jobs=None,outdir=None,bitorder=None,batch=False):
+	# decode all files, returns list of statistics (one per file)
+	work=[]
+	for fname in files:
+		outname=os.path.join(outdir,os.path.basename(fname)+".txt") if outdir else None
+		work.append((fname,bitorder,batch,outname))
+	#end for
+
+	allstats=[]
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+		# results are returned in the order of the input files
+		for (text,stats) in executor.map(__decodefile__,work):
+			if text is not None:
+				sys.stdout.write("\n### File: %s\n" % stats["file"])
+				sys.stdout.write(text)
+				sys.stdout.flush()
+			#end if
+
+			allstats.append(stats)
+		#end for
+	#end with
+
+	return allstats
+#end def navtexdec_batch
+
+
+
+# parallel decoding of one (large) file
+#
+# The file is split in chunks, every chunk is decoded by a worker process
+# from a cold start, and continues "overlap" bits into the next chunk.
+# In the overlap, both workers store the decoder fingerprint (see
+# "navtexdecoder.fingerprint") every "grid" bits. At the first position
+# where both fingerprints are the same, both decoders produce the same output
+# from there on: the output of the first worker is used up to that point,
+# the output of the second worker after it.
+# If the decoders do not converge in the overlap, the decoder of the first
+# worker continues (in the main process) with the data of the next chunk,
+# so the output is always the same as when decoding the file sequentially.
+
+def decodechunk(fname,start,end,headend,tailstart,bitorder=None,batch=False,dec=None,grid=64):
+	# decode bytes "start" up to "end" of a file (runs in a worker process)
+	# fingerprints are stored every "grid" bits in the "head" (start up to headend)
+	# and in the "tail" (tailstart up to end) of the chunk, as (position,fingerprint,text offset)
+	# returns (text,head,tail,decoder,end)
+	bpb=8 if bitorder else 1 # bits per byte
+	step=grid//bpb
+
+	if dec is None: dec=navtexdecoder(bitorder=bitorder,batch=batch,startpos=start*bpb)
+
+	out=io.StringIO()
+	sink=outsink(f=out)
+	pev=printevent(sink)
+
+	head=[]
+	tail=[]
+
+	# mmap: the workers share the page cache of the file, the data is not copied
+	with open(fname,"rb") as f:
+		bits=mmapreader(f,bitorder,start*bpb,end*bpb)
+		pos=start
+
+		while pos < end:
+			# read up to the next grid point in the head or the tail, or up to the tail
+			if pos < headend:
+				stop=min(pos+step,headend)
+			elif pos >= tailstart:
+				stop=pos+step
+			else:
+				stop=min(pos+(1<<22),tailstart)
+			#end elif - if
+
+			data=bits.read(min(stop,end)-pos)
+			if not data: break
+
+			pev.out(dec.feed(data))
+			pos+=len(data)
+
+			if pos <= headend or pos >= tailstart:
+				sink.flush()
+				(head if pos <= headend else tail).append((pos*bpb,dec.fingerprint(),out.tell()))
+			#end if
+		#end while
+
+		data=None
+		bits.close()
+	#end with
+
+	sink.close()
+	return (out.getvalue(),head,tail,dec,end)
+#end def decodechunk
+
+
+def __decodechunk__(args):
+	# helper for "executor.map"
+	return decodechunk(*args)
+#end def __decodechunk__
+
+
+
+def navtexdec_split(fname,jobs=None,bitorder=None,batch=False,sink=None,overlap=1<<20,grid=64):
+	# decode one file in parallel, output is written to "sink"
+	if sink is None: sink=outsink()
+	jobs=jobs if jobs else os.cpu_count()
+
+	bpb=8 if bitorder else 1 # bits per byte
+	ovl=overlap//bpb # overlap in bytes
+	step=grid//bpb
+
+	size=os.path.getsize(fname)
+
+	# chunks should be at least twice the overlap
+	nchunk=jobs
+	while nchunk > 1 and size//nchunk < 2*ovl: nchunk-=1
+
+	# chunk boundaries, on a multiple of the grid
+	bounds=[(size*k//nchunk)//step*step for k in range(nchunk)]+[size]
+
+	work=[]
+	for k in range(nchunk):
+		last=(k == nchunk-1)
+		start=bounds[k]
+		end=size if last else bounds[k+1]+ovl
+		headend=start+ovl if k > 0 else start
+		tailstart=size+1 if last else bounds[k+1]
+		work.append((fname,start,end,headend,tailstart,bitorder,batch,None,grid))
+	#end for
+
+	with concurrent.futures.ProcessPoolExecutor(max_workers=nchunk) as executor:
+		results=list(executor.map(__decodechunk__,work))
+	#end with
+
+	# stitch the output of the chunks
+	(text,head,tail,dec,end)=results[0]
+	cut=0 # start of the text of the current chunk that is not yet written
+
+	for k in range(1,nchunk):
+		(ntext,nhead,ntail,ndec,nend)=results[k]
+		nfingerprint={pos:(fp,off) for (pos,fp,off) in nhead}
+
+		match=None
+		for (pos,fp,off) in tail:
+			if pos in nfingerprint and nfingerprint[pos][0] == fp:
+				match=(off,nfingerprint[pos][1])
+				break
+			#end if
+		#end for
+
+		if match:
+			sink.write(text[cut:match[0]])
+			(text,tail,dec,end,cut)=(ntext,ntail,ndec,nend,match[1])
+		else:
+			# no convergence: continue with the decoder of the previous chunk
+			sink.write(text[cut:])
+			(text,head,tail,dec,end)=decodechunk(fname,end,nend,end,work[k][4],bitorder,batch,dec,grid)
+			cut=0
+		#end else - if
+	#end for
+
+	sink.write(text[cut:])
+	sink.flush()
+#end def navtexdec_split
+
+
+
+def main():
+	parser=argparse.ArgumentParser(description="NAVTEX decoder, decode many files in parallel")
+	parser.add_argument("files",nargs="+",help="input files, directories or globs")
+	parser.add_argument("-j","--jobs",type=int,default=None,help="number of worker processes (default: number of cpu cores)")
+	parser.add_argument("-o","--outdir",default=None,help="write the output of every file to OUTDIR/<filename>.txt")
+	parser.add_argument("-p","--packed",choices=("msb","lsb"),default=None,help="input is packed, 8 bits per byte, first bit is the msb or lsb")
+	parser.add_argument("-b","--batch",action="store_true",help="batch mode: search sync in complete blocks of data (requires numpy)")
+	args=parser.parse_args()
+
+	if args.batch and np is None:
+		parser.error("batch mode requires numpy")
+	#end if
+
+	files=findfiles(args.files)
+	if not files:
+		parser.error("no input files found")
+	#end if
+
+	if args.outdir: os.makedirs(args.outdir,exist_ok=True)
+
+	allstats=navtexdec_batch(files,jobs=args.jobs,outdir=args.outdir,bitorder=args.packed,batch=args.batch)
+	printsummary(allstats)
+
+#end main
+
+if __name__ == "__main__": main()
@@ -0,0 +1,210 @@
+import sys # for version check and argv
+import argparse
+
+"""
+NAVTEX decoder, benchmark
+input: synthetic NAVTEX bitstream (see navtexdec_gen.py)
+output: decode speed (bits/second) and decoder statistics
+
+Usage:
+python3 navtexdec_bench.py [-n N] [--seed SEED] [--ber BER] [--slip P] [--gap P] [-r REPEAT] [-p {msb,lsb}] [-b]
+
+	-n, --seed, --ber, --slip, --gap: generated stream, see navtexdec_gen.py
+		(default: 200 messages)
+	-r / --repeat: run every test this many times, the fastest run is
+		reported (default: 3)
+	-p / --packed: decode packed data
+	-b / --batch: also test batch mode (requires numpy)
+
+Tests:
+	navtexdec: decode a file with "navtexdec()"
+	sync search: decode random bits (no signal) of the same length, the
+		decoder only searches sync
+	datagram: the receive path of navtexdec_mc.py ("getinbits", decoder and
+		output), with the data sent as datagrams over a local socket
+
+The decoded messages are compared with the generated text, and the output
+of every test is compared with the output of "navtexdec()".
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import os
+import io
+import time
+import socket
+import tempfile
+import threading
+
+from navtexdec import navtexdecoder, printevent, outsink, navtexdec, np
+from navtexdec_mc import getinbits
+from navtexdec_msg import msgparser
+from navtexdec_gen import navtexgen, packbits
+
+
+
+def besttime(func,repeat=3):
+	# run "func" "repeat" times, returns (fastest time,result of last run)
+	best=None
+
+	for _ in range(repeat):
+		start=time.perf_counter()
+		result=func()
+		t=time.perf_counter()-start
+		if best is None or t < best: best=t
+	#end for
+
+	return (best,result)
+#end def besttime
+
+
+
+def decodestats(data,bitorder=None):
+	# decoder statistics and messages of "data"
+	stats={"sync":0,"synclost":0,"chars":0,"errors":0}
+
+	dec=navtexdecoder(bitorder=bitorder)
+	parser=msgparser()
+
+	events=dec.feed(data)
+	for (event,value,pos) in events:
+		if event == "char":
+			stats["chars"]+=1
+			if value == "*": stats["errors"]+=1
+		elif event in stats:
+			stats[event]+=1
+		#end elif - if
+	#end for
+
+	return (stats,parser.feed(events)+parser.close())
+#end def decodestats
+
+
+
+def decodefile(fname,bitorder=None,batch=False):
+	# "navtexdec()", output in memory
+	out=io.StringIO()
+	navtexdec(fname,bitorder=bitorder,batch=batch,sink=outsink(f=out))
+	return out.getvalue()
+#end def decodefile
+
+
+
+def decodedatagram(data,bitorder=None,size=1000):
+	# receive path of navtexdec_mc.py: datagrams of "size" bytes are sent by
+	# a thread over a local socket pair
+	(rx,tx)=socket.socketpair(socket.AF_UNIX,socket.SOCK_DGRAM)
+
+	def send():
+		for i in range(0,len(data),size):
+			tx.send(data[i:i+size])
+		#end for
+	#end def send
+
+	sender=threading.Thread(target=send)
+	sender.start()
+
+	out=io.StringIO()
+	sink=outsink(f=out,flusheol=True,flushmsg=True,maxdelay=1.0) # navtexdec_mc.py defaults
+	indata=getinbits(rx)
+	dec=navtexdecoder(bitorder=bitorder)
+	pev=printevent(sink)
+
+	n=0
+	while n < len(data):
+		newbytes=indata.get()
+		n+=len(newbytes)
+		pev.out(dec.feed(newbytes))
+	#end while
+
+	pev.out(dec.feed(b''))
+	pev.close()
+
+	sender.join()
+	rx.close()
+	tx.close()
+	return out.getvalue()
+#end def decodedatagram
+
+
+
+def printresult(name,nbits,t,same=None):
+	print("%-24s %12.0f bits/s %9.3fs %s" % (name,nbits/t,t,"" if same is None else "output ok" if same else "OUTPUT DIFFERENT"))
+#end def printresult
+
+
+
+def main():
+	parser=argparse.ArgumentParser(description="NAVTEX decoder benchmark")
+	parser.add_argument("-n",type=int,default=200,help="number of messages (default: %(default)s)")
+	parser.add_argument("--seed",type=int,default=1,help="seed of the random generator (default: %(default)s)")
+	parser.add_argument("--ber",type=float,default=0.0,help="bit error rate (default: %(default)s)")
+	parser.add_argument("--slip",type=float,default=0.0,metavar="P",help="probability of a bit slip per message (default: %(default)s)")
+	parser.add_argument("--gap",type=float,default=0.0,metavar="P",help="probability of a noise gap per message (default: %(default)s)")
+	parser.add_argument("-r","--repeat",type=int,default=3,help="run every test this many times (default: %(default)s)")
+	parser.add_argument("-p","--packed",choices=("msb","lsb"),default=None,help="decode packed data, first bit is the msb or lsb")
+	parser.add_argument("-b","--batch",action="store_true",help="also test batch mode (requires numpy)")
+	args=parser.parse_args()
+
+	if args.batch and np is None:
+		parser.error("batch mode requires numpy")
+	#end if
+
+	gen=navtexgen(seed=args.seed,ber=args.ber,slip=args.slip,gap=args.gap)
+	(bits,msgs)=gen.stream(args.n)
+	noise=gen.noise(len(bits))
+	nbits=len(bits)
+
+	if args.packed:
+		bits=packbits(bits,args.packed)
+		noise=packbits(noise,args.packed)
+	#end if
+
+	print("Stream: %d bits (%.1f hours), %d messages, ber %g, slip %g, gap %g" % (nbits,nbits/100/3600,args.n,args.ber,args.slip,args.gap))
+
+	# correctness: decoded messages compared with the generated text
+	(stats,decoded)=decodestats(bits,args.packed)
+	sent=set(m.replace("\r","") for m in msgs)
+	ok=sum(1 for m in decoded if m.complete and str(m) in sent)
+
+	print("Decoder: sync %d, sync lost %d, chars %d, errors %d, messages ok %d of %d" % (stats["sync"],stats["synclost"],stats["chars"],stats["errors"],ok,args.n))
+	print()
+
+	with tempfile.TemporaryDirectory() as tmp:
+		fname=os.path.join(tmp,"stream.bin")
+		with open(fname,"wb") as f: f.write(bits)
+		noisename=os.path.join(tmp,"noise.bin")
+		with open(noisename,"wb") as f: f.write(noise)
+
+		(t,ref)=besttime(lambda: decodefile(fname,args.packed),args.repeat)
+		printresult("navtexdec",nbits,t)
+
+		if args.batch:
+			(t,out)=besttime(lambda: decodefile(fname,args.packed,batch=True),args.repeat)
+			printresult("navtexdec (batch)",nbits,t,out == ref)
+		#end if
+
+		(t,out)=besttime(lambda: decodefile(noisename,args.packed),args.repeat)
+		printresult("sync search",nbits,t)
+
+		if args.batch:
+			(t,out)=besttime(lambda: decodefile(noisename,args.packed,batch=True),args.repeat)
+			printresult("sync search (batch)",nbits,t)
+		#end if
+	#end with
+
+	(t,out)=besttime(lambda: decodedatagram(bits,args.packed),args.repeat)
+	printresult("datagram",nbits,t,out == ref)
+
+#end main
+
+if __name__ == "__main__": main()
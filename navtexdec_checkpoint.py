@@ -0,0 +1,335 @@
+import sys # for version check and argv
+
+"""
+NAVTEX decoder, checkpoint and resume
+The state of the decoders of a process is written to a checkpoint file at a
+regular interval. When the process is started again with the same checkpoint
+file, the decoders continue from that state: no resync is needed, and the
+text that is being received is not lost.
+
+	file input: decoding continues at the input position of the checkpoint
+		(text decoded after the checkpoint is printed again). With the
+		message layer ("-m", "--store"), the checkpoint is the state before
+		the "ZCZC" of the message that is being received: the message is
+		not lost, the events before the "ZCZC" are not printed again.
+		The input file (name and size) is stored: the checkpoint of an
+		other file, or of a file that is shorter now, is refused. A file
+		that grew (still being recorded) is resumed
+	live input (stdin, multicast): the bits received while the decoder was
+		not running are lost, so the decoder searches sync again. The
+		letters/figures table, positions and counters are kept
+
+Used by navtexdec.py and navtexdec_mc.py, option "--checkpoint"
+
+File format (little-endian):
+	header: "NTXC", version (1 byte), number of decoders (2 bytes)
+	per decoder: length of the label (2 bytes), label (utf-8), decoder
+		state (see "statefmt"), fechist (21 counters, 8 bytes), size of
+		the input file (8 bytes), position of the first event to print
+		(8 bytes, 0: all)
+	crc32 of all data before
+The file is replaced, so a checkpoint file is never partially written.
+The lookback history (see navtexdec.py, "--lookback") is not stored.
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import os
+import time
+import struct
+import zlib
+
+from navtexdec import navtexdecoder
+from navtexdec_msg import msgparser
+
+
+
+magic=b"NTXC"
+version=1
+
+hdrfmt=struct.Struct("<4sBH")
+labelfmt=struct.Struct("<H")
+crcfmt=struct.Struct("<I")
+
+# decoder state (also used by navtexdec_index.py):
+#	bitorder (0: not packed, 1: msb, 2: lsb), state, table, fecstate, fecscore,
+#	fecmemptr_wr, fecmemptr_rd, valid flags of fecmem (bit 0 .. 2), 7bit chars of fecmem,
+#	number of bits in "partial", partial (0x00 / 0x01), sync window, sync bit counters (70 bits),
+#	skipbits, totalbitcount, startpos, syncpos, losspos, freshpos, input position (bits)
+statefmt=struct.Struct("<8B3sB7s9s9sB6Q")
+histfmt=struct.Struct("<21Q")
+extfmt=struct.Struct("<2Q")
+recsize=statefmt.size+histfmt.size+extfmt.size
+
+bitorders=(None,"msb","lsb")
+
+
+
+def packstate(dec):
+	# decoder state as bytes
+	fecmem=dec.fecmem
+	valid=sum(1<<i for i in range(3) if fecmem[i][0])
+
+	return statefmt.pack(bitorders.index(dec.bitorder),dec.state,dec.table,dec.fecstate,dec.fecscore,
+		dec.fecmemptr_wr,dec.fecmemptr_rd,valid,bytes(c for (ok,c) in fecmem),
+		len(dec.partial),dec.partial,dec.sync.window.to_bytes(9,"big"),dec.sync.nbit.to_bytes(9,"big"),
+		dec.skipbits,dec.totalbitcount,dec.startpos,dec.syncpos,dec.losspos,dec.freshpos,
+		dec.totalbitcount+len(dec.partial))
+#end def packstate
+
+
+def unpackstate(dec,data):
+	# restore the decoder state, returns the input position (bits)
+	v=statefmt.unpack(data)
+
+	if bitorders[v[0]] != dec.bitorder:
+		raise ValueError("checkpoint is for an other input format (--packed)")
+	#end if
+
+	(dec.state,dec.table,dec.fecstate,dec.fecscore,dec.fecmemptr_wr,dec.fecmemptr_rd)=v[1:7]
+	dec.fecmem=[(bool(v[7] & (1<<i)),v[8][i]) for i in range(3)]
+	dec.partial=v[10][:v[9]]
+	dec.sync.window=int.from_bytes(v[11],"big")
+	dec.sync.nbit=int.from_bytes(v[12],"big")
+	(dec.skipbits,dec.totalbitcount,dec.startpos,dec.syncpos,dec.losspos,dec.freshpos)=v[13:19]
+
+	# no "syncing" event: the decoder continues
+	dec.events=[]
+	dec.history=bytearray()
+	dec.tables=[(dec.totalbitcount,dec.table)]
+	return v[19]
+#end def unpackstate
+
+
+
+# "checkpoint": checkpoint file of the decoders of a process
+class checkpoint():
+	def __init__(self,fname,interval=60.0,bitorder=None):
+		self.fname=fname
+		self.bitorder=bitorder
+		self.interval=interval # seconds between two checkpoints
+		self.decoders=[] # (label,decoder,live,size of the input file)
+		self.msgs={} # decoder with messages -> [msgparser,last 4 chars,(state,position) of the last "ZCZC"]
+		self.last=time.monotonic()
+
+		# states in the existing checkpoint file: label -> state
+		self.saved=self.__read__()
+	#end def __init__
+
+
+	def __read__(self):
+		try:
+			with open(self.fname,"rb") as f:
+				data=f.read()
+			#end with
+		except FileNotFoundError:
+			return {}
+		#end try
+
+		if len(data) < hdrfmt.size+crcfmt.size or crcfmt.unpack(data[-crcfmt.size:])[0] != zlib.crc32(data[:-crcfmt.size]):
+			raise ValueError("invalid checkpoint file: %s" % self.fname)
+		#end if
+
+		(m,v,n)=hdrfmt.unpack_from(data)
+		if m != magic or v != version:
+			raise ValueError("invalid checkpoint file: %s" % self.fname)
+		#end if
+
+		saved={}
+		pos=hdrfmt.size
+		for _ in range(n):
+			(k,)=labelfmt.unpack_from(data,pos)
+			pos+=labelfmt.size
+			label=data[pos:pos+k].decode()
+			pos+=k
+			saved[label]=data[pos:pos+recsize]
+			pos+=recsize
+		#end for
+
+		if pos != len(data)-crcfmt.size:
+			raise ValueError("invalid checkpoint file: %s" % self.fname)
+		#end if
+
+		if any(bitorders[state[0]] != self.bitorder for state in saved.values()):
+			raise ValueError("checkpoint is for an other input format (--packed): %s" % self.fname)
+		#end if
+
+		return saved
+	#end def __read__
+
+
+	def check(self,label,size=0):
+		# raises ValueError if the checkpoint file is for an other input than
+		# "label", or the input file is shorter than at the checkpoint
+		if not self.saved: return
+
+		data=self.saved.get(label)
+		if data is None:
+			raise ValueError("checkpoint is for an other input (%s): %s" % (", ".join(l or "stdin" for l in self.saved),self.fname))
+		#end if
+
+		(oldsize,skipto)=extfmt.unpack(data[-extfmt.size:])
+		if size < oldsize:
+			raise ValueError("input file is shorter than at the checkpoint (%d bytes, was %d): %s" % (size,oldsize,self.fname))
+		#end if
+	#end def check
+
+
+	def add(self,dec,label="",live=False,size=0,msgs=False):
+		# add decoder "dec" to the checkpoint, and restore its state if it is
+		# in the checkpoint file
+		# live: the input continues while the decoder is not running, see above
+		# size: size of the input file, see "check"
+		# msgs: the message layer is used, a message that is being received
+		# is decoded again from its "ZCZC" (file input, see "save")
+		# returns (input position of the restored state (bits), position of
+		# the first event to print or None), or None if nothing is restored
+		self.decoders.append((label,dec,live,size))
+		if msgs and not live: self.msgs[dec]=[msgparser(),[],None]
+
+		data=self.saved.get(label)
+		if data is None: return None
+
+		pos=unpackstate(dec,data[:statefmt.size])
+		dec.fechist=list(histfmt.unpack_from(data,statefmt.size))
+		(oldsize,skipto)=extfmt.unpack(data[-extfmt.size:])
+
+		if live and dec.state == navtexdecoder.st_data:
+			dec.state=navtexdecoder.st_sync
+			dec.freshpos=dec.totalbitcount+70
+			dec.partial=b''
+			dec.events.append(("synclost",None,dec.totalbitcount))
+		#end if
+
+		return (pos,skipto or None)
+	#end def add
+
+
+	def feed(self,dec,data):
+		# "dec.feed(data)", and keep the state before the "ZCZC" of the
+		# message that is being received (see "save")
+		m=self.msgs.get(dec)
+		if m is None: return dec.feed(data)
+
+		state=packstate(dec)
+		events=dec.feed(data)
+
+		for (event,value,pos) in events:
+			if event == "synclost":
+				m[1]=[]
+			elif event == "char":
+				# last 4 chars (as "msgparser.tail"): (char,position,state before the block)
+				m[1]=(m[1]+[(value,pos,state)])[-4:]
+				if "".join(c for (c,p,st) in m[1]) == "ZCZC":
+					m[2]=(m[1][0][2],m[1][0][1])
+					m[1]=[]
+				#end if
+			#end elif - if
+		#end for
+		m[0].feed(events)
+
+		return events
+	#end def feed
+
+
+	def __msgstart__(self,dec):
+		# (state,position) before the "ZCZC" of the message that is being
+		# received, also of a "ZCZC" that is not complete yet (e.g. "ZC")
+		# None: no message
+		if dec not in self.msgs: return None
+		(parser,tail,start)=self.msgs[dec]
+		if parser.msg: return start
+
+		for k in range(3,0,-1):
+			if parser.tail.endswith("ZCZC"[:k]): return (tail[-k][2],tail[-k][1])
+		#end for
+
+		return None
+	#end def __msgstart__
+
+
+	def due(self):
+		# returns True if the next checkpoint should be written
+		return time.monotonic()-self.last >= self.interval
+	#end def due
+
+
+	def save(self):
+		# write the state of all decoders
+		# (only between two calls of "feed" of the decoders)
+		out=[hdrfmt.pack(magic,version,len(self.decoders))]
+		for (label,dec,live,size) in self.decoders:
+			# file input, message being received: the state before "ZCZC"
+			(state,skipto)=self.__msgstart__(dec) or (packstate(dec),0)
+
+			l=label.encode()
+			out.append(labelfmt.pack(len(l)))
+			out.append(l)
+			out.append(state)
+			out.append(histfmt.pack(*dec.fechist))
+			out.append(extfmt.pack(size,skipto))
+		#end for
+
+		data=b''.join(out)
+		data+=crcfmt.pack(zlib.crc32(data))
+
+		tmpname=self.fname+".tmp"
+		with open(tmpname,"wb") as f:
+			f.write(data)
+			f.flush()
+			os.fsync(f.fileno())
+		#end with
+		os.replace(tmpname,self.fname)
+
+		self.last=time.monotonic()
+	#end def save
+
+
+	def remove(self):
+		# the input is completely decoded: the checkpoint is not needed anymore
+		try:
+			os.remove(self.fname)
+		except FileNotFoundError:
+			pass
+		#end try
+	#end def remove
+
+#end class checkpoint
+
+
+
+# command line options for checkpoints, shared by the command line tools
+def checkpointargs(parser):
+	parser.add_argument("--checkpoint",default=None,metavar="FILE",help="write the decoder state to FILE at a regular interval, and resume from it at start")
+	parser.add_argument("--checkpoint-interval",type=float,default=60.0,metavar="SECONDS",help="checkpoint: interval to write the checkpoint file (default: %(default)s)")
+#end def checkpointargs
+
+
+def inputlabel(fname):
+	# label of the decoder of an input file: the full path ("": stdin)
+	return "" if fname in (0,"-") else os.path.realpath(fname)
+#end def inputlabel
+
+
+def checkpointfromargs(parser,args,fname=None):
+	# returns a "checkpoint", or None if no checkpoint file is used
+	# fname: input file, the checkpoint file must be for this file (see "check")
+	if args.checkpoint is None: return None
+
+	try:
+		cp=checkpoint(args.checkpoint,interval=args.checkpoint_interval,bitorder=args.packed)
+		if fname is not None: cp.check(inputlabel(fname),0 if fname in (0,"-") else os.path.getsize(fname))
+		return cp
+	except (OSError,ValueError) as e:
+		parser.error("checkpoint: %s" % e)
+	#end try
+#end def checkpointfromargs
@@ -0,0 +1,349 @@
+import sys # for version check and argv
+import argparse
+
+"""
+NAVTEX decoder, FSK demodulator (requires numpy)
+input: audio, WAV file or raw PCM (16 bit signed, little-endian, mono)
+output: 100 bps bits, encoded as bytes 0x00 or 0x01 (or packed)
+
+Usage:
+python3 navtexdec_fsk.py [--rate RATE] [--center HZ] [--shift HZ] [--invert] [-p {msb,lsb}] [-o OUTFILE] [<filename>]
+	Read from stdin if no filename give
+
+	--rate: sample rate of raw PCM input (default: 48000, WAV: from the
+		header)
+	--center: audio frequency in the middle of the two tones (default:
+		1000 Hz)
+	--shift: frequency shift between the two tones (default: 170 Hz)
+	--invert: the lower tone is a 1 bit ("B"), default: the higher tone
+		(for example for reception in LSB)
+	-p / --packed: write packed data, 8 bits per byte (see navtexdec.py)
+	-o: output file (default: stdout)
+
+Use as module:
+	from navtexdec_fsk import fskdemod
+	demod=fskdemod(rate=48000,center=1000)
+	bits=demod.feed(samples) (numpy array, any number of samples)
+	dec.feed(bits)
+	or with navtexdec.py: "--audio", see "audioreader"
+
+Demodulation is done per block of samples, with numpy:
+	- mixing down to 0 Hz (the center frequency) and low pass filter, as
+		one band pass filter (FIR, complex taps) on the real samples, only
+		computed for every "decim"th sample (about 20 samples per symbol)
+	- FM discriminator: the phase change between two samples, positive for
+		the higher tone
+	- symbol clock: the zero crossings of the discriminator (tone changes)
+		are on the symbol boundaries; the clock is corrected every 16
+		symbols with the mean offset of the crossings. A bit is the sign of
+		the discriminator integrated over the middle half of the symbol
+No squelch: without signal, the bits are noise (the decoder searches sync).
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import struct
+
+from navtexdec import np
+
+
+
+# "fskdemod": FSK demodulator, samples -> bits
+class fskdemod():
+	def __init__(self,rate,center=1000.0,shift=170.0,baud=100.0,invert=False,gain=0.3):
+		self.invert=invert
+		self.gain=gain # symbol clock correction
+
+		# low pass filter (windowed sinc, 2 symbols long), up to the tones + baud/2
+		# shifted to the center frequency: the output of a filter window
+		# is mixed down, up to the phase of the mixer at the start of the
+		# window (the same phase change between every two outputs)
+		# the output is only computed every "decim" samples
+		self.decim=max(1,int(rate/(20*baud)))
+		omega=2*np.pi*center/rate
+		ntaps=int(2*rate/baud) | 1
+		n=np.arange(ntaps)-(ntaps-1)/2
+		h=np.sinc(2*(shift/2+baud/2)/rate*n)*np.hamming(ntaps)
+		h=h/h.sum()*np.exp(-1j*omega*np.arange(ntaps))
+		self.taps=np.stack((h.real,h.imag),axis=1).astype(np.float32)
+		self.rotate=np.exp(-1j*omega*self.decim) # phase change of the mixer between two outputs
+		self.hist=np.zeros(ntaps-1,dtype=np.float32) # last samples of the previous block
+		self.next=0 # first filter window in the next block
+
+		# discriminator and symbol clock, at the decimated rate
+		self.last=np.complex64(1)
+		self.sps=rate/self.decim/baud # samples per symbol
+		self.rest=np.zeros(0,dtype=np.float32) # samples of the next symbols
+		self.t=0.0 # start of the next symbol in "rest"
+	#end def __init__
+
+
+	def feed(self,samples):
+		# returns the bits of all symbols completed by "samples"
+		# (bytes, 0x00 or 0x01 per bit)
+		n=len(samples)
+		if not n: return b''
+
+		# band pass filter, decimated
+		buff=np.concatenate((self.hist,samples.astype(np.float32,copy=False)))
+		ntaps=len(self.taps)
+		windows=np.lib.stride_tricks.sliding_window_view(buff,ntaps)[self.next::self.decim]
+		r=windows @ self.taps
+		y=r[:,0]+1j*r[:,1]
+		self.next+=len(windows)*self.decim-(len(buff)-ntaps+1)
+		self.hist=buff[len(buff)-ntaps+1:]
+		if not len(y): return b''
+
+		# discriminator
+		prev=np.concatenate(([self.last],y[:-1]))
+		self.last=y[-1]
+		d=np.angle(y*np.conj(prev)*self.rotate).astype(np.float32)
+
+		return self.__symbols__(np.concatenate((self.rest,d)),len(self.rest))
+	#end def feed
+
+
+	def __symbols__(self,d,new):
+		# symbol clock and bits, per 16 symbols
+		# d: discriminator, the samples from "new" on are not used for the clock yet
+		sps=self.sps
+		t=self.t
+		bits=[]
+
+		cs=np.concatenate(([0.0],np.cumsum(d,dtype=np.float64)))
+		s=d > 0
+
+		while True:
+			# symbols completely in "d"
+			nsym=min(16,int((len(d)-t)/sps))
+			if nsym < 1: break
+
+			# zero crossings of these symbols: offset from the symbol boundary
+			# (linear interpolation), in symbols
+			a=max(int(t),new-1,0)
+			b=min(int(t+nsym*sps),len(d)-1)
+			x=np.flatnonzero(s[a:b] != s[a+1:b+1])+a
+			if len(x):
+				tc=x+d[x]/(d[x]-d[x+1])
+				e=(tc-t)/sps
+				t+=self.gain*sps*(e-np.round(e)).mean()
+				if t < 0: t=0.0
+				nsym=min(nsym,int((len(d)-t)/sps))
+				if nsym < 1: break
+			#end if
+
+			# integrate over the middle half of every symbol
+			start=t+sps*np.arange(nsym)
+			lo=np.round(start+sps/4).astype(np.int64)
+			hi=np.round(start+3*sps/4).astype(np.int64)
+			bits.append((cs[hi]-cs[lo]) > 0)
+
+			t+=nsym*sps
+		#end while
+
+		k=int(t)
+		self.rest=d[k:]
+		self.t=t-k
+
+		if not bits: return b''
+		b=np.concatenate(bits)
+		if self.invert: b=~b
+		return b.astype(np.uint8).tobytes()
+	#end def __symbols__
+
+#end class fskdemod
+
+
+
+# sample formats: (format tag,bits per sample) -> numpy dtype
+# (format tag 1: PCM, 3: IEEE float)
+sampleformats={
+	(1,8):"u1",
+	(1,16):"<i2",
+	(1,32):"<i4",
+	(3,32):"<f4",
+}
+
+
+# "audioreader": audio input, demodulated to bits (same interface as "bitreader")
+#
+# The input is a WAV file (PCM 8, 16 or 32 bit, or 32 bit float), or raw PCM
+# (16 bit signed, little-endian, mono) with sample rate "rate". Of a WAV file
+# with more channels, only the first channel is used.
+class audioreader():
+	def __init__(self,f,rate=None,center=1000.0,shift=170.0,invert=False,blocksize=16384):
+		self.f=f
+		self.blocksize=blocksize # samples
+		self.remain=None # bytes in the data chunk, None: up to the end of the file
+
+		hdr=self.__read__(12)
+		if hdr[:4] == b"RIFF" and hdr[8:12] == b"WAVE":
+			(self.dtype,self.nch,rate)=self.__wavheader__()
+			self.pending=b''
+		else:
+			# raw PCM: the header is audio
+			(self.dtype,self.nch)=("<i2",1)
+			if rate is None: rate=48000
+			self.pending=hdr
+		#end else - if
+
+		self.samplesize=np.dtype(self.dtype).itemsize*self.nch
+		self.rate=rate
+		self.demod=fskdemod(rate,center=center,shift=shift,invert=invert)
+	#end def __init__
+
+
+	def __read__(self,n):
+		# read "n" bytes (less at the end of the file)
+		data=b''
+		while len(data) < n:
+			d=self.f.read(n-len(data))
+			if not d: break
+			data+=d
+		#end while
+		return data
+	#end def __read__
+
+
+	def __wavheader__(self):
+		# read the chunks up to the audio data, returns (dtype,channels,rate)
+		fmt=None
+
+		while True:
+			chunk=self.__read__(8)
+			if len(chunk) < 8: raise ValueError("WAV file without data")
+			(cid,size)=struct.unpack("<4sI",chunk)
+
+			if cid == b"data":
+				if fmt is None: raise ValueError("WAV file without format")
+				# streamed WAV: size 0 or 0xffffffff, read up to the end of the file
+				if 0 < size < 0xffffffff: self.remain=size
+				return fmt
+			#end if
+
+			data=self.__read__(size+(size & 1))
+			if cid == b"fmt ":
+				if len(data) < 16: raise ValueError("WAV format chunk too short")
+				(tag,nch,rate,byterate,align,bits)=struct.unpack_from("<HHIIHH",data)
+				if nch < 1 or rate == 0: raise ValueError("WAV format not valid: %d channels, sample rate %d" % (nch,rate))
+				# WAVE_FORMAT_EXTENSIBLE: format tag in the subformat
+				if tag == 0xfffe and len(data) >= 26: (tag,)=struct.unpack_from("<H",data,24)
+
+				if (tag,bits) not in sampleformats:
+					raise ValueError("WAV format not supported: format %d, %d bits" % (tag,bits))
+				#end if
+				fmt=(sampleformats[(tag,bits)],nch,rate)
+			#end if
+		#end while
+	#end def __wavheader__
+
+
+	def read(self):
+		# read and demodulate the next block, returns the bits
+		# (empty at the end of the file)
+		while True:
+			n=self.blocksize*self.samplesize
+			if self.remain is not None: n=min(n,self.remain)
+			if not n: return b''
+
+			data=self.pending+self.__read__(n-len(self.pending))
+			if self.remain is not None: self.remain-=len(data)-len(self.pending)
+			if not data: return b''
+
+			# keep an incomplete sample for the next block
+			k=len(data)-len(data) % self.samplesize
+			self.pending=data[k:]
+
+			samples=np.frombuffer(data[:k],dtype=self.dtype)[::self.nch].astype(np.float32)
+			bits=self.demod.feed(samples)
+			if bits: return bits
+		#end while
+	#end def read
+
+
+	def close(self):
+		# nothing to do (same interface as "bitreader")
+		pass
+	#end def close
+
+#end class audioreader
+
+
+
+# command line options for audio input, used by navtexdec.py
+def fskargs(parser,audio=True):
+	if audio: parser.add_argument("--audio",action="store_true",help="input is audio (WAV or raw PCM), demodulate the FSK signal (requires numpy)")
+	parser.add_argument("--rate",type=int,default=None,metavar="RATE",help="audio: sample rate of raw PCM input (default: 48000, WAV: from the header)")
+	parser.add_argument("--center",type=float,default=1000.0,metavar="HZ",help="audio: center frequency of the FSK signal (default: %(default)s)")
+	parser.add_argument("--shift",type=float,default=170.0,metavar="HZ",help="audio: frequency shift (default: %(default)s)")
+	parser.add_argument("--invert",action="store_true",help="audio: the lower tone is a 1 bit (default: the higher tone)")
+#end def fskargs
+
+
+def fskfromargs(parser,args):
+	# returns the function to create the "audioreader" of a file, or None
+	# if the input is not audio
+	# (a file that is not valid audio is a command line error)
+	if not getattr(args,"audio",True): return None
+
+	if np is None: parser.error("audio input requires numpy")
+	if args.rate is not None and args.rate <= 0: parser.error("--rate should be more than 0")
+
+	def reader(f):
+		try:
+			return audioreader(f,rate=args.rate,center=args.center,shift=args.shift,invert=args.invert)
+		except ValueError as e:
+			parser.error("%s: %s" % (args.filename,e))
+		#end try
+	#end def reader
+
+	return reader
+#end def fskfromargs
+
+
+
+def main():
+	parser=argparse.ArgumentParser(description="NAVTEX decoder, FSK demodulator")
+	parser.add_argument("filename",nargs="?",default="-",help="input file, WAV or raw PCM (default: stdin)")
+	fskargs(parser,audio=False)
+	parser.add_argument("-p","--packed",choices=("msb","lsb"),default=None,help="write packed data, 8 bits per byte, first bit is the msb or lsb")
+	parser.add_argument("-o","--output",default=None,help="output file (default: stdout)")
+	args=parser.parse_args()
+
+	reader=fskfromargs(parser,args)
+
+	fin=open(0 if args.filename == "-" else args.filename,"rb",buffering=0)
+	fout=open(args.output,"wb") if args.output else sys.stdout.buffer
+
+	bits=reader(fin)
+
+	# packed: bits of the last incomplete byte are kept for the next block
+	tail=b''
+	while True:
+		data=bits.read()
+		if not data: break
+
+		if args.packed:
+			data=tail+data
+			k=len(data)-len(data) % 8
+			tail=data[k:]
+			data=np.packbits(np.frombuffer(data[:k],dtype=np.uint8),bitorder="big" if args.packed == "msb" else "little").tobytes()
+		#end if
+		fout.write(data)
+	#end while
+
+	if tail: fout.write(np.packbits(np.frombuffer(tail,dtype=np.uint8),bitorder="big" if args.packed == "msb" else "little").tobytes())
+	fout.flush()
+
+#end main
+
+if __name__ == "__main__": main()
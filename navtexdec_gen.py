@@ -0,0 +1,252 @@
+import sys # for version check and argv
+import argparse
+
+"""
+NAVTEX bitstream generator
+input: text (or random NAVTEX messages)
+output: 100 bps bits, encoded as bytes 0x00 or 0x01 (or packed), as received
+	by "navtexdec.py"
+
+Usage:
+python3 navtexdec_gen.py [-n N] [--seed SEED] [--ber BER] [--slip P] [--gap P] [-p {msb,lsb}] [-o OUTFILE] [--text TEXTFILE]
+
+	-n: number of random messages (default: 10)
+	--seed: seed of the random generator (default: 1)
+	--ber: bit error rate (default: 0)
+	--slip: probability of a bit slip (one bit added or lost) per message
+	--gap: probability of a noise gap (random bits instead of the signal)
+		per message
+	-p / --packed: write packed data, 8 bits per byte (see navtexdec.py)
+	-o: output file (default: stdout)
+	--text: write the text of the messages to this file
+
+Use as module:
+	from navtexdec_gen import navtexgen
+	gen=navtexgen(seed=1,ber=1e-3)
+	bits=gen.emission("ZCZC FA01\\r\\nTEST\\r\\nNNNN\\r\\n")
+
+Every message is sent as a separate emission: phasing signals, the text
+(DX and RX interleaved, see "fecbits") and end of emission. Between the
+emissions, random bits (no signal) are sent.
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import math
+import random
+
+from navtexdec import ccir476, symrev, sym_alpha, sym_rc
+
+
+
+# reverse CCIR 476 tables: character -> 7bit char (in received order)
+enc_ltrs={}
+enc_figs={}
+for (k,(l,f)) in ccir476.items():
+	enc_ltrs.setdefault(l,symrev[k])
+	enc_figs.setdefault(f,symrev[k])
+#end for
+
+# 7bit char -> 7 bits, as bytes 0x00 / 0x01 (first received bit first)
+symbits=[bytes([(i >> (6-j)) & 1 for j in range(7)]) for i in range(128)]
+
+# 0x00 / 0x01 <-> "0" / "1", bit reversal of a byte
+bit2ascii=bytes.maketrans(b'\x00\x01',b'01')
+ascii2bit=bytes.maketrans(b'01',b'\x00\x01')
+byterev=bytes([int("{:08b}".format(i)[::-1],2) for i in range(256)])
+
+
+
+def encode(text):
+	# text -> list of 7bit chars, with <LTRS> and <FIGS> where needed
+	# lower case is sent as upper case, other characters that are not in
+	# the CCIR 476 table raise a ValueError
+	# (the text starts with <LTRS>: the receiver can be in any table)
+	syms=[enc_ltrs["<LTRS>"]]
+	table=0
+
+	for c in text.upper():
+		if c in enc_ltrs and (table == 0 or c not in enc_figs):
+			if table != 0 and c not in enc_figs:
+				syms.append(enc_ltrs["<LTRS>"])
+				table=0
+			#end if
+			syms.append(enc_ltrs[c])
+		elif c in enc_figs:
+			if table != 1:
+				syms.append(enc_figs["<FIGS>"])
+				table=1
+			#end if
+			syms.append(enc_figs[c])
+		else:
+			raise ValueError("character can not be sent: %r" % c)
+		#end elif - if
+	#end for
+
+	return syms
+#end def encode
+
+
+
+def fecbits(syms,phasing=80,tail=10):
+	# SITOR-B / FEC: every 7bit char is sent twice, as "DX" and as "RX" four
+	# char positions later. DX and RX are interleaved: DX(n), RX(n-2), DX(n+1) ...
+	# phasing: number of phasing signals before the text (<ALPHA> in DX, <RC> in RX),
+	# at least 10 seconds
+	# tail: number of <ALPHA> after the text (end of emission)
+	dx=[sym_alpha]*phasing+syms+[sym_alpha]*tail
+	rx=[sym_rc]*2+[sym_rc if s == sym_alpha else s for s in dx[:-2]]
+
+	out=[]
+	for (d,r) in zip(dx,rx):
+		out.append(symbits[d])
+		out.append(symbits[r])
+	#end for
+
+	return b''.join(out)
+#end def fecbits
+
+
+
+def packbits(bits,bitorder="msb"):
+	# bytes 0x00 / 0x01 -> 8 bits per byte (last byte padded with 0)
+	bits=bits+bytes(-len(bits) % 8)
+	data=int(bits.translate(bit2ascii) or b'0',2).to_bytes(len(bits)//8,"big")
+	return data.translate(byterev) if bitorder == "lsb" else data
+#end def packbits
+
+
+
+# "navtexgen": generator of NAVTEX emissions, with bit errors, bit slips
+# and noise gaps
+class navtexgen():
+	# words of the random messages
+	words=("GALE","WARNING","NORTH","SOUTH","SEA","WIND","SW","NE","7","TO","8","AT","1200","UTC",
+		"NAVAREA","POSITION","51-20N","002-30E","VESSEL","AGROUND","BUOY","UNLIT","FOG","VIS","\r\n")
+
+	def __init__(self,seed=1,ber=0.0,slip=0.0,gap=0.0,gaplen=(50,400),idle=(2000,6000)):
+		self.rng=random.Random(seed)
+		self.ber=ber # bit error rate
+		self.slip=slip # probability of a bit slip per emission
+		self.gap=gap # probability of a noise gap per emission
+		self.gaplen=gaplen # length of a noise gap (bits, min - max)
+		self.idle=idle # number of random bits between emissions (min - max)
+		self.serial={} # last serial number per station and subject
+	#end def __init__
+
+
+	def noise(self,n):
+		# "n" random bits
+		return format(self.rng.getrandbits(n),"0%db" % n).encode().translate(ascii2bit) if n > 0 else b''
+	#end def noise
+
+
+	def impair(self,bits):
+		# add bit errors, a bit slip and a noise gap
+		rng=self.rng
+		bits=bytearray(bits)
+
+		if self.ber > 0:
+			# distance between bit errors
+			logp=math.log1p(-self.ber) if self.ber < 1 else None
+			i=0
+			while True:
+				if logp is not None: i+=int(math.log(1.0-rng.random())/logp)
+				if i >= len(bits): break
+				bits[i]^=1
+				i+=1
+			#end while
+		#end if
+
+		if rng.random() < self.slip:
+			k=rng.randrange(len(bits))
+			if rng.random() < 0.5:
+				del bits[k]
+			else:
+				bits.insert(k,rng.randrange(2))
+			#end else - if
+		#end if
+
+		if rng.random() < self.gap:
+			n=rng.randrange(*self.gaplen)
+			k=rng.randrange(len(bits))
+			bits[k:k+n]=self.noise(n)
+		#end if
+
+		return bytes(bits)
+	#end def impair
+
+
+	def emission(self,text,phasing=80,tail=10):
+		# one emission: random bits (no signal) followed by "text"
+		return self.noise(self.rng.randrange(*self.idle))+self.impair(fecbits(encode(text),phasing,tail))
+	#end def emission
+
+
+	def message(self):
+		# random NAVTEX message, returns the text of the message
+		rng=self.rng
+		station=rng.choice("ABCDEFGHIJKLMNOPQRSTUVWXYZ")
+		subject=rng.choice("ABDEL")
+		serial=self.serial.get((station,subject),0) % 99+1
+		self.serial[(station,subject)]=serial
+
+		body=" ".join(rng.choice(self.words) for _ in range(rng.randrange(10,200)))
+		return "ZCZC %s%s%02d\r\n%s\r\nNNNN\r\n" % (station,subject,serial,body)
+	#end def message
+
+
+	def stream(self,nmsg):
+		# "nmsg" random messages, returns (bits,list of messages)
+		msgs=[self.message() for _ in range(nmsg)]
+		return (b''.join(self.emission(m) for m in msgs),msgs)
+	#end def stream
+
+#end class navtexgen
+
+
+
+def main():
+	parser=argparse.ArgumentParser(description="NAVTEX bitstream generator")
+	parser.add_argument("-n",type=int,default=10,help="number of random messages (default: %(default)s)")
+	parser.add_argument("--seed",type=int,default=1,help="seed of the random generator (default: %(default)s)")
+	parser.add_argument("--ber",type=float,default=0.0,help="bit error rate (default: %(default)s)")
+	parser.add_argument("--slip",type=float,default=0.0,metavar="P",help="probability of a bit slip per message (default: %(default)s)")
+	parser.add_argument("--gap",type=float,default=0.0,metavar="P",help="probability of a noise gap per message (default: %(default)s)")
+	parser.add_argument("-p","--packed",choices=("msb","lsb"),default=None,help="write packed data, 8 bits per byte, first bit is the msb or lsb")
+	parser.add_argument("-o","--output",default=None,help="output file (default: stdout)")
+	parser.add_argument("--text",default=None,metavar="TEXTFILE",help="write the text of the messages to this file")
+	args=parser.parse_args()
+
+	gen=navtexgen(seed=args.seed,ber=args.ber,slip=args.slip,gap=args.gap)
+	(bits,msgs)=gen.stream(args.n)
+
+	if args.packed: bits=packbits(bits,args.packed)
+
+	if args.output:
+		with open(args.output,"wb") as f:
+			f.write(bits)
+		#end with
+	else:
+		sys.stdout.buffer.write(bits)
+		sys.stdout.buffer.flush()
+	#end else - if
+
+	if args.text:
+		with open(args.text,"w") as f:
+			f.write("".join(msgs))
+		#end with
+	#end if
+
+#end main
+
+if __name__ == "__main__": main()
@@ -0,0 +1,351 @@
+import sys # for version check and argv
+import argparse
+
+"""
+NAVTEX decoder, sidecar index of recorded files
+input: index file, written by "navtexdec.py --index"
+output: list of the index points
+
+Usage:
+python3 navtexdec_index.py [-m] <indexfile>
+
+	-m / --messages: only list the messages (ZCZC up to NNNN), with the
+		"--range" to decode them
+
+Use as module:
+	from navtexdec_index import indexwriter, indexreader
+	index=indexwriter("file.idx",label=os.path.realpath(fname),size=os.path.getsize(fname))
+	events=index.feed(dec,data) (instead of "dec.feed(data)")
+	index.close()
+
+The index contains the bit position of every sync success, sync loss,
+"ZCZC" (start of a message) and "NNNN" (end of a message) in the file, plus
+a "mark" every --index-interval bits, each with the decoder state at that
+point (see "statefmt" in navtexdec_checkpoint.py). With "navtexdec.py
+--use-index", decoding with "--range" or "--last" starts at the state of the
+last index point before the start of the range: only the bits from that
+point on are decoded, and the decoder does not have to search sync.
+
+	sync, synclost, zczc: state just before the event, decoding from that
+		state starts with the event
+	nnnn: state just after the end of the message
+	mark: state at that position
+
+The position of "zczc" is the position of the first 'Z', the position of
+"nnnn" the position of the last 'N' (as printed with "printposition").
+
+File format (little-endian):
+	header: "NTXI", version (1 byte), bitorder (0: not packed, 1: msb, 2: lsb),
+		size of the input file (8 bytes), length of the input file name
+		(2 bytes), full path of the input file (utf-8)
+	per index point: type (1 byte), position (8 bytes), decoder state
+The index is written to a temporary file, and renamed when decoding is done.
+The index of an other file, or of a file that is shorter now, is refused.
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import os
+import struct
+import bisect
+
+from navtexdec import navtexdecoder, unpackbits
+from navtexdec_checkpoint import statefmt, packstate, unpackstate, bitorders, inputlabel
+
+
+
+magic=b"NTXI"
+version=2
+
+hdrfmt=struct.Struct("<4sBBQH")
+pointfmt=struct.Struct("<BQ")
+pointsize=pointfmt.size+statefmt.size
+
+kinds=("mark","sync","synclost","zczc","nnnn")
+
+
+
+# "indexwriter": write the index of a file while decoding it
+# label: full path of the input file, size: size of the input file (see "check")
+class indexwriter():
+	def __init__(self,fname,bitorder=None,interval=1<<16,label="",size=0):
+		self.fname=fname
+		self.bitorder=bitorder
+		self.interval=interval # bits between two "mark" points
+		self.nextmark=0
+
+		self.tail=[] # last 4 characters: (char,position)
+		self.prev=None # (state,bits) at the start of the previous block
+		self.count=0 # number of index points
+
+		self.f=open(fname+".tmp","wb")
+		l=label.encode()
+		self.f.write(hdrfmt.pack(magic,version,bitorders.index(bitorder),size,len(l)))
+		self.f.write(l)
+	#end def __init__
+
+
+	def feed(self,dec,data):
+		# feed "data" to decoder "dec", returns the events
+		state=packstate(dec)
+		inpos=dec.totalbitcount+len(dec.partial)
+
+		if inpos >= self.nextmark:
+			self.__write__("mark",inpos,state)
+			self.nextmark=inpos+self.interval
+		#end if
+
+		events=dec.feed(data)
+
+		# index points in the events: (type,position,position of the state)
+		points=[]
+		for (event,value,pos) in events:
+			if event == "sync":
+				points.append(("sync",pos,pos-1))
+			elif event == "synclost":
+				points.append(("synclost",pos,pos-1))
+				self.tail=[]
+			elif event == "char":
+				self.tail=(self.tail+[(value,pos)])[-4:]
+				text="".join(c for (c,p) in self.tail)
+
+				if text == "ZCZC":
+					points.append(("zczc",self.tail[0][1],self.tail[0][1]-1))
+					self.tail=[]
+				elif text == "NNNN":
+					points.append(("nnnn",pos,pos))
+					self.tail=[]
+				#end elif - if
+			#end elif - elif - if
+		#end for
+
+		bits=unpackbits(data,self.bitorder) if self.bitorder else bytes(data)
+		if points: self.__replay__(points,state,bits)
+
+		self.prev=(state,bits)
+		return events
+	#end def feed
+
+
+	def __replay__(self,points,state,bits):
+		# decoder state at every index point: decode this block again
+		# (from the previous block if needed: the first 'Z' of "ZCZC" can be
+		# in the previous block), up to every point
+		dec=navtexdecoder(bitorder=self.bitorder)
+		start=unpackstate(dec,state)
+
+		if self.prev and min(p[2] for p in points) < start:
+			bits=self.prev[1]+bits
+			start=unpackstate(dec,self.prev[0])
+		#end if
+
+		# (the bits are fed unpacked)
+		k=dec.skipbits
+		dec.skipbits=0
+		dec.bitorder=None
+		pos=start
+
+		for (kind,evpos,statepos) in points:
+			n=max(statepos-pos,0)
+			dec.feed(bits[k:k+n])
+			k+=n
+			pos+=n
+
+			dec.bitorder=self.bitorder
+			self.__write__(kind,evpos,packstate(dec))
+			dec.bitorder=None
+		#end for
+	#end def __replay__
+
+
+	def __write__(self,kind,pos,state):
+		self.f.write(pointfmt.pack(kinds.index(kind),pos))
+		self.f.write(state)
+		self.count+=1
+	#end def __write__
+
+
+	def close(self):
+		self.f.close()
+		os.replace(self.fname+".tmp",self.fname)
+	#end def close
+
+#end class indexwriter
+
+
+
+# "indexreader": index points of a file, sorted on the position of the state
+class indexreader():
+	def __init__(self,fname):
+		with open(fname,"rb") as f:
+			data=f.read()
+		#end with
+
+		self.fname=fname
+
+		if len(data) < hdrfmt.size:
+			raise ValueError("invalid index file: %s" % fname)
+		#end if
+
+		(m,v,b,self.size,k)=hdrfmt.unpack_from(data)
+		start=hdrfmt.size+k
+		if m != magic or v != version or b >= len(bitorders) or len(data) < start or (len(data)-start) % pointsize:
+			raise ValueError("invalid index file: %s" % fname)
+		#end if
+		self.bitorder=bitorders[b]
+		self.label=data[hdrfmt.size:start].decode()
+
+		# (type,position,input position of the state,state)
+		points=[]
+		for i in range(start,len(data),pointsize):
+			(kind,pos)=pointfmt.unpack_from(data,i)
+			state=data[i+pointfmt.size:i+pointsize]
+			points.append((kinds[kind],pos,statefmt.unpack(state)[19],state))
+		#end for
+
+		points.sort(key=lambda p: p[2])
+		self.points=points
+		self.inpos=[p[2] for p in points]
+	#end def __init__
+
+
+	def check(self,label,size):
+		# raises ValueError if the index is of an other input file than
+		# "label", or the input file is shorter than when it was indexed
+		if label != self.label:
+			raise ValueError("index is for an other input (%s): %s" % (self.label,self.fname))
+		#end if
+
+		if size < self.size:
+			raise ValueError("input file is shorter than when it was indexed (%d bytes, was %d): %s" % (size,self.size,self.fname))
+		#end if
+	#end def check
+
+
+	def find(self,pos):
+		# last index point with its state before bit "pos", or None
+		# (decoding from that state gives all events at position "pos" and later)
+		k=bisect.bisect_left(self.inpos,pos)
+		return self.points[k-1] if k else None
+	#end def find
+
+
+	def restore(self,dec,pos):
+		# set decoder "dec" to the state of the last index point before "pos"
+		# returns the position to continue decoding (bits), or None
+		p=self.find(pos)
+		if p is None: return None
+
+		return unpackstate(dec,p[3])
+	#end def restore
+
+#end class indexreader
+
+
+
+# command line options for the index, used by navtexdec.py
+def indexargs(parser):
+	parser.add_argument("--index",default=None,metavar="FILE",help="write an index of sync points and messages of the input file to FILE")
+	parser.add_argument("--index-interval",type=int,default=1<<16,metavar="BITS",help="index: bits between two index points without event (default: %(default)s)")
+	parser.add_argument("--use-index",default=None,metavar="FILE",help="with --range or --last: start decoding at the nearest index point in FILE")
+#end def indexargs
+
+
+def indexfromargs(parser,args,fname):
+	# returns (indexwriter,indexreader), None if not used
+	# fname: input file, the index must be of this file (see "check")
+	writer=None
+	reader=None
+
+	if args.use_index or args.index:
+		try:
+			label=inputlabel(fname)
+			size=os.path.getsize(fname)
+		except OSError as e:
+			parser.error("index: %s" % e)
+		#end try
+	#end if
+
+	if args.use_index:
+		try:
+			reader=indexreader(args.use_index)
+		except (OSError,ValueError) as e:
+			parser.error("index: %s" % e)
+		#end try
+
+		if reader.bitorder != args.packed:
+			parser.error("index: the index is for an other input format (--packed): %s" % args.use_index)
+		#end if
+
+		try:
+			reader.check(label,size)
+		except ValueError as e:
+			parser.error("index: %s" % e)
+		#end try
+	#end if
+
+	if args.index:
+		try:
+			writer=indexwriter(args.index,bitorder=args.packed,interval=args.index_interval,label=label,size=size)
+		except OSError as e:
+			parser.error("index: %s" % e)
+		#end try
+	#end if
+
+	return (writer,reader)
+#end def indexfromargs
+
+
+
+def hms(pos):
+	# bit position -> time in the recording (100 bps)
+	s=pos//100
+	return "%d:%02d:%02d" % (s//3600,s//60 % 60,s % 60)
+#end def hms
+
+
+
+def main():
+	parser=argparse.ArgumentParser(description="NAVTEX decoder, list a sidecar index")
+	parser.add_argument("indexfile",help="index file (navtexdec.py --index)")
+	parser.add_argument("-m","--messages",action="store_true",help="only list the messages")
+	args=parser.parse_args()
+
+	try:
+		index=indexreader(args.indexfile)
+	except (OSError,ValueError) as e:
+		parser.error(str(e))
+	#end try
+
+	if not args.messages:
+		for (kind,pos,inpos,state) in index.points:
+			print("%-8s %12d %10s" % (kind,pos,hms(pos)))
+		#end for
+		return
+	#end if
+
+	# messages: every "zczc", up to the next "nnnn" (if any)
+	events=sorted((pos,kind) for (kind,pos,inpos,state) in index.points if kind in ("zczc","nnnn"))
+	for (k,(pos,kind)) in enumerate(events):
+		if kind != "zczc": continue
+
+		end=events[k+1][0] if k+1 < len(events) and events[k+1][1] == "nnnn" else None
+		if end is None:
+			print("%10s  ZCZC %12d  (no NNNN)          --range %d" % (hms(pos),pos,pos))
+		else:
+			print("%10s  ZCZC %12d  NNNN %12d  --range %d:%d" % (hms(pos),pos,end,pos,end))
+		#end else - if
+	#end for
+
+#end main
+
+if __name__ == "__main__": main()
@@ -0,0 +1,198 @@
+import sys # for version check and argv
+
+"""
+NAVTEX decoder, end-to-end latency
+Time from the reception of the bits of a character (datagram received by
+"getinbits") up to the character leaving the decoder, and up to the
+character written to the output (after the buffering of "outsink").
+
+	decode: datagram received -> character decoded
+	output: datagram received -> character written to the output file
+	message: datagram received -> end of a message ("NNNN") written to the
+		output file
+
+The time starts when the datagram with the first copy ("DX") of the character
+is received: a character is sent twice, the second copy ("RX") 5 characters
+(35 bits) later, so the latency includes this FEC delay (0.35 seconds at 100
+bps). With "-m / --messages", characters are written as part of the message,
+use the "message" latency.
+
+Percentiles (50%, 90%, 99%, max) of the last "nsample" characters are printed
+on stderr every --latency-interval seconds and at exit, and are served with
+the metrics (see navtexdec_metrics.py, "navtex_latency_seconds").
+
+Used by navtexdec_mc.py, option "--latency"
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import time
+import atexit
+import collections
+
+
+
+stages=("decode","output","message")
+quantiles=(0.5,0.9,0.99)
+
+# bits between the end of the first copy (DX) and the second copy (RX) of a character
+fecdelay=35
+
+
+
+# "latencytracker": latency of the characters of one decoder
+class latencytracker():
+	def __init__(self,sink,label="",nsample=10000):
+		self.sink=sink # "outsink" or "tagsink" the characters are written to
+		self.label=label
+
+		self.arrivals=collections.deque() # (bit position after the datagram,time received)
+		self.pending=collections.deque() # (characters written to the sink,time received,end of message)
+		self.samples={s:collections.deque(maxlen=nsample) for s in stages}
+		self.tail="" # last 4 characters, to detect "NNNN"
+	#end def __init__
+
+
+	def arrival(self,pos,t):
+		# datagram received at time "t": bits up to position "pos"
+		a=self.arrivals
+		a.append((pos,t))
+
+		# keep the datagrams of the last 1000 bits
+		while len(a) > 1 and a[1][0] < pos-1000:
+			a.popleft()
+		#end while
+	#end def arrival
+
+
+	def rxtime(self,pos):
+		# time the datagram with bit "pos" was received
+		for (end,t) in self.arrivals:
+			if end >= pos: return t
+		#end for
+
+		return self.arrivals[-1][1]
+	#end def rxtime
+
+
+	def out(self,pev,events):
+		# write the events with "pev" (see "printevent"), in one call (the
+		# events of one datagram). All characters are written to the
+		# output when the text written by this call is
+		now=time.monotonic()
+		pev.out(events)
+		written=self.sink.written
+
+		for (event,value,pos) in events:
+			if event != "char": continue
+
+			t=self.rxtime(pos-fecdelay)
+			self.samples["decode"].append(now-t)
+
+			self.tail=(self.tail+value)[-4:]
+			self.pending.append((written,t,self.tail == "NNNN"))
+		#end for
+
+		self.check()
+	#end def out
+
+
+	def check(self):
+		# characters that are written to the output file
+		n=self.sink.outcount()
+		p=self.pending
+		if not p or p[0][0] > n: return
+
+		now=time.monotonic()
+		while p and p[0][0] <= n:
+			(count,t,eom)=p.popleft()
+			self.samples["output"].append(now-t)
+			if eom: self.samples["message"].append(now-t)
+		#end while
+	#end def check
+
+
+	def percentiles(self,stage):
+		# (count,50%,90%,99%,max) in seconds, None if no samples
+		s=sorted(self.samples[stage])
+		if not s: return None
+
+		return (len(s),)+tuple(s[min(int(q*len(s)),len(s)-1)] for q in quantiles)+(s[-1],)
+	#end def percentiles
+
+#end class latencytracker
+
+
+
+# "latencyreport": latency of all decoders of a process
+class latencyreport():
+	def __init__(self,interval=60.0,f=None):
+		self.interval=interval
+		self.f=f if f is not None else sys.stderr
+		self.trackers=[]
+		self.last=time.monotonic()
+
+		atexit.register(self.report)
+	#end def __init__
+
+
+	def add(self,sink,label=""):
+		# latency of the characters written to "sink"
+		lt=latencytracker(sink,label)
+		self.trackers.append(lt)
+		return lt
+	#end def add
+
+
+	def poll(self):
+		# check all decoders (output flushed by a timer), report every "interval" seconds
+		for lt in self.trackers:
+			lt.check()
+		#end for
+
+		if self.interval and time.monotonic()-self.last >= self.interval: self.report()
+	#end def poll
+
+
+	def report(self):
+		self.last=time.monotonic()
+		f=self.f
+
+		f.write("\n### Latency (seconds)\n")
+		f.write("%-24s %-8s %8s %8s %8s %8s %8s\n" % ("channel","stage","count","50%","90%","99%","max"))
+		for lt in self.trackers:
+			for stage in stages:
+				p=lt.percentiles(stage)
+				if p: f.write("%-24s %-8s %8d %8.3f %8.3f %8.3f %8.3f\n" % ((lt.label,stage)+p))
+			#end for
+		#end for
+
+		f.flush()
+	#end def report
+
+#end class latencyreport
+
+
+
+# command line options for latency tracking, shared by the command line tools
+def latencyargs(parser):
+	parser.add_argument("--latency",action="store_true",help="track the latency from datagram reception to character output (on stderr)")
+	parser.add_argument("--latency-interval",type=float,default=60.0,metavar="SECONDS",help="latency: report interval, 0: only at exit (default: %(default)s)")
+#end def latencyargs
+
+
+def latencyfromargs(parser,args):
+	# returns a "latencyreport", or None if the latency is not tracked
+	if not args.latency: return None
+
+	return latencyreport(interval=args.latency_interval)
+#end def latencyfromargs
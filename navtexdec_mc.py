@@ -1,4 +1,5 @@
 import sys # for version check and argv
+import argparse
 
 """
 NAVTEX decoder
@@ -6,7 +7,70 @@ input: 100 bps bits, encoded as bytes 0x00 or 0x01
 output: text
 
 Usage:
-python3 navtexdec_mc.py [multicast-ip-address] [udp-port]
+python3 navtexdec_mc.py [-p {msb,lsb}] [--rxqueue N] [--rcvbuf BYTES] [--lookback BITS] [-m [--dedup N] [--dedup-expiry SECONDS]] [--store DATABASE] [--publish-unix PATH] [--publish-mc IP:PORT] [--metrics-port PORT] [--metrics-file FILE] [--latency] [--checkpoint FILE] [--profile] [--flush FLUSH] [--flush-delay SECONDS] [--bufsize N] [multicast-ip-address] [udp-port]
+python3 navtexdec_mc.py [options] -c ip:port[:label] [-c ip:port[:label] ...]
+
+	-c / --channel: multi-channel mode: decode several multicast streams
+		in one process. Every output line starts with "[label] "
+		(default label: ip:port)
+
+	-p / --packed: received data is packed, 8 bits per byte
+		msb: first bit is the most significant bit of the byte
+		lsb: first bit is the least significant bit of the byte
+
+	--rxqueue: receive the datagrams in a separate thread, with a queue of
+		N datagrams (default: 0, receive in the decoder thread). Datagrams
+		are received while the decoder is busy or the output is blocked;
+		when the queue is full, datagrams are dropped, counted and reported
+		on stderr (and in the metrics, with the largest queue fill)
+	--rcvbuf: size of the socket receive buffer in bytes (default: system
+		default, linux: limited by net.core.rmem_max)
+
+	--lookback: on sync loss, search the last BITS received bits for a
+		bit slip (default: 0, off). See navtexdec.py
+
+	-m / --messages: only print NAVTEX messages, duplicates are dropped
+		(in multi-channel mode also when received on another channel)
+		See navtexdec.py and navtexdec_msg.py
+
+	--store: store all received messages in a SQLite database, with the
+		channel and the receive time (also without -m). Messages are
+		written in batches of --store-batch messages (default: 100), or
+		after --store-delay seconds (default: 1). See navtexdec_store.py
+
+	--publish-unix, --publish-mc: publish the decoded characters and the
+		messages (duplicates dropped, see --dedup) to many consumers, on a
+		Unix domain socket and/or to a multicast address. A subscriber that
+		does not read fast enough loses records when its buffer of
+		--publish-buffer bytes (default: 65536) is full, the decoder is not
+		blocked. See navtexdec_pub.py
+
+	--metrics-port: serve decoder metrics over HTTP, in the Prometheus text
+		format (--metrics-addr: ip-address, default: 127.0.0.1)
+	--metrics-file: write the metrics to a file, every --metrics-interval
+		seconds (default: 10)
+		See navtexdec_metrics.py
+
+	--latency: track the time from the reception of a datagram up to the
+		decoded characters written to the output (50%, 90%, 99% and max),
+		printed on stderr every --latency-interval seconds (default: 60)
+		and at exit, and served with the metrics. See navtexdec_latency.py
+
+	--checkpoint: write the decoder state to FILE every --checkpoint-interval
+		seconds (default: 60), and restore it when started again (one file
+		for all channels). The datagrams received while the decoder was
+		not running are lost, so the decoder searches sync again.
+		See navtexdec_checkpoint.py
+
+	--profile: print the wall and cpu time per decoder stage on stderr, at
+		exit and on SIGUSR1. See navtexdec.py and navtexdec_profile.py
+
+	--flush: flush the output on "eol" (end of line), "msg" (end of a NAVTEX
+		message, "NNNN"), "all" (every character) or "none" (comma separated)
+		(default: eol,msg)
+	--flush-delay: flush the output when it is buffered for this many seconds
+		(default: 1 second)
+	--bufsize: flush the output when this many characters are buffered
 
 
 Version 0.1.0: 2020/Sep/19
@@ -24,463 +88,483 @@ if sys.version_info.major < 3:
 	raise RuntimeError("Python version 3 or newer required")
 #end if
 
+import time
+import queue
 import socket
 import struct
+import selectors
+import threading
+import collections
+
+from navtexdec import navtexdecoder, printevent, outsink, outsinkargs, outsinkfromargs
+from navtexdec_msg import msgargs, printerfromargs
+from navtexdec_metrics import metricsargs, metricsfromargs
+from navtexdec_profile import profileargs, profilefromargs
+from navtexdec_checkpoint import checkpointargs, checkpointfromargs
+from navtexdec_store import storeargs, storefromargs
+from navtexdec_pub import pubargs, pubfromargs
+from navtexdec_latency import latencytracker, latencyargs, latencyfromargs
 
 # global data
 defaultip="225.0.0.1"
 defaultport=10000
 
-# some debug options
-# (check the code to see what they do)
-printalldata=False
-printposition=False
 
 
+# create socket and join multicast group
+# bindgroup: bind to the multicast address instead of any ip-address
+# rcvbuf: size of the socket receive buffer (bytes), None: system default
+def mcsocket(mcip=defaultip, mcport=defaultport, bindgroup=False, rcvbuf=None):
+	# receiving multicast in python, shameless stolen from
+	# https://stackoverflow.com/questions/603852/how-do-you-udp-multicast-in-python
 
-def navtexdec_mc(mcip=defaultip, mcport=defaultport, flushall=True, flushnl=True):
-
-	# if flushall is true, set also flush cr/lf
-	if flushall: flushnl=True
-
-	# CCIR 476 character set
-	# source: http://search.itu.int/history/HistoryDigitalCollectionDocLibrary/1.43.48.en.104.pdf
-
-	ccir476={
-		b'\x00\x00\x00\x01\x01\x01\x01':('<ALPHA>','<ALPHA>'),
-
-		b'\x00\x00\x01\x00\x01\x01\x01':('J','\a'), # \a = BELL (aka \x07)
-		b'\x00\x00\x01\x01\x00\x01\x01':('F','!'),
-		b'\x00\x00\x01\x01\x01\x00\x01':('C',':'),
-		b'\x00\x00\x01\x01\x01\x01\x00':('K','('),
-
-		b'\x00\x01\x00\x00\x01\x01\x01':('W','2'),
-		b'\x00\x01\x00\x01\x00\x01\x01':('Y','6'),
-		b'\x00\x01\x00\x01\x01\x00\x01':('P','0'),
-		b'\x00\x01\x00\x01\x01\x01\x00':('Q','1'),
-
-		b'\x00\x01\x01\x00\x00\x01\x01':('<BETA>','<BETA>'),
-		b'\x00\x01\x01\x00\x01\x00\x01':('G','&'),
-		b'\x00\x01\x01\x00\x01\x01\x00':('<FIGS>','<FIGS>'),
-		b'\x00\x01\x01\x01\x00\x00\x01':('M','.'),
-		b'\x00\x01\x01\x01\x00\x01\x00':('X','/'),
-		b'\x00\x01\x01\x01\x01\x00\x00':('V','='),
-
-		b'\x01\x00\x00\x00\x01\x01\x01':('A','-'),
-		b'\x01\x00\x00\x01\x00\x01\x01':('S','\''),
-		b'\x01\x00\x00\x01\x01\x00\x01':('I','8'),
-		b'\x01\x00\x00\x01\x01\x01\x00':('U','7'),
-
-		b'\x01\x00\x01\x00\x00\x01\x01':('D','$'),
-		b'\x01\x00\x01\x00\x01\x00\x01':('R','4'),
-		b'\x01\x00\x01\x00\x01\x01\x00':('E','3'),
-		b'\x01\x00\x01\x01\x00\x00\x01':('N',','),
-		b'\x01\x00\x01\x01\x00\x01\x00':('<LTRS>','<LTRS>'),
-		b'\x01\x00\x01\x01\x01\x00\x00':(' ',' '),
-
-		b'\x01\x01\x00\x00\x00\x01\x01':('Z','+'),
-		b'\x01\x01\x00\x00\x01\x00\x01':('L',')'),
-		b'\x01\x01\x00\x00\x01\x01\x00':('<RC>','<RC>'),
-		b'\x01\x01\x00\x01\x00\x00\x01':('H','#'),
-		b'\x01\x01\x00\x01\x00\x01\x00':('<CH32>','<CH32>'),
-		b'\x01\x01\x00\x01\x01\x00\x00':("\r","\r"),
-
-
-		b'\x01\x01\x01\x00\x00\x00\x01':('O','9'),
-		b'\x01\x01\x01\x00\x00\x01\x00':('B','?'),
-		b'\x01\x01\x01\x00\x01\x00\x00':('T','5'),
-		b'\x01\x01\x01\x01\x00\x00\x00':("\n","\n")}
-	#end CCIR 476 table
-
-	# CCIR 476 characters '<ALPHA>' and '<RC>' defined as list.
-	# used seperately in the program
-	alpha=[0,0,0,1,1,1,1]
-	rc=[1,1,0,0,1,1,0]
-
-
-	# some internal support functions
-
-	def __isvalidresponse__(x1,x2):
-		# returns true if
-		# 		x1 = x2
-		#		'ALPHA' as response to 'Sync Response'
-		return True if (x1 == x2) or (x1,x2) == (rc,alpha) else False
-	#end def equal response
-
-
-	# "printchar" defined as class, as it needs to maintain the "table" state
-	class printchar():
-
-		def __init__(self,table=0,printall=False, flushall=flushall, flushnl=flushnl):
-			self.table=table
-			self.printall=printall
-			self.flushall=flushall
-			self.flushnl=flushnl
-		#end def __init__
-
-		def out(self,inchar):
-			try:
-				towritechar=ccir476[inchar][self.table]
-			except KeyError:
-				towritechar=inchar
-			#end try
-
-
-			if towritechar == '<LTRS>':
-				# change to "letters" table
-				if self.printall: print('<LTRS>',flush=self.flushall,end='')
-				self.table=0
-			elif towritechar == '<FIGS>':
-				# change to "figures" table
-				if self.printall: print('<FIGS>',flush=self.flushall,end='')
-				self.table=1
-			elif towritechar in ('<ALPHA>','<BETA>','<RC>','<CH32>'):
-				# do not print special characters
-				if self.printall: print(towritechar,flush=self.flushall,end='')
-				#pass
-			elif towritechar in ('\r',):
-				# do not print LF
-				pass
-			elif towritechar:
-				# is there actually something to print?
-				thisflush = self.flushnl if towritechar=="\n" else self.flushall
-				print(towritechar, end='',flush=thisflush)
-			#end elif - elif - elif - if
-
-			return table
-		#end def
-	#end class 'printchar'
+	# assert bind_group in groups + [None], \
+	#     'bind group not in groups to join'
+	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
 
+	# allow reuse of socket (to allow another instance of python to run this
+	# script binding to the same ip/port)
+	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-	# get input bits from multicast stream
-	class getinbits():
-		def __init__ (self,sock):
-			self.buff = []
-			self.bufptr = 0
-			self.bufsize = 0
-			self.sock=sock
-		#end def __init__
+	# larger receive buffer: more datagrams can wait when the decoder is busy
+	# (limited by the system, linux: net.core.rmem_max, the size is doubled by the kernel)
+	if rcvbuf:
+		sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, rcvbuf)
+		size=sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+		if size < rcvbuf:
+			sys.stderr.write("### %s:%d: socket receive buffer is %d bytes, not %d (see net.core.rmem_max)\n" % (mcip,mcport,size,rcvbuf))
+		#end if
+	#end if
 
-		def get(self,n):
-			bits2get=n
-			retbuf=[]
+	sock.bind((mcip if bindgroup else '',mcport)) # bind to any ip-address
 
-			while True:
-				# get data from socket if buffer is completely read
-				if self.bufptr == self.bufsize:
-					newbytes = self.sock.recv(10240)
+	#igmp join
+	mreq=struct.pack('4sl',socket.inet_aton(mcip),socket.INADDR_ANY)
+	sock.setsockopt(socket.IPPROTO_IP,socket.IP_ADD_MEMBERSHIP,mreq)
 
-					newbl=len(newbytes)
-					if newbl == 0: continue # try again if no data read
-					
-					# store data in buffer and set pointer and size 
-					self.buff=struct.unpack('B'*newbl,newbytes)
-					self.bufptr=0
-					self.bufsize=newbl
-				#end if
+	return sock
+#end def mcsocket
 
-				# get as much data from the buffer as possible
-				nbits=min(bits2get,(self.bufsize-self.bufptr))
 
-				retbuf += self.buff[self.bufptr:self.bufptr+nbits] # copy data from buffer
 
-				self.bufptr += nbits # move buffer pointer upwards
-				bits2get -= nbits
+# get input bits from multicast stream
+#
+# Datagrams are received with "recv_into" in a ring of preallocated buffers
+# ("nslot" buffers of "slotsize" bytes), and returned as a memoryview of that
+# buffer: receiving a datagram does not allocate or copy any data.
+# The data of a datagram is valid up to "nslot" more datagrams are received.
+# "rxtime" is the time the last datagram was received (time.monotonic)
+class getinbits():
+	def __init__ (self,sock,nslot=4,slotsize=10240):
+		self.sock=sock
+		self.nslot=nslot
+		self.slotsize=slotsize
 
-				if bits2get == 0: return retbuf # we have sufficient data, return
+		self.buff=bytearray(nslot*slotsize)
+		self.slots=[memoryview(self.buff)[i*slotsize:(i+1)*slotsize] for i in range(nslot)]
+		self.slotptr=0
+		self.rxtime=0.0
+	#end def __init__
 
-				# not yet enough data, get some more
-				continue # return in loop to grab more data
-			#end endless loop
-		#end def get
+	def recv(self):
+		# receive one datagram in the next slot of the ring
+		# (raises BlockingIOError on a non-blocking socket if no data is waiting)
+		slot=self.slots[self.slotptr]
+		n=self.sock.recv_into(slot)
+		self.rxtime=time.monotonic()
 
-	#end class getinbits():
+		self.slotptr+=1
+		if self.slotptr >= self.nslot: self.slotptr=0
 
+		return slot[:n]
+	#end def recv
 
+	def get(self,timeout=None):
+		# returns the data of the next datagram, None if no datagram is
+		# received within "timeout" seconds (same interface as "rxthread")
+		self.sock.settimeout(timeout)
 
+		while True:
+			try:
+				newbytes = self.recv()
+			except socket.timeout:
+				return None
+			#end try
 
-	# ####################################
-	######################################
-	# main part of the function start here
+			if len(newbytes) == 0: continue # try again if no data read
 
-	# receiving multicast in python, shameless stolen from
-	# https://stackoverflow.com/questions/603852/how-do-you-udp-multicast-in-python
+			return newbytes
+		#end endless loop
+	#end def get
 
-	# assert bind_group in groups + [None], \
-	#     'bind group not in groups to join'
-	sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+#end class getinbits():
 
-	# allow reuse of socket (to allow another instance of python to run this
-	# script binding to the same ip/port)
-	sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
 
-	sock.bind(('',mcport)) # bind to any ip-address
 
-	#igmp join
-	mreq=struct.pack('4sl',socket.inet_aton(mcip),socket.INADDR_ANY)
-	sock.setsockopt(socket.IPPROTO_IP,socket.IP_ADD_MEMBERSHIP,mreq)
+# "rxthread": receive the datagrams of one or more sockets in a separate thread
+#
+# The datagrams are put in a queue of "maxqueue" datagrams, so datagrams are
+# received while the decoder is busy or the output is blocked (slow pipe or
+# terminal). When the queue is full, datagrams are dropped and counted per
+# socket, instead of being dropped by the kernel without any notice.
+# Same interface as "getinbits": "get" returns the data of the next
+# datagram, "rxtime" is the time it was received and "sock" its socket.
+class rxthread():
+	def __init__(self,socks,maxqueue=1000,slotsize=10240):
+		self.slotsize=slotsize
+		self.queue=queue.Queue(maxqueue)
 
+		self.dropped={sock:0 for sock in socks} # datagrams dropped per socket
+		self.maxfill=0 # largest number of datagrams in the queue
+		self.reported=0 # dropped datagrams already reported
+		self.lastreport=time.monotonic()
 
-	indata=getinbits(sock)
-	pch=printchar()
+		self.sock=None
+		self.rxtime=0.0
 
-	# init some vars
-	fecscore=0
+		self.sel=selectors.DefaultSelector()
+		for sock in socks:
+			sock.setblocking(False)
+			self.sel.register(sock,selectors.EVENT_READ)
+		#end for
 
-	# "letter" or "figures"
-	table=0
+		threading.Thread(target=self.__run__,daemon=True).start()
+	#end def __init__
 
-	#fec memory buffer
-	# create with same structure as used in the code
-	fecmem=[[True,[0 in range(7)]],[True,[0 in range(7)]],[True,[0 in range(7)]]]
-	fecmemptr=0
-	fecstate=0
 
-	#total byte counter
-	totalbitcount=0
+	def __run__(self):
+		# receiver thread: all datagrams waiting on the sockets to the queue
+		q=self.queue
 
+		while True:
+			for (key,mask) in self.sel.select():
+				sock=key.fileobj
 
+				while True:
+					try:
+						data=sock.recv(self.slotsize)
+					except BlockingIOError:
+						break
+					#end try
 
-	#endless loop, break out with 'break' at the end of the file
+					if not data: continue
 
-	while True:
+					try:
+						q.put_nowait((sock,data,time.monotonic()))
+					except queue.Full:
+						self.dropped[sock]+=1
+						continue
+					#end try
 
-		if totalbitcount == 0:
-			print("\n### Syncronizing",flush=True)
-		else:
-			print("\n### Syncronisation lost ... Resyncronizing",flush=True)
-		#end if
+					n=q.qsize()
+					if n > self.maxfill: self.maxfill=n
+				#end while
+			#end for
+		#end while
+	#end def __run__
 
-		# DEBUG
-		if printposition: print("## Position:",totalbitcount)
 
+	def get(self,timeout=None):
+		# returns the data of the next datagram, None after "timeout" seconds
+		try:
+			(self.sock,data,self.rxtime)=self.queue.get(timeout=timeout)
+		except queue.Empty:
+			return None
+		#end try
 
+		return data
+	#end def get
 
-		# state 1: look for sync
 
-		# start with 10 char buffer (= 70 bits)
-		# only done at the beginning of the file / stdin
-		if totalbitcount == 0:
-			buf=indata.get(70)
-			
-			totalbitcount+=70
-		else:
-			n=indata.get(1)
+	def poll(self,interval=10.0):
+		# report dropped datagrams on stderr (at most every "interval" seconds)
+		total=sum(self.dropped.values())
+		if total == self.reported or time.monotonic()-self.lastreport < interval: return
 
-			if len(n) < 1: return False # break out on end of file
-			
-			buf.pop(0)
-			buf.append(n[0])
-			totalbitcount+=1
-		#end if
+		sys.stderr.write("### receive queue full: %d datagrams dropped (total %d, queue size %d, max fill %d)\n" % (total-self.reported,total,self.queue.maxsize,self.maxfill))
+		sys.stderr.flush()
+		self.reported=total
+		self.lastreport=time.monotonic()
+	#end def poll
 
-		# clear tempory buffer used to transfer data from "state 1' (sync) to "state 2"
-		tmpbuff=[]
+#end class rxthread
 
 
-		#endless loop (for 'sync' state)
 
-		while True:
-			# convert 70 bits into 10 * 7bit char
-			char7=[buf[i*7:(i+1)*7] for i in range(10)]
+def navtexdec_mc(mcip=defaultip, mcport=defaultport, flushall=True, flushnl=True, bitorder=None, sink=None, printer=printevent, metrics=None, profile=None, lookback=0, checkpoint=None, store=None, latency=None, rxqueue=0, rcvbuf=None, publish=None):
 
+	# if flushall is true, set also flush cr/lf
+	if flushall: flushnl=True
 
-			# count the number of '1' bits
-			nbit=[len(list(filter(lambda x: x,c7))) for c7 in char7] 
+	# output: if no "sink" is given, use flushall / flushnl
+	if sink is None: sink=outsink(flusheol=flushnl,maxdelay=0 if flushall else None)
 
+	# rxqueue: receive in a separate thread, see "rxthread"
+	sock=mcsocket(mcip,mcport,rcvbuf=rcvbuf)
+	indata=rxthread([sock],maxqueue=rxqueue) if rxqueue else getinbits(sock)
 
-			# sync check:
+	dec=navtexdecoder(bitorder=bitorder,lookback=lookback)
+	pev=printer(sink)
+	if store: pev=store.printer(pev,"%s:%d" % (mcip,mcport))
+	if publish: pev=publish.printer(pev,"%s:%d" % (mcip,mcport))
 
-			# rule 1: all 7chars should contain 4 '1' bits
-			# rule 2: not all chars should be the same
-			# rule 3: char 5, 7 and 9 should be a reply to 0, 2 and 4
-			if (len(list(filter(lambda x: x != 4, nbit))) != 0) or (char7[9]==char7[7]==char7[5]) or  (not __isvalidresponse__(char7[9][::-1],char7[4][::-1])) or (not __isvalidresponse__(char7[7][::-1],char7[2][::-1])) or (not __isvalidresponse__(char7[5][::-1],char7[0][::-1])):
+	# metrics: counters of this decoder
+	m=metrics.add(dec,"%s:%d" % (mcip,mcport)) if metrics else None
+	if profile: profile.watch(dec)
+	if checkpoint: checkpoint.add(dec,"%s:%d" % (mcip,mcport),live=True)
 
-				# not yet syncronised -> get next bit
-				n=indata.get(1)
+	# latency: time received of every datagram
+	lt=latency.add(sink,"%s:%d" % (mcip,mcport)) if latency else None
+	if m: m.latency=lt
+	if m and rxqueue: m.rx=(indata,sock)
 
-				# shift down stack and add new bit at the end
-				buf.pop(0)
-				buf.append(n[0])
+	# wake up regulary to flush the output, the message store, the
+	# subscribers and the latency report, if needed
+	timeout=min([t for t in (sink.maxdelay,store.maxdelay if store else None,1.0 if publish or latency else None) if t],default=None)
 
-				totalbitcount+=1
-				continue
-			#end if
+	# endless loop: decode received data
+	while True:
+		newbytes=indata.get(timeout)
 
+		if newbytes is not None:
+			events=dec.feed(newbytes)
+			if m: m.update(len(newbytes),events)
 
-			# syncronisation success: we have valid data
+			if lt:
+				lt.arrival(dec.totalbitcount+len(dec.partial),indata.rxtime)
+				lt.out(pev,events)
+			else:
+				pev.out(events)
+			#end else - if
+		#end if
 
-			# init data for state 2:
+		sink.poll()
+		if store: store.poll()
+		if publish: publish.poll()
+		if latency: latency.poll()
+		if rxqueue: indata.poll()
+		if checkpoint and checkpoint.due(): checkpoint.save()
+	#end while
 
-			# write 3 first 7chars to tempory buffer
-			tmpbuff=[char7[0],char7[2],char7[4]]
+# end 
 
-			# store previously received data in fecmemory
-			fecmem[0]=(True,char7[6][::-1])
-			fecmem[1]=(True,char7[8][::-1])
-			fecmemptr_wr=2 # init "write" pointer
-			fecmemptr_rd=0 # init "read " pointer
 
-			# fecstate: 0: read data 1ste time, 1: read data 2nd  time -> check if the same as read during "fecstate"
-			# note: the 'fecstate=1' character is received 5 characters of the 'fecstate=0' character
-			# more info:
-			# source: http://search.itu.int/history/HistoryDigitalCollectionDocLibrary/1.43.48.en.104.pdf
-			# http://www.frisnit.com/navtex/?id=navtex_data_format
-			fecstate=0 # next byte we are going to read is a "1st data" byte
-			fecscore=2 # we have two correct characters -> score is 2
+# multi-channel mode: decode several multicast streams in one process
 
-			# jump out of loop
-			break
-		#end while (state 1)
+# "tagsink": line buffered output of one channel, written to a shared
+# "outsink" with the channel label in front of every line
+class tagsink():
+	def __init__(self,sink,label):
+		self.sink=sink
+		self.label=label
+		self.line=""
 
+		# number of characters written, and written to the shared sink:
+		# (own count,count of the shared sink) per write of complete lines
+		self.written=0
+		self.passed=collections.deque()
+		self.flushed=0
+	#end def __init__
 
+	def write(self,text):
+		self.written+=len(text)
 
-		print("### Syncronisation Success",flush=True)
-		if printposition: print("## Position:",totalbitcount, flush=True)
+		if "\n" not in text:
+			self.line+=text
+			return
+		#end if
 
+		lines=(self.line+text).split("\n")
+		self.line=lines.pop()
 
-		# output characters in tempory buffer (see "state 1" above)
-		for buffelem in tmpbuff:
-			pch.out(bytes(buffelem[::-1]))
+		for l in lines:
+			self.sink.write("[%s] %s\n" % (self.label,l))
 		#end for
 
-		# state 2:
-		# read data 7bitchar per 7bitchar
-
-		while True:
-			# read 7 bits
-			p=indata.get(7)
-			pl=list(p)
-
-			totalbitcount+=7
+		self.passed.append((self.written-len(self.line),self.sink.written))
+	#end def write
 
-			if len(p) < 7: return False # break out at end of file
+	def outcount(self):
+		# number of characters written to the file by the shared sink
+		n=self.sink.outcount()
+		while self.passed and self.passed[0][1] <= n:
+			self.flushed=self.passed.popleft()[0]
+		#end while
 
-			# invert the order of the bits
-			pl=pl[::-1]
+		return self.flushed
+	#end def outcount
 
-			# cntok is 'true' if 4 'one' bits
-			cnt=len(list(filter(lambda x: x,p)))
-			cntok=True if cnt == 4 else False
+	def poll(self):
+		self.sink.poll()
+	#end def poll
 
-			# FEC state, 0: read character 1st time, 1: read character 2nd time -> compair to character received during fecstate 0
+	def close(self):
+		# write last (incomplete) line
+		if self.line: self.write("\n")
+	#end def close
 
-			if fecstate == 0:
-				# FEC state 0: store character in fec memory
-				fecmem[fecmemptr_wr]=(cntok,pl)
+#end class tagsink
 
-				#move up fecmem "write" pointer
-				fecmemptr_wr+=1
-				if fecmemptr_wr >= 3: fecmemptr_wr = 0
 
-				fecstate = 1
-				continue # get next character
 
-			#end if (fecstate 0)
+# "mcchannel": socket and decoder of one channel
+class mcchannel():
+	def __init__(self,mcip,mcport,label=None,bitorder=None,sink=None,printer=printevent,metrics=None,profile=None,lookback=0,checkpoint=None,store=None,latency=None,rcvbuf=None,publish=None):
+		self.label=label if label else "%s:%d" % (mcip,mcport)
 
-			if fecstate == 1:
-				#fec state 1: compaire data with previously stored data
+		# bind to the multicast group, so channels on the same port only get their own data
+		self.sock=mcsocket(mcip,mcport,bindgroup=True,rcvbuf=rcvbuf)
+		self.sock.setblocking(False)
+		self.indata=getinbits(self.sock)
 
-				#init vars
-				towritechar=""
-				donotchangefecstate=False
+		self.dec=navtexdecoder(bitorder=bitorder,lookback=lookback)
+		self.out=tagsink(sink,self.label)
+		self.pev=printer(self.out)
+		if store: self.pev=store.printer(self.pev,self.label)
+		if publish: self.pev=publish.printer(self.pev,self.label)
+		self.metrics=metrics.add(self.dec,self.label) if metrics else None
+		if profile: profile.watch(self.dec)
+		if checkpoint: checkpoint.add(self.dec,self.label,live=True)
 
-				# read earlier received character from fecmem
-				(prev_cntok,prev_pl)=fecmem[fecmemptr_rd]
-				# move up fecmem pointer
-				fecmemptr_rd+=1
-				if fecmemptr_rd >= 3: fecmemptr_rd=0
+		self.latency=latency.add(self.out,self.label) if latency else None
+		if self.metrics: self.metrics.latency=self.latency
+	#end def __init__
 
-				# rule 0: Special casse:
-				# receive a 'rc' in responds to an 'alpha' ... reverse RX/TX order -> change fecstate
-				# so process this as 'fecstate = 0' state
-				if (prev_cntok,cntok,prev_pl,pl) == (True,True,alpha,rc):
-					# do same as "fecstate = 0' above
-					# store data in fec memory
-					fecmem[fecmemptr_wr]=(cntok,pl)
+	def read(self):
+		# process all datagrams waiting on the socket
+		while True:
+			try:
+				newbytes=self.indata.recv()
+			except BlockingIOError:
+				return
+			#end try
 
-					#inclease fecmem pointer
-					fecmemptr_wr+=1
-					if fecmemptr_wr >= 3: fecmemptr_wr = 0
+			if newbytes: self.process(newbytes,self.indata.rxtime)
+		#end while
+	#end def read
 
-					# do not change fec-state anymore (so it stays at 1)
-					donotchangefecstate=True
+	def process(self,newbytes,rxtime):
+		# decode one datagram, received at "rxtime"
+		events=self.dec.feed(newbytes)
+		if self.metrics: self.metrics.update(len(newbytes),events)
 
-				# rule1: if current char and previous char are ok (i.e. four '1' bits)
-				elif prev_cntok and cntok:
-					# are they the same?
-					if __isvalidresponse__(prev_pl,pl):
-						# yes, new and previous character match -> output it
-						towritechar=bytes(pl)
+		if self.latency:
+			self.latency.arrival(self.dec.totalbitcount+len(self.dec.partial),rxtime)
+			self.latency.out(self.pev,events)
+		else:
+			self.pev.out(events)
+		#end else - if
+	#end def process
 
-						# increase score
-						if fecscore < 20: fecscore+=1
+#end class mcchannel
 
-					else:
-						# we received two different chars -> Error -> output a '*'
-						towritechar="*"
-					#end if
 
-				elif prev_cntok and not cntok:
-					# new character is not correct (not four '1' bits) -> output previous character
-					towritechar=bytes(prev_pl)
 
-				elif not prev_cntok and cntok:
-					# previous character was not correct (not four '1' bits) -> output new character
-					towritechar=bytes(pl)
+def parsechannel(text):
+	# channel on the command line: ip:port[:label]
+	part=text.split(":",2)
+	if len(part) < 2: raise argparse.ArgumentTypeError("channel should be ip:port[:label]: %s" % text)
 
-				else:
-					# both previous and new character are not correct (not four '1' bits) -< error -> output a '*'
-					towritechar='*'
+	try:
+		port=int(part[1])
+	except ValueError:
+		raise argparse.ArgumentTypeError("invalid udp port: %s" % part[1])
+	#end try
 
-					# decrease score
-					if fecscore > 0: fecscore-=1
-				#end else - elsif - elsif - ik
+	return (part[0],port,part[2] if len(part) > 2 else None)
+#end def parsechannel
 
 
-				# actually output character, if not rule 0
-				if not donotchangefecstate:
-					# not 'special rule 0'
-					pch.out(towritechar)
-					fecstate = 0
-				#end if
-						
 
-				# break out of phase 2 (printing data) if the fecscore has dropped to 0
-				if fecscore < 1:
-					break
-				#end if
+def navtexdec_mc_multi(channels, bitorder=None, sink=None, printer=printevent, metrics=None, profile=None, lookback=0, checkpoint=None, store=None, latency=None, rxqueue=0, rcvbuf=None, publish=None):
+	# channels: list of (multicast-ip-address, udp-port, label)
+	if sink is None: sink=outsink(flusheol=True)
 
-				continue # get next character
-			#end else - if
+	sel=selectors.DefaultSelector()
+	chans={}
 
-			# invalid value for fecstate
-			# we should never -> reiinit
-			break
+	for (mcip,mcport,label) in channels:
+		ch=mcchannel(mcip,mcport,label=label,bitorder=bitorder,sink=sink,printer=printer,metrics=metrics,profile=profile,lookback=lookback,checkpoint=checkpoint,store=store,latency=latency,rcvbuf=rcvbuf,publish=publish)
+		sel.register(ch.sock,selectors.EVENT_READ,ch)
+		chans[ch.sock]=ch
+	#end for
 
-		# end while (state 2)
+	# rxqueue: one thread receives the datagrams of all channels, see "rxthread"
+	if rxqueue:
+		sel.close()
+		rx=rxthread(list(chans),maxqueue=rxqueue)
+		for ch in chans.values():
+			if ch.metrics: ch.metrics.rx=(rx,ch.sock)
+		#end for
+	#end if
 
-	#end while (endless loop)
+	# wake up regulary to flush the output, the message store, the
+	# subscribers and the latency report, if needed
+	timeout=min([t for t in (sink.maxdelay,store.maxdelay if store else None,1.0 if publish or latency else None) if t],default=None)
 
-	print("done",flush=True)
-	f.close()
+	# endless loop: decode received data
+	while True:
+		if rxqueue:
+			newbytes=rx.get(timeout)
+			if newbytes is not None: chans[rx.sock].process(newbytes,rx.rxtime)
+			rx.poll()
+		else:
+			for (key,mask) in sel.select(timeout):
+				key.data.read()
+			#end for
+		#end else - if
+
+		sink.poll()
+		if store: store.poll()
+		if publish: publish.poll()
+		if latency: latency.poll()
+		if checkpoint and checkpoint.due(): checkpoint.save()
+	#end while
 
 # end 
 
 
 def main():
-	try:
-		mcip=sys.argv[1]
-	except IndexError:
-		mcip=defaultip
-	#endtry
-
-	try:
-		mcport=sys.argv[2]
-	except IndexError:
-		mcport=defaultport
-	#end try
-	navtexdec_mc(mcip,mcport, flushall=True)
+	parser=argparse.ArgumentParser(description="NAVTEX decoder, multicast input")
+	parser.add_argument("mcip",nargs="?",default=defaultip,help="multicast ip-address (default: %(default)s)")
+	parser.add_argument("mcport",nargs="?",type=int,default=defaultport,help="udp port (default: %(default)s)")
+	parser.add_argument("-p","--packed",choices=("msb","lsb"),default=None,help="received data is packed, 8 bits per byte, first bit is the msb or lsb")
+	parser.add_argument("--lookback",type=int,default=0,metavar="BITS",help="on sync loss, search up to BITS received bits for a bit slip (default: %(default)s, off)")
+	parser.add_argument("-c","--channel",action="append",type=parsechannel,metavar="IP:PORT[:LABEL]",help="multi-channel mode: decode this multicast stream (can be repeated)")
+	parser.add_argument("--rxqueue",type=int,default=0,metavar="N",help="receive datagrams in a separate thread, queue of N datagrams (default: %(default)s, off)")
+	parser.add_argument("--rcvbuf",type=int,default=None,metavar="BYTES",help="size of the socket receive buffer (default: system default)")
+	msgargs(parser)
+	storeargs(parser)
+	pubargs(parser)
+	metricsargs(parser)
+	latencyargs(parser)
+	checkpointargs(parser)
+	profileargs(parser)
+	outsinkargs(parser,flush="eol,msg",maxdelay=1.0)
+	args=parser.parse_args()
+
+	printer=printerfromargs(args,printevent)
+	metrics=metricsfromargs(parser,args)
+	checkpoint=checkpointfromargs(parser,args)
+	store=storefromargs(parser,args)
+	publish=pubfromargs(parser,args)
+	latency=latencyfromargs(parser,args)
+
+	profile=profilefromargs(parser,args)
+	if profile:
+		# receiving data: input stage, also waiting in "select"
+		for func in (getinbits.get,getinbits.recv,rxthread.get,selectors.DefaultSelector.select):
+			profile.add("input",func)
+		#end for
+		profile.add("output",tagsink.write)
+		profile.add("output",latencytracker.out)
+	#end if
+
+	if args.channel:
+		navtexdec_mc_multi(args.channel, bitorder=args.packed, sink=outsinkfromargs(parser,args), printer=printer, metrics=metrics, profile=profile, lookback=args.lookback, checkpoint=checkpoint, store=store, latency=latency, rxqueue=args.rxqueue, rcvbuf=args.rcvbuf, publish=publish)
+	else:
+		navtexdec_mc(args.mcip,args.mcport, bitorder=args.packed, sink=outsinkfromargs(parser,args), printer=printer, metrics=metrics, profile=profile, lookback=args.lookback, checkpoint=checkpoint, store=store, latency=latency, rxqueue=args.rxqueue, rcvbuf=args.rcvbuf, publish=publish)
+	#end else - if
 	print("Main done!",flush=True)
 
 #end main
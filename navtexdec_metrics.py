@@ -0,0 +1,296 @@
+import sys # for version check and argv
+
+"""
+NAVTEX decoder, live metrics
+Counters of running decoders, served over HTTP in the Prometheus text format
+and / or written to a file at a regular interval.
+
+Metrics (per channel, label "channel"):
+	navtex_bits_total: bits processed by the decoder
+	navtex_bits_per_second: bits processed per second, over the last
+		complete window of 10 seconds (0 when no data is received)
+	navtex_sync_attempts_total: number of times the sync search was started
+	navtex_sync_total: number of sync successes
+	navtex_state_seconds_total: received signal (100 bps) processed in the
+		"sync" (sync search) and "data" state
+	navtex_chars_total, navtex_error_chars_total: decoded characters and
+		error characters ('*')
+	navtex_fecscore: histogram of the FEC score (0 .. 20) of the decoded
+		characters (also control characters)
+	navtex_received_bytes_total, navtex_received_datagrams_total: data
+		received from the network
+	navtex_dropped_datagrams_total: datagrams dropped because the receive
+		queue was full (with "--rxqueue")
+	navtex_receive_queue_max_fill: largest number of datagrams that were
+		waiting in the receive queue (with "--rxqueue", the queue is shared
+		by all channels)
+	navtex_latency_seconds: latency of the decoded characters (label
+		"stage": decode, output, message), with "--latency" (see
+		navtexdec_latency.py)
+
+Used by navtexdec_mc.py, options "--metrics-port", "--metrics-file"
+
+The decoder only counts characters per FEC score, all other counters are
+updated once per received datagram, from the events of the decoder.
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import os
+import time
+import threading
+import http.server
+
+from navtexdec import navtexdecoder
+
+
+
+# "decodermetrics": counters of one decoder
+class decodermetrics():
+	def __init__(self,dec,label):
+		self.dec=dec
+		self.label=label
+
+		self.syncattempts=0
+		self.syncs=0
+		self.chars=0
+		self.errors=0
+		self.rxbytes=0
+		self.rxdatagrams=0
+		self.latency=None # "latencytracker" of this decoder (if any)
+		self.rx=None # (rxthread,socket) when received in a separate thread
+
+		# bits processed in sync and data state, up to "statepos"
+		self.syncbits=0
+		self.databits=0
+		self.statepos=dec.totalbitcount
+
+		# for "bits per second": computed by the decoder thread at the end of
+		# every window, reading the metrics does not change it
+		self.window=10.0 # seconds
+		self.lasttime=time.monotonic()
+		self.lastbits=dec.totalbitcount
+		self.bps=0.0
+	#end def __init__
+
+
+	def update(self,nbytes,events):
+		# data received ("nbytes") and the events of the decoder for that data
+		self.rxbytes+=nbytes
+		self.rxdatagrams+=1
+
+		for (event,value,pos) in events:
+			if event == "char":
+				self.chars+=1
+				if value == "*": self.errors+=1
+			elif event == "sync":
+				# (with lookback, a sync can be before the sync loss)
+				self.syncs+=1
+				self.syncbits+=max(pos-self.statepos,0)
+				self.statepos=pos
+			elif event == "synclost":
+				self.syncattempts+=1
+				self.databits+=pos-self.statepos
+				self.statepos=pos
+			elif event == "syncing":
+				self.syncattempts+=1
+			#end elif - elif - elif - if
+		#end for
+
+		now=time.monotonic()
+		if now-self.lasttime >= self.window:
+			bits=self.dec.totalbitcount
+			self.bps=(bits-self.lastbits)/(now-self.lasttime)
+			(self.lasttime,self.lastbits)=(now,bits)
+		#end if
+	#end def update
+
+
+	def values(self):
+		# returns a dictionary with the current value of all metrics
+		dec=self.dec
+		now=time.monotonic()
+		bits=dec.totalbitcount
+
+		# add the bits since the last state change
+		syncbits=self.syncbits
+		databits=self.databits
+		if dec.state == navtexdecoder.st_data:
+			databits+=bits-self.statepos
+		else:
+			syncbits+=bits-self.statepos
+		#end else - if
+
+		# no data received for more than a window
+		bps=self.bps if now-self.lasttime < 2*self.window else 0.0
+
+		return {"bits":bits,"bps":bps,"syncattempts":self.syncattempts,"syncs":self.syncs,
+			"syncseconds":syncbits/100,"dataseconds":databits/100,"chars":self.chars,"errors":self.errors,
+			"fechist":list(dec.fechist),"rxbytes":self.rxbytes,"rxdatagrams":self.rxdatagrams,
+			"rxdropped":self.rx[0].dropped[self.rx[1]] if self.rx else 0,
+			"rxmaxfill":self.rx[0].maxfill if self.rx else 0,
+			"latency":{s:self.latency.percentiles(s) for s in ("decode","output","message")} if self.latency else {}}
+	#end def values
+
+#end class decodermetrics
+
+
+
+# metrics in the Prometheus text format: (name,type,help,key in "values")
+promdef=(
+	("navtex_bits_total","counter","Bits processed by the decoder","bits"),
+	("navtex_bits_per_second","gauge","Bits processed per second over the last 10 seconds","bps"),
+	("navtex_sync_attempts_total","counter","Number of times the sync search was started","syncattempts"),
+	("navtex_sync_total","counter","Number of sync successes","syncs"),
+	("navtex_state_seconds_total","counter","Received signal processed per decoder state",None),
+	("navtex_chars_total","counter","Decoded characters","chars"),
+	("navtex_error_chars_total","counter","Decoded error characters","errors"),
+	("navtex_fecscore","histogram","FEC score of the decoded characters, including control characters",None),
+	("navtex_received_bytes_total","counter","Bytes received","rxbytes"),
+	("navtex_received_datagrams_total","counter","Datagrams received","rxdatagrams"),
+	("navtex_dropped_datagrams_total","counter","Datagrams dropped, receive queue full","rxdropped"),
+	("navtex_receive_queue_max_fill","gauge","Largest number of datagrams waiting in the receive queue","rxmaxfill"),
+	("navtex_latency_seconds","summary","Time from datagram reception to decoded character",None))
+
+
+# "metricsregistry": the metrics of all decoders of a process
+class metricsregistry():
+	def __init__(self):
+		self.metrics=[]
+	#end def __init__
+
+
+	def add(self,dec,label):
+		# start collecting metrics of decoder "dec"
+		m=decodermetrics(dec,label)
+		self.metrics.append(m)
+		return m
+	#end def add
+
+
+	def text(self):
+		# all metrics in the Prometheus text format
+		values=[('channel="%s"' % m.label.replace("\\","\\\\").replace('"','\\"'),m.values()) for m in self.metrics]
+		out=[]
+
+		for (name,mtype,mhelp,key) in promdef:
+			out.append("# HELP %s %s\n# TYPE %s %s\n" % (name,mhelp,name,mtype))
+
+			for (label,v) in values:
+				if name == "navtex_state_seconds_total":
+					out.append('%s{%s,state="sync"} %s\n' % (name,label,v["syncseconds"]))
+					out.append('%s{%s,state="data"} %s\n' % (name,label,v["dataseconds"]))
+				elif name == "navtex_fecscore":
+					# cumulative buckets
+					total=0
+					for (score,n) in enumerate(v["fechist"]):
+						total+=n
+						out.append('%s_bucket{%s,le="%d"} %d\n' % (name,label,score,total))
+					#end for
+					out.append('%s_bucket{%s,le="+Inf"} %d\n' % (name,label,total))
+					out.append('%s_sum{%s} %d\n' % (name,label,sum(score*n for (score,n) in enumerate(v["fechist"]))))
+					out.append('%s_count{%s} %d\n' % (name,label,total))
+				elif name == "navtex_latency_seconds":
+					# (count,50%,90%,99%,max)
+					for (stage,p) in v["latency"].items():
+						if p is None: continue
+						for (q,t) in zip(("0.5","0.9","0.99","1"),p[1:]):
+							out.append('%s{%s,stage="%s",quantile="%s"} %s\n' % (name,label,stage,q,t))
+						#end for
+						out.append('%s_count{%s,stage="%s"} %d\n' % (name,label,stage,p[0]))
+					#end for
+				else:
+					out.append("%s{%s} %s\n" % (name,label,v[key]))
+				#end elif - elif - elif - if
+			#end for
+		#end for
+
+		return "".join(out)
+	#end def text
+
+
+	def serve(self,port,addr="127.0.0.1"):
+		# serve the metrics over HTTP (any path), in a background thread
+		registry=self
+
+		class handler(http.server.BaseHTTPRequestHandler):
+			def do_GET(self):
+				body=registry.text().encode()
+				self.send_response(200)
+				self.send_header("Content-Type","text/plain; version=0.0.4; charset=utf-8")
+				self.send_header("Content-Length",str(len(body)))
+				self.end_headers()
+				self.wfile.write(body)
+			#end def do_GET
+
+			def log_message(self,format,*args):
+				# no logging of requests
+				pass
+			#end def log_message
+		#end class handler
+
+		server=http.server.ThreadingHTTPServer((addr,port),handler)
+		server.daemon_threads=True
+		threading.Thread(target=server.serve_forever,daemon=True).start()
+		return server
+	#end def serve
+
+
+	def dump(self,fname,interval=10.0):
+		# write the metrics to "fname" every "interval" seconds, in a background thread
+		# (the file is replaced, so readers never see a partially written file)
+		def dumper():
+			while True:
+				time.sleep(interval)
+
+				tmpname=fname+".tmp"
+				with open(tmpname,"w") as f:
+					f.write(self.text())
+				#end with
+				os.replace(tmpname,fname)
+			#end while
+		#end def dumper
+
+		threading.Thread(target=dumper,daemon=True).start()
+	#end def dump
+
+#end class metricsregistry
+
+
+
+# command line options for the metrics, shared by the command line tools
+def metricsargs(parser):
+	parser.add_argument("--metrics-port",type=int,default=None,metavar="PORT",help="serve metrics over HTTP (Prometheus text format) on this port")
+	parser.add_argument("--metrics-addr",default="127.0.0.1",metavar="ADDR",help="ip-address of the metrics HTTP server (default: %(default)s)")
+	parser.add_argument("--metrics-file",default=None,metavar="FILE",help="write metrics to this file at a regular interval")
+	parser.add_argument("--metrics-interval",type=float,default=10.0,metavar="SECONDS",help="interval to write the metrics file (default: %(default)s)")
+#end def metricsargs
+
+
+def metricsfromargs(parser,args):
+	# returns a "metricsregistry", or None if no metrics are needed
+	if args.metrics_port is None and args.metrics_file is None: return None
+
+	registry=metricsregistry()
+
+	if args.metrics_port is not None:
+		try:
+			registry.serve(args.metrics_port,args.metrics_addr)
+		except OSError as e:
+			parser.error("metrics HTTP server: %s" % e)
+		#end try
+	#end if
+
+	if args.metrics_file is not None: registry.dump(args.metrics_file,args.metrics_interval)
+
+	return registry
+#end def metricsfromargs
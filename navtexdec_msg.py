@@ -0,0 +1,301 @@
+import sys # for version check and argv
+
+"""
+NAVTEX decoder, message layer
+input: events of "navtexdecoder" (see navtexdec.py)
+output: NAVTEX messages, "ZCZC B1B2B3B4" header up to the "NNNN" trailer
+
+	B1: transmitter identity (A .. Z)
+	B2: subject indicator (A .. Z)
+	B3B4: serial number (01 .. 99, 00: always printed)
+
+Stations repeat their messages many times. Messages that are already received
+are dropped, using a cache of the last received messages (key: station,
+subject and serial number). A message is only stored in the cache when it
+is received completely; a later copy with less errors ('*') is printed again.
+
+Use as module:
+	from navtexdec_msg import msgparser, msgcache
+	parser=msgparser()
+	cache=msgcache()
+	for msg in parser.feed(events):
+		if not cache.isdup(msg): ...
+	(see class "navtexmsg" for the content of a message)
+
+Used by navtexdec.py and navtexdec_mc.py, option "-m / --messages"
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import time
+import collections
+
+
+
+# "navtexmsg": one received message
+class navtexmsg():
+	def __init__(self,pos):
+		self.header="" # text after "ZCZC", up to the end of the line
+		self.station=None # B1
+		self.subject=None # B2
+		self.serial=None # B3B4
+		self.text="" # text between header and "NNNN"
+		self.start=pos # bit position of "ZCZC"
+		self.end=None # bit position of "NNNN" (or where the message was broken off)
+		self.complete=False # "NNNN" received
+		self.errors=0 # number of error characters ('*')
+		self.gaps=0 # number of times the syncronisation was lost
+	#end def __init__
+
+	def key(self):
+		# key for duplicate detection
+		# None: the header is not valid, or serial number "00" (always printed)
+		if self.serial is None or self.serial == "00": return None
+		return (self.station,self.subject,self.serial)
+	#end def key
+
+	def __str__(self):
+		return "ZCZC%s\n%s%s" % (self.header,self.text,"NNNN\n" if self.complete else "\n### Message incomplete\n")
+	#end def __str__
+
+#end class navtexmsg
+
+
+
+# "msgparser": find the messages in the "char" events of a decoder
+class msgparser():
+	# parser states
+	st_idle=0 # waiting for "ZCZC"
+	st_header=1 # receiving header line
+	st_text=2 # receiving text, up to "NNNN"
+
+	def __init__(self,maxlen=16384):
+		self.maxlen=maxlen # longest message text
+		self.state=self.st_idle
+		self.tail="" # last 4 characters received
+		self.msg=None
+		self.text=[]
+		self.textpos=[] # position of every character of "text"
+		self.size=0
+		self.losspos=None # position of the last sync loss
+	#end def __init__
+
+
+	def feed(self,events):
+		# returns list of messages, completed by these events
+		msgs=[]
+
+		for (event,value,pos) in events:
+			if event == "synclost":
+				if self.msg: self.msg.gaps+=1
+				self.tail=""
+				self.losspos=pos
+				continue
+			elif event == "sync":
+				# lookback resync (see "navtexdecoder.__lookback__"): a sync
+				# before the sync loss, and before already received characters.
+				# Characters received from 28 bits before the sync on are
+				# decoded again (a normal resync is never before the sync loss)
+				if self.losspos is not None and pos < self.losspos and self.textpos and self.textpos[-1] > pos-28: self.__rollback__(pos-28)
+				continue
+			elif event != "char":
+				continue
+			#end elif - if
+
+			self.tail=(self.tail+value)[-4:]
+
+			if self.tail == "ZCZC":
+				# start of new message, also ends a message without "NNNN"
+				if self.msg:
+					if self.state == self.st_text: del self.text[-3:] # "ZCZ"
+					msgs.append(self.__done__(pos,False))
+				#end if
+				self.msg=navtexmsg(pos)
+				self.state=self.st_header
+				self.tail=""
+			elif self.state == self.st_header:
+				if value == "\n" or len(self.msg.header) >= 16:
+					self.__header__()
+					self.state=self.st_text
+				else:
+					self.msg.header+=value
+				#end else - if
+			elif self.state == self.st_text:
+				self.text.append(value)
+				self.textpos.append(pos)
+				self.size+=1
+
+				if self.tail == "NNNN":
+					msgs.append(self.__done__(pos,True))
+				elif self.size >= self.maxlen:
+					msgs.append(self.__done__(pos,False))
+				#end elif - if
+			#end elif - elif - if
+		#end for
+
+		return msgs
+	#end def feed
+
+
+	def close(self):
+		# end of input: returns the message that is not completed (if any)
+		return [self.__done__(None,False)] if self.msg else []
+	#end def close
+
+
+	def __rollback__(self,pos):
+		# remove the characters received after "pos" from the text
+		k=len(self.textpos)
+		while k > 0 and self.textpos[k-1] > pos:
+			k-=1
+		#end while
+
+		del self.text[k:]
+		del self.textpos[k:]
+		self.size=k
+	#end def __rollback__
+
+
+	def __header__(self):
+		# header: " B1B2B3B4"
+		msg=self.msg
+		h=msg.header
+		if len(h) >= 5 and h[0] == " " and h[1].isalpha() and h[2].isalpha() and h[3:5].isdigit():
+			(msg.station,msg.subject,msg.serial)=(h[1],h[2],h[3:5])
+		#end if
+	#end def __header__
+
+
+	def __done__(self,pos,complete):
+		msg=self.msg
+		if self.state == self.st_header: self.__header__()
+
+		text="".join(self.text)
+		# "NNNN" is not part of the text
+		msg.text=text[:-4] if complete else text
+		msg.complete=complete
+		msg.end=pos
+		msg.errors=msg.header.count("*")+msg.text.count("*")
+
+		self.msg=None
+		self.text=[]
+		self.textpos=[]
+		self.size=0
+		self.state=self.st_idle
+		return msg
+	#end def __done__
+
+#end class msgparser
+
+
+
+# "msgcache": LRU cache of received messages, for duplicate detection
+# recorded: the time of a message is the time in the recording (100 bits per
+# second, from the start of the input), not the time it is decoded
+class msgcache():
+	def __init__(self,maxsize=1024,expiry=24*3600,recorded=False):
+		self.maxsize=maxsize
+		self.expiry=expiry # seconds a message is remembered after it was last received
+		self.recorded=recorded
+		self.cache=collections.OrderedDict() # key: (time last received, errors)
+		self.dups=0 # number of duplicates found
+	#end def __init__
+
+
+	def isdup(self,msg,now=None):
+		# returns True if "msg" is already received
+		key=msg.key()
+		if key is None: return False
+
+		if now is None:
+			if self.recorded:
+				now=(msg.end if msg.end is not None else msg.start)/100
+			else:
+				now=time.monotonic()
+			#end else - if
+		#end if
+
+		old=self.cache.get(key)
+		if old is not None and now-old[0] > self.expiry:
+			old=None
+		#end if
+
+		if old is not None and old[1] <= msg.errors:
+			# duplicate: keep in cache
+			self.cache[key]=(now,old[1])
+			self.cache.move_to_end(key)
+			self.dups+=1
+			return True
+		#end if
+
+		# only complete messages are stored
+		if msg.complete:
+			self.cache[key]=(now,msg.errors)
+			self.cache.move_to_end(key)
+			if len(self.cache) > self.maxsize: self.cache.popitem(last=False)
+		#end if
+
+		return False
+	#end def isdup
+
+#end class msgcache
+
+
+
+# "printmsg": write the messages in the events of "navtexdecoder" to an
+# "outsink", duplicates are dropped (same interface as "printevent")
+class printmsg():
+
+	def __init__(self,sink,cache=None):
+		self.sink=sink
+		self.cache=cache
+		self.parser=msgparser()
+	#end def __init__
+
+	def out(self,events):
+		self.__write__(self.parser.feed(events))
+		self.sink.poll()
+	#end def out
+
+	def close(self):
+		self.__write__(self.parser.close())
+		self.sink.close()
+	#end def close
+
+	def __write__(self,msgs):
+		for msg in msgs:
+			if self.cache is not None and self.cache.isdup(msg): continue
+			self.sink.write(str(msg))
+		#end for
+	#end def __write__
+
+#end class printmsg
+
+
+
+# command line options for the message layer, shared by the command line tools
+def msgargs(parser):
+	parser.add_argument("-m","--messages",action="store_true",help="print only NAVTEX messages (ZCZC ... NNNN), duplicates are dropped")
+	parser.add_argument("--dedup",type=int,default=1024,metavar="N",help="messages: number of messages remembered to drop duplicates, 0: print all (default: %(default)s)")
+	parser.add_argument("--dedup-expiry",type=float,default=24*3600,metavar="SECONDS",help="messages: time a message is remembered (default: %(default)s)")
+#end def msgargs
+
+
+def printerfromargs(args,printer,recorded=False):
+	# returns the function to create the "printevent" of an outsink
+	# (all outputs share the same cache)
+	# recorded: decoding a recording, see "msgcache"
+	if not args.messages: return printer
+
+	cache=msgcache(maxsize=args.dedup,expiry=args.dedup_expiry,recorded=recorded) if args.dedup > 0 else None
+	return lambda sink: printmsg(sink,cache)
+#end def printerfromargs
@@ -0,0 +1,197 @@
+import sys # for version check and argv
+
+"""
+NAVTEX decoder, profiling
+Wall time and cpu time per stage of the decoder:
+	input: reading the input (file, multicast), unpacking packed bits
+	fsk demodulation: demodulating audio input (only with "--audio")
+	sync search: searching sync (state 1)
+	fec combining: reading 7bit chars and combining DX and RX (state 2)
+	char lookup: converting 7bit chars to characters
+	output: writing the decoded text (or messages)
+	other: everything else (main loop, ...)
+
+The report is printed on stderr at exit, and on signal SIGUSR1:
+	kill -USR1 <pid>
+
+Used by navtexdec.py and navtexdec_mc.py, option "--profile"
+
+The time is measured by sampling: a timer signal interrupts the program
+every "interval" seconds (wall time: SIGALRM, cpu time: SIGPROF) and the
+time since the previous sample is added to the stage of the function that
+was running. The decoder itself is not changed, so profiling can be used on
+a live process without slowing it down.
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import time
+import signal
+import atexit
+
+from navtexdec import navtexdecoder, syncdetect, findsync, unpackbits, bitreader, mmapreader, printevent, outsink
+from navtexdec_msg import printmsg
+from navtexdec_fsk import fskdemod
+
+
+
+# stages, in the order of the report
+stages=(("input","input"),("demod","fsk demodulation"),("sync","sync search"),("fec","fec combining"),("char","char lookup"),("output","output"),("other","other"))
+
+
+# "stageprofile": sampling profiler, time per stage
+class stageprofile():
+	def __init__(self,interval=0.002,f=None):
+		self.interval=interval
+		self.f=f if f is not None else sys.stderr
+
+		# functions of every stage: (file name,line number) -> stage
+		# (not the code object: a script run as "__main__" has other code
+		# objects than the same file imported as module)
+		self.codes={}
+		for func in (bitreader.read,mmapreader.read,unpackbits):
+			self.add("input",func)
+		#end for
+		for func in (fskdemod.feed,fskdemod.__symbols__):
+			self.add("demod",func)
+		#end for
+		for func in (navtexdecoder.__syncstate__,navtexdecoder.__syncok__,syncdetect.load,syncdetect.push,syncdetect.check,syncdetect.chars,findsync):
+			self.add("sync",func)
+		#end for
+		for func in (navtexdecoder.__datastate__,navtexdecoder.__fec__):
+			self.add("fec",func)
+		#end for
+		self.add("char",navtexdecoder.__char__)
+		for func in (printevent.out,printmsg.out,outsink.write,outsink.flush):
+			self.add("output",func)
+		#end for
+
+		self.wall={s:0.0 for (s,name) in stages}
+		self.cpu={s:0.0 for (s,name) in stages}
+		self.decoders=[]
+	#end def __init__
+
+
+	def add(self,stage,func):
+		# add the time spent in "func" to "stage"
+		code=func.__code__
+		self.codes[(code.co_filename,code.co_firstlineno)]=stage
+	#end def add
+
+
+	def watch(self,dec):
+		# decoder: report the number of bits processed
+		self.decoders.append(dec)
+	#end def watch
+
+
+	def start(self):
+		self.start_wall=self.last_wall=time.perf_counter()
+		self.start_cpu=self.last_cpu=time.process_time()
+
+		signal.signal(signal.SIGALRM,self.__sample_wall__)
+		signal.signal(signal.SIGPROF,self.__sample_cpu__)
+		signal.signal(signal.SIGUSR1,lambda signum,frame: self.report())
+		# stopped by SIGTERM: exit normally, so the report is printed
+		signal.signal(signal.SIGTERM,lambda signum,frame: sys.exit(0))
+
+		signal.setitimer(signal.ITIMER_REAL,self.interval,self.interval)
+		signal.setitimer(signal.ITIMER_PROF,self.interval,self.interval)
+
+		atexit.register(self.stop)
+	#end def start
+
+
+	def stop(self):
+		signal.setitimer(signal.ITIMER_REAL,0)
+		signal.setitimer(signal.ITIMER_PROF,0)
+		self.report()
+	#end def stop
+
+
+	def __stage__(self,frame):
+		# stage of the innermost function of a known stage
+		codes=self.codes
+		while frame is not None:
+			code=frame.f_code
+			stage=codes.get((code.co_filename,code.co_firstlineno))
+			if stage: return stage
+			frame=frame.f_back
+		#end while
+
+		return "other"
+	#end def __stage__
+
+
+	def __sample_wall__(self,signum,frame):
+		now=time.perf_counter()
+		self.wall[self.__stage__(frame)]+=now-self.last_wall
+		self.last_wall=now
+	#end def __sample_wall__
+
+
+	def __sample_cpu__(self,signum,frame):
+		now=time.process_time()
+		self.cpu[self.__stage__(frame)]+=now-self.last_cpu
+		self.last_cpu=now
+	#end def __sample_cpu__
+
+
+	def report(self):
+		wall=time.perf_counter()-self.start_wall
+		cpu=time.process_time()-self.start_cpu
+		bits=sum(dec.totalbitcount for dec in self.decoders)
+
+		f=self.f
+		f.write("\n### Profile: %.3fs wall, %.3fs cpu, %d bits\n" % (wall,cpu,bits))
+
+		# busy: not waiting for input
+		busy=wall-self.wall["input"]+self.cpu["input"]
+		if busy > 0 and bits:
+			f.write("## %.0f bits/s when busy: %.1f x real time (100 bps)\n" % (bits/busy,bits/busy/100))
+		#end if
+
+		swall=sum(self.wall.values()) or 1.0
+		scpu=sum(self.cpu.values()) or 1.0
+		f.write("%-16s %10s %6s %10s %6s\n" % ("stage","wall","","cpu",""))
+		for (s,name) in stages:
+			# no audio input: no demodulation
+			if s == "demod" and not self.wall[s] and not self.cpu[s]: continue
+			f.write("%-16s %9.3fs %5.1f%% %9.3fs %5.1f%%\n" % (name,self.wall[s],100*self.wall[s]/swall,self.cpu[s],100*self.cpu[s]/scpu))
+		#end for
+
+		f.flush()
+	#end def report
+
+#end class stageprofile
+
+
+
+# command line options for profiling, shared by the command line tools
+def profileargs(parser):
+	parser.add_argument("--profile",action="store_true",help="print wall and cpu time per decoder stage at exit and on SIGUSR1 (on stderr)")
+	parser.add_argument("--profile-interval",type=float,default=0.002,metavar="SECONDS",help="profiling: sample interval (default: %(default)s)")
+#end def profileargs
+
+
+def profilefromargs(parser,args):
+	# returns a started "stageprofile", or None if not profiling
+	if not args.profile: return None
+
+	if not hasattr(signal,"setitimer") or not hasattr(signal,"SIGUSR1"):
+		parser.error("profiling is not possible on this system")
+	#end if
+
+	prof=stageprofile(interval=args.profile_interval)
+	prof.start()
+	return prof
+#end def profilefromargs
@@ -0,0 +1,382 @@
+import sys # for version check and argv
+import argparse
+
+"""
+NAVTEX decoder, publish the decoded text to local consumers
+input: records published by navtexdec_mc.py "--publish-unix" / "--publish-mc"
+output: the received records
+
+Usage:
+python3 navtexdec_pub.py [--chars | --msgs] [--channel CHANNEL] (--unix PATH | --mc IP:PORT)
+
+	--unix: connect to the Unix domain socket of navtexdec_mc.py
+	--mc: receive the records on this multicast address
+	--chars / --msgs: only print the decoded characters / the messages
+	--channel: only print the records of this channel (label of the
+		channel in navtexdec_mc.py, default: ip:port)
+	The decoded characters are printed after a "[channel]" line when they
+	are of another channel than the characters before, so the text of
+	different channels is not mixed.
+
+Use as module:
+	from navtexdec_pub import publisher
+	pub=publisher(unixpath="/run/navtex.sock",mcaddr=("225.0.0.2",10010))
+	pev=pub.printer(printevent(sink),channel), pev.out(events)
+	pub.close()
+
+One decoder serves many consumers: the decoded characters and messages are
+published once, to every subscriber of a Unix domain (stream) socket and/or
+as UDP multicast datagrams. Every record is a header line and the data:
+
+	"<kind> <length> <channel>\n" + <length> bytes (utf-8)
+
+	chars: the characters decoded from one received datagram
+	msg: one NAVTEX message, "ZCZC" up to "NNNN" (see navtexdec_msg.py),
+		duplicates are dropped (--dedup, also between channels)
+	dropped: the subscriber was too slow, the data is the number of
+		records that were dropped for this subscriber (no channel)
+
+Publishing never blocks the decoder. Every subscriber of the Unix socket has
+its own buffer of --publish-buffer bytes: when a subscriber does not read
+fast enough and its buffer is full, its records are dropped (counted, and
+sent as a "dropped" record when there is room again), the other subscribers
+are not affected. A multicast record is one datagram; when the datagram can
+not be sent without waiting, it is dropped.
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import os
+import stat
+import socket
+
+from navtexdec_msg import msgparser, msgcache
+
+
+
+def record(kind,channel,text):
+	# one record: header line and data
+	data=text.encode()
+	return ("%s %d %s\n" % (kind,len(data),channel if channel else "")).encode()+data
+#end def record
+
+
+
+# "subscriber": one consumer connected to the Unix domain socket
+class subscriber():
+	def __init__(self,sock,maxbuf=65536):
+		self.sock=sock
+		self.maxbuf=maxbuf
+		self.buff=bytearray() # data not yet sent
+		self.dropped=0 # records dropped, not yet reported to the subscriber
+		self.total=0 # records dropped
+	#end def __init__
+
+	def write(self,rec):
+		# queue a record, dropped if the buffer is full
+		if self.dropped:
+			rec=record("dropped","",str(self.dropped))+rec
+		#end if
+
+		if len(self.buff)+len(rec) > self.maxbuf:
+			self.dropped+=1
+			self.total+=1
+			return
+		#end if
+
+		self.buff+=rec
+		self.dropped=0
+	#end def write
+
+	def send(self):
+		# send as much as possible without waiting
+		# returns False if the subscriber is gone
+		if not self.buff: return True
+
+		try:
+			n=self.sock.send(self.buff)
+		except BlockingIOError:
+			return True
+		except OSError:
+			return False
+		#end try
+
+		del self.buff[:n]
+		return True
+	#end def send
+
+#end class subscriber
+
+
+
+# "publisher": publish the decoded characters and messages to all subscribers
+# unixpath: Unix domain socket for the subscribers
+# mcaddr: (multicast-ip-address,udp-port) to send the records to
+class publisher():
+	def __init__(self,unixpath=None,mcaddr=None,maxbuf=65536,ttl=1,cache=None):
+		self.unixpath=unixpath
+		self.mcaddr=mcaddr
+		self.maxbuf=maxbuf # buffer per subscriber (bytes)
+		self.cache=cache # "msgcache" for duplicate messages, None: publish all
+
+		self.subscribers=[]
+		self.records=0 # records published
+		self.mcdropped=0 # multicast datagrams dropped
+
+		self.server=None
+		if unixpath:
+			# remove the socket of a previous run
+			try:
+				if stat.S_ISSOCK(os.stat(unixpath).st_mode): os.remove(unixpath)
+			except FileNotFoundError:
+				pass
+			#end try
+
+			self.server=socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+			self.server.bind(unixpath)
+			self.server.listen(16)
+			self.server.setblocking(False)
+		#end if
+
+		self.mcsock=None
+		if mcaddr:
+			self.mcsock=socket.socket(socket.AF_INET,socket.SOCK_DGRAM,socket.IPPROTO_UDP)
+			self.mcsock.setsockopt(socket.IPPROTO_IP,socket.IP_MULTICAST_TTL,ttl)
+			self.mcsock.setblocking(False)
+		#end if
+	#end def __init__
+
+
+	def printer(self,pev,channel=None):
+		# "printevent" that also publishes the events, see "pubprinter"
+		return pubprinter(pev,self,channel)
+	#end def printer
+
+
+	def publish(self,kind,channel,text):
+		rec=record(kind,channel,text)
+		self.records+=1
+
+		for sub in self.subscribers:
+			sub.write(rec)
+		#end for
+
+		if self.mcsock:
+			try:
+				self.mcsock.sendto(rec,self.mcaddr)
+			except OSError:
+				# (also BlockingIOError: the datagram can not be sent without waiting)
+				self.mcdropped+=1
+			#end try
+		#end if
+	#end def publish
+
+
+	def poll(self):
+		# accept new subscribers, send the buffered data of all subscribers
+		if self.server:
+			while True:
+				try:
+					(sock,addr)=self.server.accept()
+				except BlockingIOError:
+					break
+				#end try
+
+				sock.setblocking(False)
+				self.subscribers.append(subscriber(sock,self.maxbuf))
+			#end while
+		#end if
+
+		for sub in [s for s in self.subscribers if not s.send()]:
+			self.__drop__(sub)
+		#end for
+	#end def poll
+
+
+	def __drop__(self,sub):
+		# subscriber is gone
+		if sub.total: sys.stderr.write("### publish: subscriber disconnected, %d records dropped\n" % sub.total)
+		sub.sock.close()
+		self.subscribers.remove(sub)
+	#end def __drop__
+
+
+	def close(self):
+		# send what can be sent, and close all sockets
+		self.poll()
+
+		for sub in list(self.subscribers):
+			self.__drop__(sub)
+		#end for
+
+		if self.server:
+			self.server.close()
+			os.remove(self.unixpath)
+		#end if
+		if self.mcsock: self.mcsock.close()
+	#end def close
+
+#end class publisher
+
+
+
+# "pubprinter": publishes the characters and messages in the events of a
+# decoder, and passes the events to "printevent" (or "printmsg") "pev"
+# (same interface as "printevent")
+class pubprinter():
+	def __init__(self,pev,pub,channel=None):
+		self.pev=pev
+		self.pub=pub
+		self.channel=channel
+		self.parser=msgparser()
+	#end def __init__
+
+	def out(self,events):
+		self.pev.out(events)
+
+		text="".join(value for (event,value,pos) in events if event == "char")
+		if text: self.pub.publish("chars",self.channel,text)
+
+		self.__publish__(self.parser.feed(events))
+		self.pub.poll()
+	#end def out
+
+	def close(self):
+		self.pev.close()
+		self.__publish__(self.parser.close())
+		self.pub.poll()
+	#end def close
+
+	def __publish__(self,msgs):
+		cache=self.pub.cache
+		for msg in msgs:
+			if cache is not None and cache.isdup(msg): continue
+			self.pub.publish("msg",self.channel,str(msg))
+		#end for
+	#end def __publish__
+
+#end class pubprinter
+
+
+
+def parseaddr(text):
+	# multicast address on the command line: ip:port
+	part=text.split(":")
+	try:
+		if len(part) != 2: raise ValueError
+		return (part[0],int(part[1]))
+	except ValueError:
+		raise argparse.ArgumentTypeError("address should be ip:port: %s" % text)
+	#end try
+#end def parseaddr
+
+
+
+# command line options for publishing, shared by the command line tools
+def pubargs(parser):
+	parser.add_argument("--publish-unix",default=None,metavar="PATH",help="publish the decoded characters and messages on this Unix domain socket")
+	parser.add_argument("--publish-mc",type=parseaddr,default=None,metavar="IP:PORT",help="publish the decoded characters and messages to this multicast address")
+	parser.add_argument("--publish-buffer",type=int,default=65536,metavar="BYTES",help="publish: buffer per subscriber, records are dropped when full (default: %(default)s)")
+#end def pubargs
+
+
+def pubfromargs(parser,args):
+	# returns a "publisher", or None if nothing is published
+	# (duplicate messages: same options as the message layer, see "msgargs")
+	if args.publish_unix is None and args.publish_mc is None: return None
+
+	cache=msgcache(maxsize=args.dedup,expiry=args.dedup_expiry) if args.dedup > 0 else None
+
+	try:
+		return publisher(unixpath=args.publish_unix,mcaddr=args.publish_mc,maxbuf=args.publish_buffer,cache=cache)
+	except OSError as e:
+		parser.error("publish: %s" % e)
+	#end try
+#end def pubfromargs
+
+
+
+# receive records: (kind,channel,text)
+def readunix(path):
+	sock=socket.socket(socket.AF_UNIX,socket.SOCK_STREAM)
+	sock.connect(path)
+	f=sock.makefile("rb")
+
+	while True:
+		header=f.readline()
+		if not header: return
+
+		(kind,length,channel)=header.decode().rstrip("\n").split(" ",2)
+		yield (kind,channel,f.read(int(length)).decode())
+	#end while
+#end def readunix
+
+
+def readmc(mcip,mcport):
+	from navtexdec_mc import mcsocket
+	sock=mcsocket(mcip,mcport,bindgroup=True)
+
+	while True:
+		data=sock.recv(65536)
+		(header,text)=data.split(b"\n",1)
+		(kind,length,channel)=header.decode().split(" ",2)
+		yield (kind,channel,text.decode())
+	#end while
+#end def readmc
+
+
+
+def main():
+	parser=argparse.ArgumentParser(description="NAVTEX decoder, receive the published characters and messages")
+	group=parser.add_mutually_exclusive_group(required=True)
+	group.add_argument("--unix",default=None,metavar="PATH",help="Unix domain socket (navtexdec_mc.py --publish-unix)")
+	group.add_argument("--mc",type=parseaddr,default=None,metavar="IP:PORT",help="multicast address (navtexdec_mc.py --publish-mc)")
+	kind=parser.add_mutually_exclusive_group()
+	kind.add_argument("--chars",action="store_true",help="only the decoded characters")
+	kind.add_argument("--msgs",action="store_true",help="only the messages")
+	parser.add_argument("--channel",default=None,help="only the records of this channel")
+	args=parser.parse_args()
+
+	# channel of the last printed characters
+	last=None
+
+	try:
+		records=readunix(args.unix) if args.unix else readmc(*args.mc)
+
+		for (kind,channel,text) in records:
+			if kind == "dropped":
+				sys.stderr.write("### %s records dropped\n" % text)
+				continue
+			#end if
+
+			if args.channel is not None and channel != args.channel: continue
+
+			if kind == "chars":
+				if args.msgs: continue
+
+				# characters of another channel: "[channel]" line first
+				if channel != last: print("%s[%s]" % ("\n" if last is not None else "",channel))
+				last=channel
+				print(text,end="",flush=True)
+			elif kind == "msg":
+				if not args.chars: print("[%s]\n%s" % (channel,text),end="",flush=True)
+			#end elif - if
+		#end for
+	except OSError as e:
+		parser.error(str(e))
+	except KeyboardInterrupt:
+		pass
+	#end try
+
+#end main
+
+if __name__ == "__main__": main()
@@ -0,0 +1,249 @@
+import sys # for version check and argv
+import argparse
+
+"""
+NAVTEX decoder, SQLite message store
+input: SQLite database, written by navtexdec.py / navtexdec_mc.py "--store"
+output: stored messages
+
+Usage:
+python3 navtexdec_store.py [--station B1] [--subject B2] [--serial B3B4] [--channel CHANNEL] [--since HOURS] [--complete] [--text] [--limit N] <database>
+
+	--station, --subject, --serial, --channel: only messages with this
+		transmitter identity, subject indicator, serial number or channel
+	--since: only messages received in the last HOURS hours
+	--complete: only complete messages (with "NNNN")
+	--text: print the text of the messages
+	--limit: maximum number of messages (default: 100, newest first)
+
+Use as module:
+	from navtexdec_store import msgstore
+	store=msgstore("navtex.db")
+	store.add(msg,channel) (see class "navtexmsg" in navtexdec_msg.py)
+	or: pev=store.printer(printevent(sink),channel), pev.out(events)
+	(recording: store.printer(printevent(sink),channel,origin), origin:
+	time of the start of the recording)
+	store.close()
+
+Every received message is stored (also duplicates and incomplete messages),
+with the receive time (end of the message), the channel and the ratio of
+error characters ('*'). Of a recording, the receive time is the time in the
+recording: the time of the start of the recording, plus the position of the
+end of the message at 100 bits per second. Messages are inserted in batches: one transaction
+per "batchsize" messages, or when the oldest message that is not written is
+"maxdelay" seconds old. The database uses WAL mode, so the database can be
+read while the decoder is writing.
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import time
+import sqlite3
+
+from navtexdec_msg import msgparser
+
+
+
+schema=(
+	"""create table if not exists messages (
+		id integer primary key,
+		station text,
+		subject text,
+		serial text,
+		rxtime real not null,
+		channel text,
+		errratio real,
+		complete integer,
+		text text)""",
+	"create index if not exists messages_station on messages (station,subject,rxtime)",
+	"create index if not exists messages_rxtime on messages (rxtime)")
+
+
+
+# "msgstore": messages in a SQLite database, inserted in batches
+class msgstore():
+	def __init__(self,fname,batchsize=100,maxdelay=1.0):
+		self.batchsize=batchsize
+		self.maxdelay=maxdelay # seconds
+
+		self.db=sqlite3.connect(fname)
+		self.db.execute("pragma journal_mode=wal")
+		self.db.execute("pragma synchronous=normal")
+		with self.db:
+			for sql in schema:
+				self.db.execute(sql)
+			#end for
+		#end with
+
+		self.pending=[]
+		self.since=0 # time the oldest pending message was added
+		self.count=0 # number of messages written
+	#end def __init__
+
+
+	def add(self,msg,channel=None,now=None):
+		if now is None: now=time.time()
+		if not self.pending: self.since=time.monotonic()
+
+		size=len(msg.header)+len(msg.text)
+		self.pending.append((msg.station,msg.subject,msg.serial,now,channel,msg.errors/size if size else 0.0,int(msg.complete),str(msg)))
+
+		if len(self.pending) >= self.batchsize: self.flush()
+	#end def add
+
+
+	def printer(self,pev,channel=None,origin=None):
+		# "printevent" that also stores the messages, see "storeprinter"
+		return storeprinter(pev,self,channel,origin)
+	#end def printer
+
+
+	def poll(self):
+		# write the pending messages if the oldest is older then "maxdelay"
+		if self.pending and time.monotonic()-self.since >= self.maxdelay: self.flush()
+	#end def poll
+
+
+	def flush(self):
+		# write all pending messages, in one transaction
+		if not self.pending: return
+
+		with self.db:
+			self.db.executemany("insert into messages (station,subject,serial,rxtime,channel,errratio,complete,text) values (?,?,?,?,?,?,?,?)",self.pending)
+		#end with
+
+		self.count+=len(self.pending)
+		self.pending=[]
+	#end def flush
+
+
+	def close(self):
+		self.flush()
+		self.db.close()
+	#end def close
+
+#end class msgstore
+
+
+
+# "storeprinter": stores the messages in the events of a decoder, and passes
+# the events to "printevent" (or "printmsg") "pev" (same interface as "printevent")
+# origin: time of the start of a recording, the receive time of a message is
+# its time in the recording (None: the time it is decoded)
+class storeprinter():
+	def __init__(self,pev,store,channel=None,origin=None):
+		self.pev=pev
+		self.store=store
+		self.channel=channel
+		self.origin=origin
+		self.parser=msgparser()
+	#end def __init__
+
+	def out(self,events):
+		self.pev.out(events)
+
+		for msg in self.parser.feed(events):
+			self.__store__(msg)
+		#end for
+		self.store.poll()
+	#end def out
+
+	def close(self):
+		self.pev.close()
+
+		for msg in self.parser.close():
+			self.__store__(msg)
+		#end for
+		self.store.flush()
+	#end def close
+
+	def __store__(self,msg):
+		# (100 bits per second, as "msgcache" of navtexdec_msg.py)
+		now=None if self.origin is None else self.origin+(msg.end if msg.end is not None else msg.start)/100
+		self.store.add(msg,self.channel,now)
+	#end def __store__
+
+#end class storeprinter
+
+
+
+# command line options for the message store, shared by the command line tools
+def storeargs(parser):
+	parser.add_argument("--store",default=None,metavar="DATABASE",help="store the received messages in this SQLite database")
+	parser.add_argument("--store-batch",type=int,default=100,metavar="N",help="store: messages per transaction (default: %(default)s)")
+	parser.add_argument("--store-delay",type=float,default=1.0,metavar="SECONDS",help="store: maximum time a message is not written (default: %(default)s)")
+#end def storeargs
+
+
+def storefromargs(parser,args):
+	# returns a "msgstore", or None if the messages are not stored
+	if args.store is None: return None
+
+	try:
+		return msgstore(args.store,batchsize=args.store_batch,maxdelay=args.store_delay)
+	except sqlite3.Error as e:
+		parser.error("store: %s: %s" % (args.store,e))
+	#end try
+#end def storefromargs
+
+
+
+def main():
+	parser=argparse.ArgumentParser(description="NAVTEX decoder, query the message store")
+	parser.add_argument("database",help="SQLite database (navtexdec.py / navtexdec_mc.py --store)")
+	parser.add_argument("--station",default=None,metavar="B1",help="transmitter identity")
+	parser.add_argument("--subject",default=None,metavar="B2",help="subject indicator")
+	parser.add_argument("--serial",default=None,metavar="B3B4",help="serial number")
+	parser.add_argument("--channel",default=None,help="channel")
+	parser.add_argument("--since",type=float,default=None,metavar="HOURS",help="only messages received in the last HOURS hours")
+	parser.add_argument("--complete",action="store_true",help="only complete messages")
+	parser.add_argument("--text",action="store_true",help="print the text of the messages")
+	parser.add_argument("--limit",type=int,default=100,help="maximum number of messages (default: %(default)s)")
+	args=parser.parse_args()
+
+	where=[]
+	param=[]
+	for (column,value) in (("station",args.station),("subject",args.subject),("serial",args.serial),("channel",args.channel)):
+		if value is not None:
+			where.append("%s = ?" % column)
+			param.append(value.upper() if column != "channel" else value)
+		#end if
+	#end for
+
+	if args.since is not None:
+		where.append("rxtime >= ?")
+		param.append(time.time()-args.since*3600)
+	#end if
+
+	if args.complete: where.append("complete = 1")
+
+	sql="select rxtime,channel,station,subject,serial,errratio,complete,text from messages"
+	if where: sql+=" where "+" and ".join(where)
+	sql+=" order by rxtime desc,id desc limit ?"
+	param.append(args.limit)
+
+	try:
+		db=sqlite3.connect("file:%s?mode=ro" % args.database,uri=True)
+		rows=db.execute(sql,param).fetchall()
+	except sqlite3.Error as e:
+		parser.error("%s: %s" % (args.database,e))
+	#end try
+
+	for (rxtime,channel,station,subject,serial,errratio,complete,text) in rows:
+		header="%s%s%s" % (station,subject,serial) if serial is not None else "----"
+		print("%s  %-20s %s  errors %5.1f%%%s" % (time.strftime("%Y-%m-%d %H:%M:%S",time.localtime(rxtime)),channel,header,100*errratio,"" if complete else "  incomplete"))
+		if args.text: print(text,end="")
+	#end for
+
+#end main
+
+if __name__ == "__main__": main()
@@ -0,0 +1,294 @@
+import sys # for version check and argv
+
+"""
+NAVTEX decoder, tests
+Invariants of the decoder, on generated streams with bit errors, bit slips
+and noise gaps (see navtexdec_gen.py):
+
+	generated: without bit errors, the messages are decoded as they were
+		generated (also packed input, "-p msb" / "-p lsb")
+	split: parallel decoding of one file (navtexdec_batch.py, "-j") gives
+		the same output as sequential decoding
+	chunk size: the events of "navtexdecoder.feed" do not depend on the
+		size of the blocks of data (also with "--lookback")
+	lookback: with "--lookback", the text after a bit slip is recovered
+	checkpoint: decoding that is interrupted and resumed from the checkpoint
+		file gives the same output as uninterrupted decoding (also with the
+		message layer, "-m")
+	index: decoding from an index point ("--use-index") gives the same
+		events as a full decode, from the same position on
+
+Usage:
+python3 -m unittest test_navtexdec
+python3 -m pytest test_navtexdec.py
+
+
+(C) Kristoff Bonne (ON1ARF)
+
+This code is distributed under GPL license v. 3.0
+https://www.gnu.org/licenses/gpl-3.0.en.html
+"""
+
+# python version check
+if sys.version_info.major < 3:
+	raise RuntimeError("Python version 3 or newer required")
+#end if
+
+import os
+import io
+import difflib
+import tempfile
+import unittest
+
+from navtexdec import navtexdecoder, navtexdec, outsink
+from navtexdec_gen import navtexgen, packbits
+from navtexdec_msg import printmsg, msgparser
+from navtexdec_batch import navtexdec_split
+from navtexdec_checkpoint import checkpoint
+from navtexdec_index import indexwriter, indexreader
+
+
+
+# "eventlist": printer that keeps all events (same interface as "printevent")
+class eventlist():
+	def __init__(self,sink=None):
+		self.events=[]
+	#end def __init__
+
+	def out(self,events):
+		self.events+=events
+	#end def out
+
+	def close(self):
+		pass
+	#end def close
+
+#end class eventlist
+
+
+
+class interrupted(Exception):
+	pass
+#end class interrupted
+
+
+# "stopcheckpoint": checkpoint after every block, the decoding is
+# interrupted after "stopafter" checkpoints (as if the process is killed)
+class stopcheckpoint(checkpoint):
+	def __init__(self,fname,stopafter):
+		checkpoint.__init__(self,fname,interval=0.0)
+		self.stopafter=stopafter
+	#end def __init__
+
+	def save(self):
+		checkpoint.save(self)
+		self.stopafter-=1
+		if self.stopafter == 0: raise interrupted
+	#end def save
+
+#end class stopcheckpoint
+
+
+
+def decodetext(fname,printer=None,**kw):
+	# output of "navtexdec" as text
+	out=io.StringIO()
+	if printer is None:
+		navtexdec(fname,sink=outsink(f=out),**kw)
+	else:
+		navtexdec(fname,sink=outsink(f=out),printer=printer,**kw)
+	#end else - if
+	return out.getvalue()
+#end def decodetext
+
+
+def decodeevents(fname,**kw):
+	# all events of "navtexdec"
+	pev=eventlist()
+	navtexdec(fname,sink=outsink(f=io.StringIO()),printer=lambda sink: pev,**kw)
+	return pev.events
+#end def decodeevents
+
+
+def decodemsgs(fname,**kw):
+	# the messages decoded by "navtexdec", as text
+	parser=msgparser()
+	return [str(msg) for msg in parser.feed(decodeevents(fname,**kw))+parser.close()]
+#end def decodemsgs
+
+
+def msgerrors(text,decoded):
+	# number of characters of "text" that are not in "decoded"
+	matcher=difflib.SequenceMatcher(None,text,decoded,autojunk=False)
+	return max(len(text),len(decoded))-sum(b.size for b in matcher.get_matching_blocks())
+#end def msgerrors
+
+
+def feedall(data,chunk,lookback=0):
+	# all events of a decoder, "data" fed in blocks of "chunk" bytes
+	dec=navtexdecoder(lookback=lookback)
+	events=[]
+	for i in range(0,len(data),chunk):
+		events+=dec.feed(data[i:i+chunk])
+	#end for
+	events+=dec.feed(b'')
+	return events
+#end def feedall
+
+
+
+class navtexdectest(unittest.TestCase):
+
+	@classmethod
+	def setUpClass(cls):
+		cls.tmpdir=tempfile.TemporaryDirectory()
+		cls.fname=os.path.join(cls.tmpdir.name,"stream.bin")
+
+		gen=navtexgen(seed=5,ber=2e-3,slip=0.3,gap=0.3)
+		(cls.data,msgs)=gen.stream(60)
+		with open(cls.fname,"wb") as f:
+			f.write(cls.data)
+		#end with
+
+		cls.text=decodetext(cls.fname)
+	#end def setUpClass
+
+
+	@classmethod
+	def tearDownClass(cls):
+		cls.tmpdir.cleanup()
+	#end def tearDownClass
+
+
+	def test_stream(self):
+		# the stream has sync losses, and more than a few blocks
+		events=feedall(self.data,65536)
+		self.assertGreater(len(self.data),12*65536)
+		self.assertGreater(sum(1 for e in events if e[0] == "synclost"),3)
+		self.assertGreater(self.text.count("ZCZC"),10)
+	#end def test_stream
+
+
+	def test_generated(self):
+		# (the decoder does not print the carriage return)
+		(bits,msgs)=navtexgen(seed=3).stream(10)
+		expected=[m.replace("\r","") for m in msgs]
+
+		for bitorder in (None,"msb","lsb"):
+			fname=os.path.join(self.tmpdir.name,"generated.%s" % (bitorder or "bin"))
+			with open(fname,"wb") as f:
+				f.write(packbits(bits,bitorder) if bitorder else bits)
+			#end with
+
+			self.assertEqual(decodemsgs(fname,bitorder=bitorder),expected,"bitorder %s" % bitorder)
+		#end for
+	#end def test_generated
+
+
+	def test_split(self):
+		for jobs in (2,4):
+			out=io.StringIO()
+			navtexdec_split(self.fname,jobs=jobs,sink=outsink(f=out),overlap=1<<14)
+			self.assertEqual(out.getvalue(),self.text,"jobs %d" % jobs)
+		#end for
+	#end def test_split
+
+
+	def test_chunksize(self):
+		for lookback in (0,2000):
+			ref=feedall(self.data,len(self.data),lookback)
+			for chunk in (7,100,4096,65536):
+				self.assertEqual(feedall(self.data,chunk,lookback),ref,"chunk %d, lookback %d" % (chunk,lookback))
+			#end for
+		#end for
+	#end def test_chunksize
+
+
+	def test_lookback(self):
+		# one bit slip in every message, no bit errors: every message is
+		# found, with a few error characters around the bit slip
+		# (the header of one message is lost, the bit slip is in it)
+		(bits,msgs)=navtexgen(seed=2,slip=1.0).stream(10)
+		fname=os.path.join(self.tmpdir.name,"slips.bin")
+		with open(fname,"wb") as f:
+			f.write(bits)
+		#end with
+
+		decoded=decodemsgs(fname,lookback=20000)
+		found=0
+		for msg in msgs:
+			text=msg.replace("\r","")
+			same=[m for m in decoded if m[:9] == text[:9]]
+			if not same: continue
+
+			found+=1
+			self.assertLessEqual(min(msgerrors(text,m) for m in same),5,text[:9])
+		#end for
+		self.assertGreaterEqual(found,9)
+	#end def test_lookback
+
+
+	def test_checkpoint(self):
+		cpname=os.path.join(self.tmpdir.name,"stream.ckpt")
+
+		for messages in (False,True):
+			printer=(lambda sink: printmsg(sink)) if messages else None
+			ref=decodetext(self.fname,printer)
+
+			for stop in (1,2,4,7,10,12):
+				out=io.StringIO()
+				try:
+					navtexdec(self.fname,sink=outsink(f=out),checkpoint=stopcheckpoint(cpname,stop),**({"printer":printer} if messages else {}))
+				except interrupted:
+					pass
+				#end try
+
+				resumed=decodetext(self.fname,printer,checkpoint=checkpoint(cpname))
+				self.assertEqual(out.getvalue()+resumed,ref,"messages %s, interrupted after %d blocks" % (messages,stop))
+				self.assertFalse(os.path.exists(cpname))
+			#end for
+		#end for
+	#end def test_checkpoint
+
+
+	def test_checkpoint_otherfile(self):
+		cpname=os.path.join(self.tmpdir.name,"other.ckpt")
+		other=os.path.join(self.tmpdir.name,"other.bin")
+		with open(other,"wb") as f:
+			f.write(self.data)
+		#end with
+
+		try:
+			navtexdec(self.fname,sink=outsink(f=io.StringIO()),checkpoint=stopcheckpoint(cpname,2))
+		except interrupted:
+			pass
+		#end try
+
+		cp=checkpoint(cpname)
+		cp.check(os.path.realpath(self.fname),len(self.data))
+		self.assertRaises(ValueError,cp.check,os.path.realpath(other),len(self.data))
+		self.assertRaises(ValueError,cp.check,os.path.realpath(self.fname),len(self.data)-1)
+		cp.remove()
+	#end def test_checkpoint_otherfile
+
+
+	def test_index(self):
+		idxname=os.path.join(self.tmpdir.name,"stream.idx")
+		ref=decodeevents(self.fname,index=indexwriter(idxname,label=os.path.realpath(self.fname),size=len(self.data)))
+		self.assertEqual(ref,decodeevents(self.fname))
+
+		reader=indexreader(idxname)
+		reader.check(os.path.realpath(self.fname),len(self.data))
+		self.assertRaises(ValueError,reader.check,os.path.realpath(self.fname)+".other",len(self.data))
+		self.assertRaises(ValueError,reader.check,os.path.realpath(self.fname),len(self.data)-1)
+		for start in range(12345,len(self.data),len(self.data)//7):
+			events=decodeevents(self.fname,start=start,useindex=reader)
+			self.assertEqual(events,[e for e in ref if e[2] >= start],"start %d" % start)
+		#end for
+	#end def test_index
+
+#end class navtexdectest
+
+
+
+if __name__ == "__main__": unittest.main()